@@ -1,10 +1,16 @@
 import streamlit as st
 import pandas as pd
 import io
-from luxury_correction import correct_luxury_title
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from luxury_correction import get_cache, DEFAULT_CONCURRENCY
+from pipeline import find_column, NAME_COLUMNS, TITLE_COLUMNS, CATEGORY_COLUMNS
+from run_journal import content_hash, journal_for, journal_path
+from catalog_io import read_table, write_table, SUPPORTED_FORMATS, MIME_TYPES
+from jobs import JobStore, ACTIVE_STATUSES, FINISHED_STATUSES
+from similarity import (evaluate_pairs, align_on_key, get_score_cache, SIMILARITY_METHODS, LCS_MEAN_TOLERANCE,
+                        LCS_MAX_ROW_GAP)
+from session_store import SessionStore, compact_frame, with_columns
+import os
 from datetime import datetime, timedelta
-from difflib import SequenceMatcher
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -14,18 +20,40 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+# How often the background job panel refreshes
+JOB_POLL_SECONDS = float(os.getenv("RETITLING_JOB_POLL_SECONDS", "1.0"))
+
 # --- User Credentials ---
 USER_CREDENTIALS = {
     "admin": "luxury123"
 }
+# Users who see the Admin tab
+ADMIN_USERS = {"admin"}
 
 # --- Initialize authentication and session state ---
 if "authenticated" not in st.session_state:
     st.session_state.authenticated = False
 if "processing_complete" not in st.session_state:
     st.session_state.processing_complete = False
-if "processed_df" not in st.session_state:
-    st.session_state.processed_df = None
+if "username" not in st.session_state:
+    st.session_state.username = None
+# Frames and download buffers are kept in the session store under this ID, not in session state
+if "session_id" not in st.session_state:
+    st.session_state.session_id = None
+if "run_summary" not in st.session_state:
+    st.session_state.run_summary = None
+if "processed_version" not in st.session_state:
+    st.session_state.processed_version = 0
+if "processed_file" not in st.session_state:
+    st.session_state.processed_file = None
+if "job_id" not in st.session_state:
+    st.session_state.job_id = None
+if "job_handled" not in st.session_state:
+    st.session_state.job_handled = None
+if "partial_download" not in st.session_state:
+    st.session_state.partial_download = None
+if "run_metrics" not in st.session_state:
+    st.session_state.run_metrics = None
 
 # --- Modern CSS Styling ---
 st.markdown("""
@@ -239,29 +267,223 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def find_column(df, possible_names):
-    df_columns_lower = {col.lower(): col for col in df.columns}
+# --- Parse uploads once per distinct file content ---
+@st.cache_resource(max_entries=8, show_spinner="Reading file...")
+def load_upload(file_hash, file_name, _data):
+    """
+    Parsed upload with compact (Arrow string / categorical) text columns, cached on its content
+    hash and shared by every session that uploads the same file, so it must never be modified
+    """
+    buffer = io.BytesIO(_data)
+    buffer.name = file_name
+    return compact_frame(read_table(buffer))
+
+# --- Checkpoint journal size, read once per upload and journal version ---
+@st.cache_data(max_entries=32, show_spinner=False)
+def journal_entry_count(file_hash, journal_bytes):
+    """Titles in the upload's checkpoint journal; `journal_bytes` changes whenever a job appends to it"""
+    return len(journal_for(file_hash).replay())
 
-    # 1️⃣ Exact match (case-insensitive)
-    for name in possible_names:
-        if name.lower() in df_columns_lower:
-            return df_columns_lower[name.lower()]
+def replayable_titles(file_hash):
+    """Titles a new job on this upload would restore from its journal, without re-reading an unchanged journal"""
+    try:
+        journal_bytes = os.path.getsize(journal_path(file_hash))
+    except OSError:
+        return 0
+    return journal_entry_count(file_hash, journal_bytes) if journal_bytes else 0
 
-    # 2️⃣ Partial match only if exact match not found
-    for name in possible_names:
-        name_lower = name.lower()
-        for col_lower, col_original in df_columns_lower.items():
-            if name_lower in col_lower and col_lower != name_lower:
-                return col_original
+# --- Per-session frames and buffers, spilled to disk while the session is idle ---
+@st.cache_resource
+def get_session_store():
+    return SessionStore()
 
-    return None
+def session_id():
+    """This session's ID in the session store, created on first use"""
+    if st.session_state.session_id is None:
+        st.session_state.session_id = get_session_store().new_session(st.session_state.username)
+    return st.session_state.session_id
 
-# --- Calculate similarity between two strings ---
-def calculate_similarity(str1, str2):
-    """Calculate similarity ratio between two strings (0-100%)"""
-    if pd.isna(str1) or pd.isna(str2):
-        return 0
-    return SequenceMatcher(None, str(str1).lower(), str(str2).lower()).ratio() * 100
+# --- Serialize downloads once per version of their data ---
+def cached_download(key, fmt, df):
+    """Download bytes kept in the session store; `key` must change whenever `df` does"""
+    store, sid = get_session_store(), session_id()
+    output = store.get(sid, ("download", key, fmt))
+    if output is None:
+        # Only the latest version of each download is kept
+        store.drop(sid, [n for n in store.names(sid)
+                         if isinstance(n, tuple) and n[0] == "download" and n[1][0] == key[0] and n[1] != key])
+        output = write_table(df, fmt)
+        store.put(sid, ("download", key, fmt), output)
+    return output
+
+# --- Record a new processed result for the download section ---
+def set_processed_columns(columns, file_hash):
+    """Keeps only the columns processing wrote; the output is the upload with these columns replaced"""
+    get_session_store().put(session_id(), "processed", columns)
+    st.session_state.processed_file = file_hash
+    st.session_state.processing_complete = True
+    st.session_state.processed_version += 1
+
+def processed_columns():
+    return get_session_store().get(session_id(), "processed")
+
+# --- Background jobs shared by every session in this process ---
+@st.cache_resource
+def get_job_store():
+    return JobStore()
+
+def estimate_remaining(elapsed_seconds, completed, total):
+    if completed == 0:
+        return "Calculating..."
+    remaining = elapsed_seconds / completed * (total - completed)
+    return str(timedelta(seconds=int(remaining)))
+
+# --- Hand a finished job's frame and summary to the download section ---
+def take_job_results(job):
+    snapshot = job.snapshot()
+    stats = snapshot["stats"] or {}
+    st.session_state.run_summary = {
+        "status": snapshot["status"],
+        "error": snapshot["error"],
+        "elapsed": str(timedelta(seconds=int(snapshot["elapsed_seconds"]))),
+        "unique_titles": stats.get("unique_titles", 0),
+        "rows": stats.get("rows", 0),
+        "sources": dict(stats.get("sources", {})),
+    }
+    st.session_state.run_metrics = job.metrics
+    set_processed_columns(job.result_columns(), job.file_hash)
+    st.session_state.job_handled = job.id
+
+# --- Latency / token / retry panel for the last run ---
+def show_call_metrics(metrics):
+    summary = metrics.summary()
+    if not summary["model_calls"]:
+        return
+    latency = summary["latency_seconds"]
+    
+    st.markdown("#### ⏱️ Gemini Call Performance")
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Latency p50 / p95 / p99", f"{latency['p50']:.1f}s / {latency['p95']:.1f}s / {latency['p99']:.1f}s")
+    with col2:
+        st.metric("🔤 Tokens In / Out",
+                  f"{summary['prompt_tokens']['total']:,} / {summary['response_tokens']['total']:,}")
+    with col3:
+        st.metric("🔁 Retries / Hedges", f"{summary['retries']['total']:,} / {summary['hedges']['sent']:,}",
+                  help="Retry count per call: " + ", ".join(f"{n}×{k}" for k, n in summary["retries"]["histogram"].items())
+                       + f". Hedged duplicates answering first: {summary['hedges']['won']:,}")
+    with col4:
+        st.metric("⚠️ Parse Failures / Errors", f"{summary['parse_failures']:,} / {summary['errors']:,}")
+    
+    cascade = summary["cascade"]
+    if cascade["escalation_rate"] is not None:
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("⚡ Answered by Fast Model", f"{cascade['fast_accepted']:,}")
+        with col2:
+            st.metric("🪜 Escalated to Pro", f"{cascade['escalated']:,} ({cascade['escalation_rate']:.0%})",
+                      help="Fast-model results that failed local validation and were re-run on the pro model")
+        with col3:
+            saved = cascade["seconds_saved"]
+            st.metric("⏳ Est. Call Time Saved", "n/a" if saved is None else f"{saved:,.0f}s",
+                      help="Fast-model titles × mean pro latency, minus all time spent on the fast model")
+    
+    with st.expander("📂 Per-category breakdown"):
+        st.dataframe(pd.DataFrame([
+            {
+                "Category": category,
+                "Calls": stats["calls"],
+                "p50 (s)": stats["latency_seconds"]["p50"],
+                "p95 (s)": stats["latency_seconds"]["p95"],
+                "p99 (s)": stats["latency_seconds"]["p99"],
+                "Prompt Tokens": stats["prompt_tokens"],
+                "Response Tokens": stats["response_tokens"],
+                "Retries": stats["retries"],
+                "Parse Failures": stats["parse_failures"],
+            }
+            for category, stats in summary["categories"].items()
+        ]), use_container_width=True, hide_index=True)
+    
+    col1, col2, col3 = st.columns(3)
+    timestamp = datetime.fromtimestamp(metrics.started_at).strftime('%Y%m%d_%H%M%S')
+    for column, label, data, extension, mime in (
+        (col1, "📄 Run Report (JSON)", metrics.to_json, "json", "application/json"),
+        (col2, "📊 Per-call Metrics (CSV)", metrics.to_csv, "csv", "text/csv"),
+        (col3, "📈 Prometheus Metrics", metrics.to_prometheus, "prom", "text/plain"),
+    ):
+        with column:
+            st.download_button(label, data=data(), file_name=f"retitling_metrics_{timestamp}.{extension}",
+                               mime=mime, use_container_width=True)
+
+# --- Live job progress, polled at a throttled interval ---
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def show_job_progress(job_id):
+    job = get_job_store().get(job_id)
+    if job is None:
+        st.warning(f"⚠️ Job `{job_id}` is no longer available.")
+        return
+    snapshot = job.snapshot()
+    if snapshot["status"] in FINISHED_STATUSES:
+        # Rerun the whole page so the results reach the download section
+        st.rerun()
+    
+    completed, total = snapshot["completed"], snapshot["total"]
+    progress = completed / total if total else 0.0
+    st.progress(progress)
+    st.markdown(f"""
+    **Job:** `{job_id}` ({snapshot['file_name']}) — {snapshot['status']}  
+    **Progress:** {completed:,} / {total or 0:,} unique titles ({int(progress * 100)}%)  
+    **Time Remaining:** {estimate_remaining(snapshot['elapsed_seconds'], completed, total or 0)}
+    """)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("⛔ Cancel Job", use_container_width=True, key=f"cancel_{job_id}"):
+            get_job_store().cancel(job_id)
+    with col2:
+        if st.button("📦 Prepare Partial Download", use_container_width=True, key=f"partial_{job_id}"):
+            get_session_store().put(session_id(), "partial_download", write_table(job.partial_frame(), "xlsx"))
+            st.session_state.partial_download = job_id
+    
+    if st.session_state.partial_download == job_id:
+        st.download_button(
+            label="⬇️ DOWNLOAD PARTIAL RESULTS",
+            data=get_session_store().get(session_id(), "partial_download"),
+            file_name=f"luxury_titles_partial_{job_id}.xlsx",
+            mime=MIME_TYPES["xlsx"],
+            use_container_width=True
+        )
+
+# --- Admin: memory held for each session ---
+def show_session_memory():
+    store = get_session_store()
+    current = session_id()
+    usage = sorted(store.usage(), key=lambda u: u["memory_bytes"], reverse=True)
+    
+    st.markdown('<h2 class="section-header">🧠 Session Memory</h2>', unsafe_allow_html=True)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("👥 Sessions", f"{len(usage):,}")
+    with col2:
+        st.metric("🧠 In Memory", f"{sum(u['memory_bytes'] for u in usage) / 1e6:,.1f} MB")
+    with col3:
+        st.metric("💽 Spilled to Disk", f"{sum(u['disk_bytes'] for u in usage) / 1e6:,.1f} MB",
+                  help=f"Sessions idle for {timedelta(seconds=int(store.spill_after))} are written to disk "
+                       "and read back on their next interaction")
+    
+    st.dataframe(pd.DataFrame([{
+        "Session": u["session"] + (" (this session)" if u["session"] == current else ""),
+        "User": u["user"] or "—",
+        "Frames / Buffers": u["entries"],
+        "In Memory (MB)": round(u["memory_bytes"] / 1e6, 2),
+        "On Disk (MB)": round(u["disk_bytes"] / 1e6, 2),
+        "Idle": str(timedelta(seconds=int(u["idle_seconds"]))),
+    } for u in usage]), use_container_width=True, hide_index=True)
+    st.caption("Uploaded files are parsed once and shared by every session that uploads them; they are not counted here.")
+    
+    if st.button("💾 Spill Other Sessions Now", use_container_width=True):
+        spilled = store.spill_idle(idle_seconds=0, keep=current)
+        st.success(f"✅ {spilled:,} sessions written to disk")
 
 # --- Login function ---
 def login():
@@ -281,6 +503,7 @@ def login():
         if login_button:
             if username in USER_CREDENTIALS and USER_CREDENTIALS[username] == password:
                 st.session_state.authenticated = True
+                st.session_state.username = username
                 st.success("✅ Login successful! Redirecting...")
                 st.rerun()
             else:
@@ -288,9 +511,17 @@ def login():
 
 # --- Logout function ---
 def logout():
+    if st.session_state.session_id is not None:
+        get_session_store().drop(st.session_state.session_id)
     st.session_state.authenticated = False
+    st.session_state.username = None
+    st.session_state.session_id = None
     st.session_state.processing_complete = False
-    st.session_state.processed_df = None
+    st.session_state.processed_file = None
+    st.session_state.run_summary = None
+    st.session_state.job_id = None
+    st.session_state.partial_download = None
+    st.session_state.run_metrics = None
     st.rerun()
 
 # --- Main App ---
@@ -303,19 +534,31 @@ st.sidebar.success(f"✅ **Logged in as:** admin")
 if st.sidebar.button("🚪 Logout", use_container_width=True):
     logout()
 
+# Reattach to a background job, e.g. after closing the browser tab
+attach_id = st.sidebar.text_input("🔁 Attach to job ID", placeholder="Job ID")
+if st.sidebar.button("Attach", use_container_width=True) and attach_id:
+    if get_job_store().get(attach_id.strip()) is None:
+        st.sidebar.error("❌ No job with that ID")
+    else:
+        st.session_state.job_id = attach_id.strip()
+        st.session_state.job_handled = None
+        st.rerun()
+
 # Main Header
 st.markdown('<h1 class="luxury-title">💎 Luxury Product Title Retitler</h1>', unsafe_allow_html=True)
 st.markdown('<p class="subtitle">Transform your product titles with AI-powered precision using Google Gemini</p>', unsafe_allow_html=True)
 
-# Create tabs for Title Generator and Accuracy Test
-tab1, tab2 = st.tabs(["🎨 Title Generator", "📊 Accuracy Test"])
+# Create tabs for Title Generator and Accuracy Test (plus Admin for admin users)
+is_admin = st.session_state.username in ADMIN_USERS
+tabs = st.tabs(["🎨 Title Generator", "📊 Accuracy Test"] + (["🛠️ Admin"] if is_admin else []))
+tab1, tab2 = tabs[:2]
 
 # ============= TAB 1: TITLE GENERATOR =============
 with tab1:
     # Instructions Card
     st.markdown("### 📋 Instructions")
     st.markdown("""
-    1. **Upload** an Excel file (.xlsx) with columns containing product data:
+    1. **Upload** an Excel (.xlsx), CSV or Parquet file with columns containing product data:
        - Product name (e.g., NAME, Product Name, Title)
        - Updated title column (e.g., Updated Title, New Title, Corrected Title)
        - Category (e.g., CATEGORY, Category, Product Category)
@@ -326,23 +569,33 @@ with tab1:
     """)
 
     # File Upload Section
-    st.markdown('<h2 class="section-header">📂 Upload Your Excel File</h2>', unsafe_allow_html=True)
+    st.markdown('<h2 class="section-header">📂 Upload Your Catalog File</h2>', unsafe_allow_html=True)
 
     uploaded_file = st.file_uploader(
-        "Choose an Excel file",
-        type=["xlsx"],
-        help="Upload an Excel file containing your product data",
+        "Choose an Excel, CSV or Parquet file",
+        type=list(SUPPORTED_FORMATS),
+        help="Upload an Excel, CSV or Parquet file containing your product data",
         key="title_gen_upload"
     )
 
+    # Background Job - runs independently of this page; polled while active
+    job = get_job_store().get(st.session_state.job_id) if st.session_state.job_id else None
+    job_active = job is not None and job.status in ACTIVE_STATUSES
+    if job is not None and job.status in FINISHED_STATUSES and st.session_state.job_handled != job.id:
+        take_job_results(job)
+    if job_active:
+        st.markdown("### ⚡ Processing Titles")
+        show_job_progress(job.id)
+
     if uploaded_file:
         try:
-            df = pd.read_excel(uploaded_file)
+            file_hash = content_hash(uploaded_file.getvalue())
+            df = load_upload(file_hash, uploaded_file.name, uploaded_file.getvalue())
             
             # Flexible column detection
-            name_col = find_column(df, ["NAME", "Product Name", "Title", "Product", "Item Name", "Item"])
-            title_col = find_column(df, ["Updated Title", "New Title", "Corrected Title", "Title Output", "Generated Title"])
-            category_col = find_column(df, ["CATEGORY", "Category", "Product Category", "Type", "Product Type"])
+            name_col = find_column(df, NAME_COLUMNS)
+            title_col = find_column(df, TITLE_COLUMNS)
+            category_col = find_column(df, CATEGORY_COLUMNS)
             
             # Validate required columns
             missing = []
@@ -368,100 +621,131 @@ with tab1:
             # File Summary
             st.markdown('<h2 class="section-header">📊 File Summary</h2>', unsafe_allow_html=True)
             
-            col1, col2, col3 = st.columns(3)
+            cache_stats = get_cache().stats()
+            
+            # Completed titles from an interrupted run of this same file are restored from its journal
+            replayed = replayable_titles(file_hash)
+            
+            col1, col2, col3, col4 = st.columns(4)
             with col1:
                 st.metric("📝 Total Rows", f"{total_rows:,}")
             with col2:
                 st.metric("⏳ To Process", f"{rows_to_process:,}", delta=None)
             with col3:
                 st.metric("✅ Processed", f"{rows_processed:,}", delta=None)
+            with col4:
+                st.metric("💾 Cache Hits / Misses", f"{cache_stats['hits']:,} / {cache_stats['misses']:,}",
+                          help=f"{cache_stats['entries']:,} titles stored in the result cache")
+            
+            if replayed and rows_to_process > 0:
+                st.info(f"♻️ {replayed:,} titles from an earlier run of this file are in the checkpoint journal "
+                        f"and will be restored without new Gemini calls.")
             
             # Processing Section
-            if rows_to_process > 0:
+            if job_active:
+                st.info("⏳ A background job is running — progress is shown above.")
+            elif rows_to_process > 0:
                 st.markdown("### ⚡ Processing Titles")
                 
+                concurrency = st.number_input(
+                    "Concurrent requests",
+                    min_value=1,
+                    max_value=1000,
+                    value=DEFAULT_CONCURRENCY,
+                    help="Maximum number of Gemini calls in flight at once"
+                )
+                
                 if st.button("🚀 Start Processing", type="primary", use_container_width=True):
-                    progress_bar = st.progress(0.0)
-                    status_text = st.empty()
-                    start_time = datetime.now()
-                    
-                    def estimate_remaining(start, completed, total):
-                        if completed == 0:
-                            return "Calculating..."
-                        elapsed = datetime.now() - start
-                        remaining = (elapsed / completed) * (total - completed)
-                        return str(timedelta(seconds=int(remaining.total_seconds())))
-                    
-                    def process_row(idx, name):
-                        try:
-                            result = correct_luxury_title(name)
-                            # Expecting dict with "corrected_title" or just a string; handle both
-                            if isinstance(result, dict):
-                                return idx, result.get("corrected_title", "") 
-                            else:
-                                return idx, str(result)
-                        except Exception as e:
-                            return idx, f"Error: {str(e)}"
-                    
-                    to_process = [(idx, row[name_col]) for idx, row in df.iterrows() if pd.isna(row[title_col])]
-                    
-                    with ThreadPoolExecutor(max_workers=20) as executor:
-                        futures = [executor.submit(process_row, idx, name) for idx, name in to_process]
-                        
-                        for i, future in enumerate(as_completed(futures)):
-                            idx, updated_title = future.result()
-                            df.at[idx, title_col] = updated_title
-                            
-                            progress = (i + 1) / len(to_process)
-                            # progress_bar accepts 0.0-1.0 floats
-                            progress_bar.progress(progress)
-                            
-                            status_text.markdown(f"""
-                            **Progress:** {i + 1:,} / {len(to_process):,} ({int(progress * 100)}%)  
-                            **Time Remaining:** {estimate_remaining(start_time, i + 1, len(to_process))}
-                            """)
-                    
-                    elapsed = datetime.now() - start_time
-                    st.success(f"✅ Processing complete in {str(timedelta(seconds=int(elapsed.total_seconds())))}")
-                    
-                    # Store processed dataframe in session state
-                    st.session_state.processed_df = df
-                    st.session_state.processing_complete = True
+                    # Rows sharing a normalized NAME are sent once and filled together on a worker thread
+                    st.session_state.job_id = get_job_store().submit(
+                        df,
+                        name_col,
+                        title_col,
+                        file_name=uploaded_file.name,
+                        file_hash=file_hash,
+                        concurrency=int(concurrency),
+                        category_col=category_col
+                    )
+                    st.session_state.job_handled = None
+                    st.session_state.run_summary = None
+                    st.session_state.run_metrics = None
                     st.rerun()
             else:
                 st.info("ℹ️ All rows are already processed!")
-                st.session_state.processed_df = df
-                st.session_state.processing_complete = True
+                if st.session_state.processed_file != file_hash:
+                    # Nothing was written: the upload itself is the result
+                    set_processed_columns(df[[]], file_hash)
+            
+            # Run Summary - survives the rerun that follows processing
+            run_summary = st.session_state.run_summary
+            if run_summary:
+                if run_summary["status"] == "completed":
+                    st.success(f"✅ Processing complete in {run_summary['elapsed']} "
+                               f"({run_summary['unique_titles']:,} unique titles for {run_summary['rows']:,} rows)")
+                elif run_summary["status"] == "cancelled":
+                    st.warning(f"⛔ Job cancelled after {run_summary['elapsed']} — the download contains the titles finished so far")
+                else:
+                    st.error(f"❌ Job failed after {run_summary['elapsed']}: {run_summary['error']}")
+                
+                sources = run_summary["sources"]
+                resolved = sum(sources.values())
+                llm_share = (sources.get("llm", 0) / resolved * 100) if resolved > 0 else 0
+                
+                col1, col2, col3, col4 = st.columns(4)
+                with col1:
+                    st.metric("🧠 Gemini Calls", f"{sources.get('llm', 0):,}")
+                with col2:
+                    st.metric("⚡ Local Fast Path", f"{sources.get('local', 0):,}")
+                with col3:
+                    st.metric("💾 Cache / Journal", f"{sources.get('cache', 0) + sources.get('journal', 0) + sources.get('near_duplicate', 0):,}",
+                              help=f"Includes {sources.get('near_duplicate', 0):,} near-duplicate titles that reused "
+                                   "a cached correction (flagged in the output)")
+                with col4:
+                    st.metric("📊 LLM vs Local", f"{llm_share:.0f}% / {100 - llm_share:.0f}%",
+                              help="Share of unique titles sent to Gemini vs. resolved locally (fast path or cache)")
+                
+                if st.session_state.run_metrics is not None:
+                    show_call_metrics(st.session_state.run_metrics)
             
             # Download Section - Only show after processing
-            if st.session_state.processing_complete and st.session_state.processed_df is not None:
+            processed_current = st.session_state.processed_file == file_hash
+            result_columns = processed_columns() if processed_current else None
+            if st.session_state.processing_complete and result_columns is not None:
                 st.markdown("---")
                 st.markdown("### 📥 **DOWNLOAD YOUR RESULTS**")
                 
-                output = io.BytesIO()
-                st.session_state.processed_df.to_excel(output, index=False)
-                output.seek(0)
+                output_format = st.radio(
+                    "Output format",
+                    SUPPORTED_FORMATS,
+                    horizontal=True,
+                    key="title_gen_output_format"
+                )
+                output = cached_download(
+                    ("processed", st.session_state.processed_version),
+                    output_format,
+                    with_columns(df, result_columns)
+                )
                 
                 timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
                 
                 st.download_button(
-                    label="⬇️ DOWNLOAD UPDATED EXCEL FILE",
+                    label=f"⬇️ DOWNLOAD UPDATED {output_format.upper()} FILE",
                     data=output,
-                    file_name=f"luxury_titles_{timestamp}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    file_name=f"luxury_titles_{timestamp}.{output_format}",
+                    mime=MIME_TYPES[output_format],
                     use_container_width=True
                 )
             
             # Preview Table - Limited to 20 rows
             st.markdown('<h2 class="section-header">📋 Data Preview</h2>', unsafe_allow_html=True)
             
-            preview_df = st.session_state.processed_df if st.session_state.processed_df is not None else df
             preview_rows = 20
-            if len(preview_df) > preview_rows:
-                st.info(f"Showing first {preview_rows} rows of {len(preview_df):,} total rows")
-                st.dataframe(preview_df.head(preview_rows), use_container_width=True, height=400)
-            else:
-                st.dataframe(preview_df, use_container_width=True, height=400)
+            preview_df = df.head(preview_rows)
+            if result_columns is not None:
+                preview_df = with_columns(preview_df, result_columns.head(preview_rows))
+            if len(df) > preview_rows:
+                st.info(f"Showing first {preview_rows} rows of {len(df):,} total rows")
+            st.dataframe(preview_df, use_container_width=True, height=400)
         
         except Exception as e:
             st.error(f"❌ Error processing file: {str(e)}")
@@ -471,7 +755,7 @@ with tab1:
 with tab2:
     st.markdown("### 📊 Accuracy Testing")
     st.markdown("""
-    Upload two separate Excel files to compare AI-generated titles against ground truth (GT) titles.
+    Upload two separate Excel, CSV or Parquet files to compare AI-generated titles against ground truth (GT) titles.
     
     **Both files should have:**
     - `Updated Title` column (or similar naming like "New Title", "Title", etc.)
@@ -485,8 +769,8 @@ with tab2:
     with col1:
         st.markdown("#### 🤖 AI-Generated Titles File")
         ai_file = st.file_uploader(
-            "Upload Excel with AI titles",
-            type=["xlsx"],
+            "Upload file with AI titles",
+            type=list(SUPPORTED_FORMATS),
             help="File containing AI-generated titles in 'Updated Title' column",
             key="ai_upload"
         )
@@ -494,16 +778,18 @@ with tab2:
     with col2:
         st.markdown("#### ✅ Ground Truth (GT) File")
         gt_file = st.file_uploader(
-            "Upload Excel with GT titles",
-            type=["xlsx"],
+            "Upload file with GT titles",
+            type=list(SUPPORTED_FORMATS),
             help="File containing ground truth titles in 'Updated Title' column",
             key="gt_upload"
         )
     
     if ai_file and gt_file:
         try:
-            ai_df = pd.read_excel(ai_file)
-            gt_df = pd.read_excel(gt_file)
+            ai_hash = content_hash(ai_file.getvalue())
+            gt_hash = content_hash(gt_file.getvalue())
+            ai_df = load_upload(ai_hash, ai_file.name, ai_file.getvalue())
+            gt_df = load_upload(gt_hash, gt_file.name, gt_file.getvalue())
             
             # Detect title columns
             ai_title_col = find_column(ai_df, ["Updated Title", "New Title", "Title", "AI Title", "Generated Title"])
@@ -517,12 +803,6 @@ with tab2:
                 st.error(f"❌ Could not find title column in GT file. Available: {', '.join(gt_df.columns.tolist())}")
                 st.stop()
             
-            # Check row counts
-            if len(ai_df) != len(gt_df):
-                st.warning(f"⚠️ Row count mismatch! AI file: {len(ai_df)} rows, GT file: {len(gt_df)} rows. Using minimum: {min(len(ai_df), len(gt_df))}")
-            
-            min_rows = min(len(ai_df), len(gt_df))
-            
             # Detect category column
             cat_col = find_column(ai_df, ["CATEGORY", "Category", "Product Category", "Type"])
             if not cat_col:
@@ -530,23 +810,62 @@ with tab2:
             
             st.success(f"✅ Comparing **{ai_title_col}** (AI) vs **{gt_title_col}** (GT)" + (f" | Category: **{cat_col}**" if cat_col else ""))
             
-            # Create comparison dataframe
-            comparison_data = {
-                'AI Title': ai_df[ai_title_col].head(min_rows).reset_index(drop=True),
-                'GT Title': gt_df[gt_title_col].head(min_rows).reset_index(drop=True)
-            }
+            # Rows can be paired by position or by a column both files share (e.g. a SKU)
+            key_options = [c for c in ai_df.columns if c in gt_df.columns and c not in (ai_title_col, gt_title_col)]
+            align_mode = st.radio(
+                "Align rows by",
+                ["Row order", "Join key column"] if key_options else ["Row order"],
+                horizontal=True,
+                key="accuracy_align_mode"
+            )
+            join_key = None
+            if align_mode == "Join key column":
+                join_key = st.selectbox("Join key", key_options, key="accuracy_join_key")
             
-            if cat_col:
-                if cat_col in ai_df.columns:
-                    comparison_data['Category'] = ai_df[cat_col].head(min_rows).reset_index(drop=True)
-                elif cat_col in gt_df.columns:
-                    comparison_data['Category'] = gt_df[cat_col].head(min_rows).reset_index(drop=True)
+            if join_key:
+                acc_df, align_counts = align_on_key(ai_df, gt_df, join_key, ai_title_col, gt_title_col, cat_col)
+                if align_counts["ai_only"] or align_counts["gt_only"] or align_counts["duplicates"]:
+                    st.warning(f"⚠️ Joined on **{join_key}**: {len(acc_df):,} matched rows, "
+                               f"{align_counts['ai_only']:,} only in AI file, {align_counts['gt_only']:,} only in GT file, "
+                               f"{align_counts['duplicates']:,} duplicate keys ignored")
+            else:
+                # Check row counts
+                if len(ai_df) != len(gt_df):
+                    st.warning(f"⚠️ Row count mismatch! AI file: {len(ai_df)} rows, GT file: {len(gt_df)} rows. Using minimum: {min(len(ai_df), len(gt_df))}")
+                
+                min_rows = min(len(ai_df), len(gt_df))
+                
+                # Create comparison dataframe
+                comparison_data = {
+                    'AI Title': ai_df[ai_title_col].head(min_rows).reset_index(drop=True),
+                    'GT Title': gt_df[gt_title_col].head(min_rows).reset_index(drop=True)
+                }
+                
+                if cat_col:
+                    if cat_col in ai_df.columns:
+                        comparison_data['Category'] = ai_df[cat_col].head(min_rows).reset_index(drop=True)
+                    elif cat_col in gt_df.columns:
+                        comparison_data['Category'] = gt_df[cat_col].head(min_rows).reset_index(drop=True)
+                
+                acc_df = pd.DataFrame(comparison_data)
             
-            acc_df = pd.DataFrame(comparison_data)
+            similarity_method = st.radio(
+                "Similarity metric",
+                list(SIMILARITY_METHODS),
+                format_func=lambda m: "Fast (LCS)" if m == "lcs" else "Legacy (difflib)",
+                horizontal=True,
+                help=(f"Legacy reproduces older per-row scores exactly. Fast never scores lower: its average stays "
+                      f"within {LCS_MEAN_TOLERANCE:g} point of Legacy and single rows within {LCS_MAX_ROW_GAP:g} "
+                      f"points, but rows with reordered words can score much higher"),
+                key="similarity_method"
+            )
             
-            # Calculate accuracy metrics
-            acc_df['Exact Match'] = acc_df.apply(lambda row: str(row['AI Title']).lower().strip() == str(row['GT Title']).lower().strip(), axis=1)
-            acc_df['Similarity %'] = acc_df.apply(lambda row: calculate_similarity(row['AI Title'], row['GT Title']), axis=1)
+            # Calculate accuracy metrics - pairs scored in an earlier run come from the score cache
+            acc_df['Exact Match'], acc_df['Similarity %'], cached_pairs = evaluate_pairs(
+                acc_df['AI Title'], acc_df['GT Title'], method=similarity_method, cache=get_score_cache()
+            )
+            if cached_pairs:
+                st.caption(f"💾 {cached_pairs:,} distinct title pairs reused from earlier runs")
             
             total_rows = len(acc_df)
             exact_matches = int(acc_df['Exact Match'].sum())
@@ -570,7 +889,7 @@ with tab2:
             if cat_col and 'Category' in acc_df.columns:
                 st.markdown('<h2 class="section-header">📂 Category Breakdown</h2>', unsafe_allow_html=True)
                 
-                category_stats = acc_df.groupby('Category').agg({
+                category_stats = acc_df.groupby('Category', observed=True).agg({
                     'Exact Match': ['count', 'sum'],
                     'Similarity %': 'mean'
                 }).round(2)
@@ -603,17 +922,21 @@ with tab2:
             # Download comparison results
             st.markdown('<h2 class="section-header">💾 Download Comparison</h2>', unsafe_allow_html=True)
             
-            output = io.BytesIO()
-            acc_df.to_excel(output, index=False)
-            output.seek(0)
+            acc_output_format = st.radio(
+                "Output format",
+                SUPPORTED_FORMATS,
+                horizontal=True,
+                key="accuracy_output_format"
+            )
+            output = cached_download(("accuracy", ai_hash, gt_hash, join_key, similarity_method), acc_output_format, acc_df)
             
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             
             st.download_button(
                 label="📥 Download Accuracy Comparison Results",
                 data=output,
-                file_name=f"accuracy_comparison_{timestamp}.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                file_name=f"accuracy_comparison_{timestamp}.{acc_output_format}",
+                mime=MIME_TYPES[acc_output_format],
                 use_container_width=True
             )
         
@@ -621,6 +944,11 @@ with tab2:
             st.error(f"❌ Error processing accuracy file: {str(e)}")
             st.exception(e)
 
+# ============= TAB 3: ADMIN =============
+if is_admin:
+    with tabs[2]:
+        show_session_memory()
+
 # Footer
 st.markdown("---")
 st.markdown(
@@ -0,0 +1,179 @@
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+from result_schema import ATTRIBUTE_KEYS
+
+# ==========================
+# Model Backends
+# ==========================
+# A backend is any object with the two calls the pipeline makes:
+#   generate_content(prompt, **kwargs) and async generate_content_async(prompt, **kwargs),
+# each returning a response with `.text` and (optionally) `.usage_metadata`.
+BACKEND_NAMES = ("gemini", "fake")
+DEFAULT_BACKEND = os.getenv("RETITLING_BACKEND", "gemini")
+
+
+class GeminiBackend:
+    """
+    Google Gemini via google-generativeai. The SDK import, .env loading, API key check and
+    client construction all happen on the first call, so importing the pipeline stays cheap
+    and works without credentials.
+    """
+
+    def __init__(self, model_name, system_instruction=None, generation_config=None):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.generation_config = generation_config
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _client(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import google.generativeai as genai
+                    from dotenv import load_dotenv
+
+                    load_dotenv()
+                    api_key = os.getenv("GEMINI_API_KEY")
+                    if not api_key:
+                        raise ValueError("GEMINI_API_KEY not found in environment variables")
+                    genai.configure(api_key=api_key)
+                    self._model = genai.GenerativeModel(
+                        self.model_name,
+                        system_instruction=self.system_instruction,
+                        generation_config=self.generation_config,
+                    )
+        return self._model
+
+    def generate_content(self, prompt, **kwargs):
+        return self._client().generate_content(prompt, **kwargs)
+
+    async def generate_content_async(self, prompt, **kwargs):
+        return await self._client().generate_content_async(prompt, **kwargs)
+
+
+def create_backend(name=None, **model_config):
+    """
+    Builds the backend called `name` (default: RETITLING_BACKEND, else "gemini").
+    `model_config` (model_name, system_instruction, generation_config) is used by Gemini only.
+    """
+    name = name or DEFAULT_BACKEND
+    if name == "gemini":
+        return GeminiBackend(**model_config)
+    if name == "fake":
+        return FakeBackend()
+    raise ValueError(f"Unknown backend '{name}' (expected one of: {', '.join(BACKEND_NAMES)})")
+
+
+# ==========================
+# Offline Backend
+# ==========================
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+
+_TITLE_RE = re.compile(r'Input title: "(.*)"\n', re.DOTALL)
+_BATCH_RE = re.compile(r"Input titles \(JSON array, numbered from 0\):\n(.*?)\n\nReturn", re.DOTALL)
+
+class FakeAPIError(Exception):
+    """Carries an HTTP status in `code`, like the SDK's google.api_core exceptions."""
+
+    def __init__(self, code, message):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+class FakeBackend:
+    """
+    Offline stand-in for Gemini. Responses are canned JSON in the result schema, returned after
+    a configurable latency. Calls fail with transient 500s at `error_rate`, and every
+    `burst_every` seconds all calls are rejected with 429 for `burst_length` seconds, so retries
+    and adaptive concurrency are exercised the way real quota pressure would exercise them.
+    """
+
+    def __init__(self, latency="lognormal", latency_ms=50.0, latency_sigma=0.5, error_rate=0.0,
+                 burst_every=0.0, burst_length=0.0, seed=0):
+        if latency not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution '{latency}' (expected one of: {', '.join(LATENCY_DISTRIBUTIONS)})")
+        self.latency = latency
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.burst_every = burst_every
+        self.burst_length = burst_length
+        self.calls = 0
+        self.rejected = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+
+    def _delay(self) -> float:
+        """Seconds to wait for one call; `latency_ms` is the fixed value, uniform mean or lognormal median."""
+        with self._lock:
+            if self.latency == "fixed":
+                value = self.latency_ms
+            elif self.latency == "uniform":
+                value = self._random.uniform(0, 2 * self.latency_ms)
+            else:
+                value = self.latency_ms * self._random.lognormvariate(0, self.latency_sigma)
+        return value / 1000
+
+    def _check_failure(self):
+        with self._lock:
+            self.calls += 1
+            elapsed = time.monotonic() - self._started
+            in_burst = (
+                self.burst_every > 0
+                and elapsed >= self.burst_every
+                and elapsed % self.burst_every < self.burst_length
+            )
+            failed = in_burst or self._random.random() < self.error_rate
+            if failed:
+                self.rejected += 1
+        if in_burst:
+            raise FakeAPIError(429, "Resource has been exhausted (e.g. check quota).")
+        if failed:
+            raise FakeAPIError(500, "An internal error has occurred.")
+
+    def _respond(self, prompt):
+        batch = _BATCH_RE.search(prompt)
+        if batch:
+            titles = json.loads(batch.group(1))
+            body = [dict(canned_result(title), index=i) for i, title in enumerate(titles)]
+        else:
+            match = _TITLE_RE.search(prompt)
+            body = canned_result(match.group(1) if match else prompt)
+        text = json.dumps(body, ensure_ascii=False)
+        usage = SimpleNamespace(
+            prompt_token_count=len(prompt) // 4,
+            candidates_token_count=len(text) // 4,
+            total_token_count=(len(prompt) + len(text)) // 4,
+        )
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+    def generate_content(self, prompt, **kwargs):
+        time.sleep(self._delay())
+        self._check_failure()
+        return self._respond(prompt)
+
+    async def generate_content_async(self, prompt, **kwargs):
+        await asyncio.sleep(self._delay())
+        self._check_failure()
+        return self._respond(prompt)
+
+
+def canned_result(title) -> dict:
+    """A well-formed handbag result whose corrected title is derived from the input."""
+    words = str(title).split()
+    attributes = dict.fromkeys(ATTRIBUTE_KEYS)
+    attributes.update(brand=words[0] if words else None, subcategory="Handbag")
+    return {
+        "detected_category": "Handbags",
+        "attributes": attributes,
+        "corrected_title": " ".join(w.capitalize() for w in words) + " Handbag",
+    }
@@ -0,0 +1,188 @@
+"""
+Offline throughput benchmark for the retitling pipeline.
+
+    python -m benchmarks.run --sizes 1000 10000 100000 --output bench.json
+    python -m benchmarks.run --baseline bench.json        # exit 1 on a regression
+
+Each size runs in a fresh process: a synthetic catalog goes through the real
+`fill_missing_titles` → `correct_titles` path (dedup, async driver, adaptive limiter, retries,
+post-processing, result cache) against `backends.FakeBackend`. No API quota is used.
+Reports rows/s, peak RSS, call latency percentiles and time queued for a concurrency slot.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def synthetic_catalog(rows, unique_ratio, local_share, seed=0):
+    """
+    A NAME / CATEGORY / Updated Title frame of handbags with blank titles. About `unique_ratio` of the rows are distinct
+    titles; `local_share` of the distinct titles are plain enough for the local fast path, the
+    rest carry a stray token so they need the model.
+    """
+    import pandas as pd
+    from luxury_correction import luxury_data
+
+    rng = random.Random(seed)
+    unique = max(1, int(rows * unique_ratio))
+    names = []
+    for n in range(unique):
+        words = [
+            rng.choice(luxury_data["brands"][2:]),
+            rng.choice(luxury_data["colors"][:10]),
+            rng.choice(luxury_data["materials"][:4]),
+            rng.choice(["Tote", "Clutch", "Backpack", "Wallet"]),
+        ]
+        if rng.random() >= local_share:
+            words.insert(1, f"Style{n}")
+            words.append(f"#{n}")
+        names.append(" ".join(words))
+    column = names + [rng.choice(names) for _ in range(rows - unique)]
+    rng.shuffle(column)
+    return pd.DataFrame({"NAME": column, "CATEGORY": "Handbags", "Updated Title": [None] * rows})
+
+
+def run_once(rows, options) -> dict:
+    """Runs one benchmark in the current process and returns its measurements."""
+    cache_dir = tempfile.mkdtemp(prefix="retitling-bench-")
+    os.environ["RETITLING_CACHE_PATH"] = os.path.join(cache_dir, "cache.sqlite3")
+
+    import luxury_correction
+    from backends import FakeBackend
+    from metrics import RunMetrics
+    from pipeline import fill_missing_titles
+
+    model = FakeBackend(
+        latency=options["latency"],
+        latency_ms=options["latency_ms"],
+        latency_sigma=options["latency_sigma"],
+        error_rate=options["error_rate"],
+        burst_every=options["burst_every"],
+        burst_length=options["burst_length"],
+        seed=options["seed"],
+    )
+    luxury_correction.set_model(model)
+
+    df = synthetic_catalog(rows, options["unique_ratio"], options["local_share"], seed=options["seed"])
+    metrics = RunMetrics()
+    start = time.perf_counter()
+    stats = fill_missing_titles(df, "NAME", "Updated Title", concurrency=options["concurrency"], metrics=metrics,
+                                category_col="CATEGORY")
+    elapsed = time.perf_counter() - start
+
+    summary = metrics.summary()
+    return {
+        "rows": rows,
+        "unique_titles": stats["unique_titles"],
+        "model_calls": model.calls,
+        "rejected_calls": model.rejected,
+        "sources": dict(stats["sources"]),
+        "errors": stats["errors"],
+        "retries": summary["retries"]["total"],
+        "hedges": summary["hedges"],
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed, 1),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "latency_seconds": summary["latency_seconds"],
+        "queue_seconds": summary["queue_seconds"],
+        "cascade": summary["cascade"],
+        "blank_titles_left": int(df["Updated Title"].isna().sum()),
+    }
+
+
+def _run_in_child(rows, options) -> dict:
+    # A fresh interpreter per size, so peak RSS belongs to that size alone
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        return pool.apply(run_once, (rows, options))
+
+
+def compare(results, baseline, max_regression) -> list:
+    """Returns a description of every size whose throughput or memory regressed past `max_regression`."""
+    previous = {r["rows"]: r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        before = previous.get(result["rows"])
+        if before is None:
+            continue
+        if result["rows_per_second"] < before["rows_per_second"] * (1 - max_regression):
+            regressions.append(f"{result['rows']:,} rows: {result['rows_per_second']:,} rows/s "
+                               f"vs baseline {before['rows_per_second']:,}")
+        if result["peak_rss_mb"] > before["peak_rss_mb"] * (1 + max_regression):
+            regressions.append(f"{result['rows']:,} rows: peak RSS {result['peak_rss_mb']} MB "
+                               f"vs baseline {before['peak_rss_mb']} MB")
+    return regressions
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="Offline retitling throughput benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="Row counts to run")
+    parser.add_argument("--concurrency", type=int, default=100, help="Maximum calls in flight (default: %(default)s)")
+    parser.add_argument("--unique-ratio", type=float, default=0.5, help="Distinct titles per row (default: %(default)s)")
+    parser.add_argument("--local-share", type=float, default=0.2,
+                        help="Share of distinct titles the local fast path can resolve (default: %(default)s)")
+    parser.add_argument("--latency", choices=["fixed", "uniform", "lognormal"], default="lognormal",
+                        help="Fake call latency distribution (default: %(default)s)")
+    parser.add_argument("--latency-ms", type=float, default=50.0,
+                        help="Fixed latency, uniform mean or lognormal median in ms (default: %(default)s)")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Lognormal sigma (default: %(default)s)")
+    parser.add_argument("--error-rate", type=float, default=0.01, help="Share of calls failing with 500 (default: %(default)s)")
+    parser.add_argument("--burst-every", type=float, default=20.0,
+                        help="Seconds between 429 bursts, 0 to disable (default: %(default)s)")
+    parser.add_argument("--burst-length", type=float, default=1.0, help="Length of each 429 burst in seconds (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    parser.add_argument("--baseline", help="Earlier --output file to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Allowed slowdown / memory growth vs the baseline (default: %(default)s)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    options = {key: value for key, value in vars(args).items()
+               if key not in ("sizes", "output", "baseline", "max_regression")}
+
+    results = []
+    print(f"{'rows':>8} {'rows/s':>10} {'peak MB':>8} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} {'queue p95':>9} "
+          f"{'calls':>7} {'429/500':>8}", file=sys.stderr)
+    for rows in args.sizes:
+        result = _run_in_child(rows, options)
+        latency = result["latency_seconds"]
+        print(f"{rows:>8,} {result['rows_per_second']:>10,.1f} {result['peak_rss_mb']:>8.1f} "
+              f"{latency['p50'] or 0:>7.3f} {latency['p95'] or 0:>7.3f} {latency['p99'] or 0:>7.3f} "
+              f"{result['queue_seconds']['p95'] or 0:>9.3f} "
+              f"{result['model_calls']:>7,} {result['rejected_calls']:>8,}", file=sys.stderr)
+        results.append(result)
+
+    report = {"options": options, "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+import io
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+
+# ==========================
+# Streaming Catalog I/O
+# ==========================
+SUPPORTED_FORMATS = ("xlsx", "csv", "parquet")
+DEFAULT_CHUNKSIZE = 5000
+
+MIME_TYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def file_format(path) -> str:
+    """Returns "xlsx", "csv" or "parquet" from the file extension."""
+    extension = os.path.splitext(str(path))[1].lower().lstrip(".")
+    if extension not in SUPPORTED_FORMATS:
+        raise ValueError(f"Unsupported file type '.{extension}' (expected one of: {', '.join(SUPPORTED_FORMATS)})")
+    return extension
+
+
+def iter_chunks(source, chunksize=DEFAULT_CHUNKSIZE, fmt=None):
+    """
+    Yields a file path or file-like object as DataFrames of at most `chunksize` rows without
+    loading it whole. xlsx is read through openpyxl's read-only mode, Parquet by record batch,
+    CSV by pandas chunks. `fmt` is required when `source` has no usable name.
+    """
+    fmt = fmt or file_format(getattr(source, "name", source))
+    if fmt == "csv":
+        yield from pd.read_csv(source, chunksize=chunksize)
+    elif fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(source)
+        for batch in parquet_file.iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(source, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            columns = [f"Unnamed: {i}" if name is None else str(name) for i, name in enumerate(header)]
+            buffer = []
+            for row in rows:
+                buffer.append(row)
+                if len(buffer) == chunksize:
+                    yield pd.DataFrame(buffer, columns=columns)
+                    buffer = []
+            if buffer:
+                yield pd.DataFrame(buffer, columns=columns)
+        finally:
+            workbook.close()
+
+
+def read_table(source, fmt=None, chunksize=DEFAULT_CHUNKSIZE):
+    """Reads a whole file (path or upload) into one DataFrame; xlsx goes through the read-only row stream."""
+    fmt = fmt or file_format(getattr(source, "name", source))
+    if fmt == "csv":
+        return pd.read_csv(source)
+    if fmt == "parquet":
+        return pd.read_parquet(source)
+    chunks = list(iter_chunks(source, chunksize=chunksize, fmt=fmt))
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+
+
+def write_table(df, fmt, chunksize=DEFAULT_CHUNKSIZE) -> bytes:
+    """Serializes `df` to xlsx, CSV or Parquet bytes, streaming it in chunks (write-only for xlsx)."""
+    output = io.BytesIO()
+    schema = parquet_schema([_arrow_schema(df)]) if fmt == "parquet" else None
+    with ChunkWriter(output, fmt=fmt, schema=schema) as writer:
+        for start in range(0, max(len(df), 1), chunksize):
+            writer.write(df.iloc[start:start + chunksize])
+    return output.getvalue()
+
+
+def parquet_schema(schemas):
+    """
+    One Arrow schema for chunks that were inferred separately: a column keeps the type of the
+    chunks where it is not empty, numeric types are widened (int64 with float64 → float64), and a
+    column that is empty everywhere or has conflicting types is stored as strings.
+    """
+    import pyarrow as pa
+
+    fields = {}
+    for schema in schemas:
+        for field in schema:
+            fields.setdefault(field.name, []).append(field.type)
+    unified = []
+    for name, types in fields.items():
+        types = [t for t in dict.fromkeys(types) if not pa.types.is_null(t)]
+        try:
+            field_type = pa.unify_schemas([pa.schema([(name, t)]) for t in types],
+                                          promote_options="permissive").field(name).type if types else pa.string()
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            field_type = pa.string()
+        unified.append(pa.field(name, field_type))
+    return pa.schema(unified)
+
+
+class ChunkWriter:
+    """
+    Appends DataFrame chunks to an xlsx, CSV or Parquet file (path or binary file-like) as they arrive.
+    xlsx uses openpyxl's write-only mode. A Parquet file has a single schema, and a column that is
+    empty in early chunks only shows its type later, so unless `schema` is given, Parquet chunks are
+    spooled to temporary Arrow files and written on close under the schema of all of them
+    (see `parquet_schema`). Use as a context manager so the file is finalized on exit.
+    """
+
+    def __init__(self, path, fmt=None, schema=None):
+        self.path = path
+        self.format = fmt or file_format(path)
+        self.rows_written = 0
+        self._handle = None
+        self._writer = None
+        self._schema = schema
+        self._spool = []
+        self._spool_dir = None
+
+    def write(self, chunk):
+        if self.format == "csv":
+            if self._handle is None:
+                if isinstance(self.path, (str, os.PathLike)):
+                    self._handle = open(self.path, "w", newline="", encoding="utf-8")
+                else:
+                    self._handle = io.TextIOWrapper(self.path, encoding="utf-8", newline="")
+                chunk.to_csv(self._handle, index=False)
+            else:
+                chunk.to_csv(self._handle, index=False, header=False)
+        elif self.format == "parquet":
+            import pyarrow.parquet as pq
+
+            if self._schema is None:
+                self._spool_chunk(_arrow_table(chunk))
+            else:
+                if self._writer is None:
+                    self._writer = pq.ParquetWriter(self.path, self._schema)
+                self._writer.write_table(_cast(_arrow_table(chunk), self._schema))
+        else:
+            from openpyxl import Workbook
+
+            if self._writer is None:
+                self._writer = Workbook(write_only=True)
+                self._handle = self._writer.create_sheet()
+                self._handle.append([str(c) for c in chunk.columns])
+            for row in chunk.itertuples(index=False, name=None):
+                self._handle.append([None if _is_missing(v) else v for v in row])
+        self.rows_written += len(chunk)
+
+    def close(self):
+        if self.format == "csv":
+            if isinstance(self._handle, io.TextIOWrapper):
+                # Leave the caller's binary buffer open
+                self._handle.flush()
+                self._handle.detach()
+            elif self._handle is not None:
+                self._handle.close()
+        elif self.format == "parquet":
+            if self._spool:
+                self._write_spool()
+            if self._writer is not None:
+                self._writer.close()
+        elif self._writer is not None:
+            self._writer.save(self.path)
+        self._handle = self._writer = None
+
+    def _spool_chunk(self, table):
+        import pyarrow as pa
+
+        if self._spool_dir is None:
+            self._spool_dir = tempfile.mkdtemp(prefix="retitling-parquet-")
+        path = os.path.join(self._spool_dir, f"{len(self._spool):06d}.arrow")
+        with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as spool_writer:
+            spool_writer.write_table(table)
+        self._spool.append((path, table.schema))
+
+    def _write_spool(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        try:
+            self._schema = parquet_schema(schema for _, schema in self._spool)
+            self._writer = pq.ParquetWriter(self.path, self._schema)
+            for path, _ in self._spool:
+                with pa.memory_map(path) as source:
+                    self._writer.write_table(_cast(pa.ipc.open_file(source).read_all(), self._schema))
+        finally:
+            shutil.rmtree(self._spool_dir, ignore_errors=True)
+            self._spool, self._spool_dir = [], None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _arrow_ready(df):
+    """
+    `df` with every object column of mixed value types (e.g. a SKU column holding both ints and
+    strings) turned into text, which Arrow cannot otherwise convert; missing values stay missing.
+    """
+    mixed = [position for position in range(df.shape[1])
+             if df.iloc[:, position].dtype == object
+             and pd.api.types.infer_dtype(df.iloc[:, position], skipna=True) in ("mixed", "mixed-integer")]
+    if not mixed:
+        return df
+    df = df.copy(deep=False)
+    for position in mixed:
+        df.isetitem(position, df.iloc[:, position].map(lambda v: v if _is_missing(v) else str(v)))
+    return df
+
+
+def _arrow_schema(df):
+    import pyarrow as pa
+
+    return pa.Schema.from_pandas(_arrow_ready(df), preserve_index=False)
+
+
+def _arrow_table(df):
+    import pyarrow as pa
+
+    return pa.Table.from_pandas(_arrow_ready(df), preserve_index=False)
+
+
+def _cast(table, schema):
+    """`table` under `schema` (only ever a widening, or a conversion to strings)."""
+    import pyarrow as pa
+
+    columns = []
+    for field in schema:
+        column = table.column(field.name)
+        if column.type != field.type:
+            column = column.cast(field.type, safe=False)
+        columns.append(column)
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def _is_missing(value):
+    try:
+        return bool(pd.isna(value))
+    except (TypeError, ValueError):
+        return False
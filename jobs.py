@@ -0,0 +1,153 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from luxury_correction import DEFAULT_CONCURRENCY
+from metrics import RunMetrics
+from pipeline import fill_missing_titles, NEAR_DUPLICATE_COLUMN
+from run_journal import journal_for
+from session_store import compact_frame, with_columns
+
+# ==========================
+# Background Jobs
+# ==========================
+JOB_WORKERS = int(os.getenv("RETITLING_JOB_WORKERS", "2"))
+# Finished jobs (and their frames) are dropped from the store after this long
+JOB_RETENTION_HOURS = float(os.getenv("RETITLING_JOB_RETENTION_HOURS", "24"))
+
+ACTIVE_STATUSES = ("queued", "running")
+FINISHED_STATUSES = ("completed", "cancelled", "failed")
+
+
+class Job:
+    """
+    One submitted file being retitled on a worker thread; progress fields are read by the UI.
+    The job works on a copy of just the columns it reads and writes, so the submitted frame
+    (e.g. an upload shared between sessions) is never modified; it is only read for partial
+    downloads and released when the job finishes.
+    """
+
+    def __init__(self, df, name_col, title_col, file_name, file_hash, concurrency, category_col=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.source = df
+        self.df = df[list(dict.fromkeys(c for c in (name_col, title_col, category_col) if c is not None))].copy()
+        self.name_col = name_col
+        self.title_col = title_col
+        self.category_col = category_col
+        self.file_name = file_name
+        self.file_hash = file_hash
+        self.concurrency = concurrency
+        self.status = "queued"
+        self.completed = 0
+        self.total = None
+        self.stats = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.metrics = RunMetrics()
+        self.cancel_event = threading.Event()
+        # Held while the worker writes to `df`
+        self.lock = threading.Lock()
+
+    def snapshot(self) -> dict:
+        end = self.finished_at or time.time()
+        return {
+            "id": self.id,
+            "file_name": self.file_name,
+            "status": self.status,
+            "completed": self.completed,
+            "total": self.total,
+            "elapsed_seconds": end - self.started_at if self.started_at else 0.0,
+            "stats": self.stats,
+            "error": self.error,
+        }
+
+    def partial_frame(self):
+        """The submitted frame with every title filled so far."""
+        columns = self.result_columns()
+        return with_columns(self.source, columns) if self.source is not None else columns
+
+    def result_columns(self):
+        """Compact copy of the columns the job writes (titles and near-duplicate flags), as filled so far."""
+        with self.lock:
+            columns = [c for c in (self.title_col, NEAR_DUPLICATE_COLUMN) if c is not None and c in self.df.columns]
+            return compact_frame(self.df[columns])
+
+    def _on_progress(self, completed, total):
+        self.completed = completed
+        self.total = total
+
+
+class JobStore:
+    """
+    Process-wide registry of retitling jobs. Jobs run on their own executor, independent of
+    any Streamlit session, so they keep going across reruns and closed tabs.
+    """
+
+    def __init__(self, max_workers=JOB_WORKERS):
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="retitling-job")
+
+    def submit(self, df, name_col, title_col, file_name, file_hash, concurrency=DEFAULT_CONCURRENCY,
+               category_col=None) -> str:
+        """Queues `df` for processing and returns the new job's ID. `category_col` routes titles to category prompts."""
+        job = Job(df, name_col, title_col, file_name, file_hash, concurrency, category_col)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job)
+        return job.id
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None and job.status in ACTIVE_STATUSES:
+            job.cancel_event.set()
+
+    def _run(self, job):
+        if job.cancel_event.is_set():
+            job.status = "cancelled"
+            job.finished_at = time.time()
+            return
+
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            with journal_for(job.file_hash) as journal:
+                job.stats = fill_missing_titles(
+                    job.df,
+                    job.name_col,
+                    job.title_col,
+                    concurrency=job.concurrency,
+                    progress_callback=job._on_progress,
+                    journal=journal,
+                    replayed=journal.replay(),
+                    cancel_event=job.cancel_event,
+                    lock=job.lock,
+                    metrics=job.metrics,
+                    category_col=job.category_col,
+                    near_duplicate_col=NEAR_DUPLICATE_COLUMN,
+                )
+            job.status = "cancelled" if job.stats["cancelled"] else "completed"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            # Finished jobs are kept for reattaching; their titles no longer need to be Python objects
+            with job.lock:
+                job.df = compact_frame(job.df)
+            job.source = None
+            job.finished_at = time.time()
+
+    def _prune(self):
+        cutoff = time.time() - JOB_RETENTION_HOURS * 3600
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at and job.finished_at < cutoff:
+                del self._jobs[job_id]
@@ -0,0 +1,146 @@
+import re
+
+from result_schema import ATTRIBUTE_KEYS
+
+# ==========================
+# Local Rule-Based Extractor
+# ==========================
+# Vocabulary list in luxury_data → (attribute, detected category or None)
+VOCABULARY_FIELDS = {
+    "brands": ("brand", None),
+    "sizes": ("size", None),
+    "colors": ("color", None),
+    "materials": ("material", None),
+    "handbag_subcategories": ("subcategory", "Handbags"),
+    "shoe_subcategories": ("subcategory", "Shoes"),
+    "jewelry_subcategories": ("subcategory", "Fine Jewelry"),
+    "watch_subcategories": ("subcategory", "Watches"),
+}
+
+# Brands whose size/material naming rules are too specific to apply locally
+LLM_ONLY_BRANDS = {"Louis Vuitton", "Hermes"}
+# Only handbags and shoes follow a flat Brand → Style → Size → Color → Material → Subcategory format
+LOCAL_CATEGORIES = {"Handbags", "Shoes"}
+
+GENERIC_SIZES = {"Mini": "XS", "XS": "XS", "Small": "S", "S": "S", "Medium": "M", "M": "M",
+                 "Large": "L", "L": "L", "XL": "XL"}
+# Materials that are written out with "Leather" in their official name
+LEATHER_MATERIALS = {"Patent", "Calfskin", "Lambskin", "Caviar", "Saffiano", "Nappa", "Intrecciato"}
+# Handbag types that read naturally with a "Bag" suffix
+BAG_SUFFIX_SUBCATEGORIES = {"Tote", "Clutch"}
+
+# Apostrophes inside a word belong to it: "Men's" is one token, not "Men" and "s"
+_TOKEN_RE = re.compile(r"[^\W_]+(?:['’][^\W_]+)*")
+
+
+class LocalExtractor:
+    """
+    Extracts attributes from simple titles with one compiled regex over the reference vocabulary
+    and assembles the corrected title without a model call.
+    `extract` returns a result shaped like the Gemini response plus a `confidence` in [0, 1];
+    callers fall back to the model when it is below their threshold.
+    """
+
+    def __init__(self, vocabulary: dict):
+        self._terms = {}
+        for list_name, (field, category) in VOCABULARY_FIELDS.items():
+            for term in vocabulary.get(list_name, []):
+                self._terms.setdefault(term.lower(), (field, term, category))
+
+        # Longest terms first so "Shoulder Bag" wins over "Bag" and "XL" over "L"
+        alternatives = sorted(self._terms, key=len, reverse=True)
+        self._pattern = re.compile(
+            # A term never starts or ends inside a word, including after an apostrophe ("Men's" is not size "S")
+            r"(?<![^\W_])(?<![^\W_]['’])(" + "|".join(re.escape(term) for term in alternatives)
+            + r")(?![^\W_])(?!['’][^\W_])",
+            re.IGNORECASE,
+        )
+
+    def extract(self, product_title) -> dict:
+        title = str(product_title).strip()
+        found = {"brand": [], "size": [], "color": [], "material": [], "subcategory": []}
+        categories = set()
+        leftover = []
+        last_end = 0
+
+        for match in self._pattern.finditer(title):
+            field, canonical, category = self._terms[match.group(0).lower()]
+            leftover.append((len(found["brand"]) > 0, title[last_end:match.start()]))
+            last_end = match.end()
+            if canonical not in found[field]:
+                found[field].append(canonical)
+            if category:
+                categories.add(category)
+        leftover.append((len(found["brand"]) > 0, title[last_end:]))
+
+        # Unrecognized words are accepted as the style only when they form a single run after the brand
+        style_tokens, stray_tokens = [], []
+        for after_brand, text in leftover:
+            tokens = _TOKEN_RE.findall(text)
+            if tokens and after_brand and not style_tokens and not stray_tokens:
+                style_tokens = tokens
+            else:
+                stray_tokens.extend(tokens)
+
+        confidence = self._confidence(found, categories, style_tokens, stray_tokens)
+        attributes = dict.fromkeys(ATTRIBUTE_KEYS)
+        category = next(iter(categories)) if len(categories) == 1 else None
+
+        attributes["brand"] = found["brand"][0] if found["brand"] else None
+        attributes["style"] = " ".join(style_tokens) or None
+        attributes["subcategory"] = found["subcategory"][-1] if found["subcategory"] else None
+
+        size_word = found["size"][0] if found["size"] else None
+        attributes["size"] = GENERIC_SIZES.get(size_word, size_word)
+
+        colors = found["color"]
+        if len(colors) > 3 or "Multicolor" in colors:
+            colors = ["Multicolor"]
+        attributes["color"] = ", ".join(colors) or None
+
+        materials = [m for m in found["material"] if m != "Leather"]
+        if materials:
+            material = materials[0]
+            attributes["material"] = f"{material} Leather" if material in LEATHER_MATERIALS else material
+        elif found["material"]:
+            attributes["material"] = "Leather"
+
+        subcategory = attributes["subcategory"]
+        if category == "Handbags" and subcategory and not subcategory.endswith("Bag"):
+            subcategory = f"{subcategory} Bag"
+
+        parts = [attributes["brand"], attributes["style"], size_word, attributes["color"],
+                 attributes["material"], subcategory]
+        return {
+            "detected_category": category,
+            "attributes": attributes,
+            "corrected_title": " ".join(p for p in parts if p),
+            "confidence": round(confidence, 3),
+        }
+
+    @staticmethod
+    def _confidence(found, categories, style_tokens, stray_tokens) -> float:
+        if len(found["brand"]) != 1 or found["brand"][0] in LLM_ONLY_BRANDS:
+            return 0.0
+        if len(categories) != 1 or not categories <= LOCAL_CATEGORIES or stray_tokens:
+            return 0.0
+        subcategories = found["subcategory"]
+        if len(subcategories) != 1:
+            return 0.0
+        if len(found["size"]) > 1 or any(size in ("PM", "MM", "GM") for size in found["size"]):
+            return 0.0
+
+        confidence = 1.0
+        if "Handbags" in categories and not (subcategories[0].endswith("Bag")
+                                             or subcategories[0] in BAG_SUFFIX_SUBCATEGORIES):
+            confidence -= 0.5
+        if not found["material"]:
+            # The model is expected to infer a missing material
+            confidence -= 0.3
+        elif len([m for m in found["material"] if m != "Leather"]) > 1:
+            confidence -= 0.5
+        if not found["color"]:
+            confidence -= 0.1
+        # Each unknown style word is a chance the model would have normalized it differently
+        confidence -= 0.05 * len(style_tokens)
+        return max(confidence, 0.0)
@@ -2,20 +2,51 @@
 import os
 import json
 import re
-import google.generativeai as genai
-from dotenv import load_dotenv
-
-# Load environment variables from .env
-load_dotenv()
+import time
+import queue
+import asyncio
+import hashlib
+import threading
+from collections import defaultdict, deque
+from pydantic import ValidationError
+from tenacity import AsyncRetrying, Retrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+from result_cache import ResultCache
+from local_extractor import LocalExtractor
+from result_schema import (TitleResult, BatchTitleResult, gemini_schema, parse_result, parse_batch_results,
+                           result_format)
+from metrics import usage_counts
+from backends import create_backend
+from validation import ResultValidator
+from postprocess import normalize_result, normalize_results
+from near_duplicates import NearDuplicateIndex, NEAR_DUPLICATES
 
 # ==========================
-# 1. Configure Gemini API
+# 1. Configuration
 # ==========================
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
-    raise ValueError("GEMINI_API_KEY not found in environment variables")
+# The Gemini SDK and GEMINI_API_KEY (from the environment or .env) are only loaded when the
+# first title is sent to the model; see backends.GeminiBackend.
+MODEL_NAME = "gemini-2.5-pro"
+# Cheaper model tried first; its results are validated locally and only failures go to MODEL_NAME
+FAST_MODEL_NAME = os.getenv("RETITLING_FAST_MODEL", "gemini-2.5-flash")
+# "0" sends every title straight to MODEL_NAME
+CASCADE = os.getenv("RETITLING_CASCADE", "1") != "0"
+# Attempts on the fast model before a title escalates; kept low since escalation is the fallback
+FAST_MAX_ATTEMPTS = int(os.getenv("RETITLING_FAST_MAX_ATTEMPTS", "2"))
+# Deadline per model call; a call still running after it fails as a (retried) timeout
+CALL_TIMEOUT_SECONDS = float(os.getenv("RETITLING_CALL_TIMEOUT", "120"))
+# Duplicate requests allowed, as a share of model calls, when a call outlives the rolling p95 ("0" disables)
+HEDGE_BUDGET = float(os.getenv("RETITLING_HEDGE_BUDGET", "0.05"))
+# The hedge delay is recomputed from the latency window after this many new samples
+HEDGE_RECOMPUTE_EVERY = 20
 
-genai.configure(api_key=api_key)
+# Default ceiling on in-flight requests for the async driver
+DEFAULT_CONCURRENCY = int(os.getenv("RETITLING_CONCURRENCY", "100"))
+# Attempts per title (first call + retries) before it is reported as failed
+MAX_ATTEMPTS = int(os.getenv("RETITLING_MAX_ATTEMPTS", "6"))
+# Local extractor results at or above this confidence are used without calling Gemini
+LOCAL_CONFIDENCE_THRESHOLD = float(os.getenv("RETITLING_LOCAL_THRESHOLD", "0.9"))
+# Ask Gemini for schema-constrained JSON instead of free text ("0" falls back to free-text parsing)
+STRUCTURED_OUTPUT = os.getenv("RETITLING_STRUCTURED_OUTPUT", "1") != "0"
 
 
 
@@ -38,18 +69,36 @@ luxury_data = {
     "watch_subcategories": ["Wristwatch"]
 }
 
+_local_extractor = LocalExtractor(luxury_data)
+_validator = ResultValidator(luxury_data)
+
 # ==========================
-# 3. Luxury Title Correction + Post Processing
+# 3. Prompt
 # ==========================
-def correct_luxury_title(product_title: str) -> dict:
-    """
-    Uses Gemini 2.5 to detect category, extract structured attributes,
-    and generate a corrected luxury title.
-    Also applies post-processing:
-    - Replace "Handbag"/"Bucket Bag" with "Shoulder Bag"
-    - Convert PM/MM/GM sizes to numeric values
-    """
-    prompt = f"""
+PROMPT_CATEGORIES = ("Handbags", "Shoes", "Watches", "Fine Jewelry")
+
+# Catalog category values are matched to a prompt category by words starting with these (checked in order)
+_CATEGORY_KEYWORDS = (
+    ("Watches", ("watch", "wristwatch")),
+    ("Fine Jewelry", ("jewel", "ring", "necklace", "bracelet", "earring", "brooch", "cufflink", "pendant")),
+    ("Shoes", ("shoe", "sneaker", "boot", "loafer", "heel", "sandal", "footwear", "mule", "flats", "pump")),
+    ("Handbags", ("handbag", "bag", "purse", "tote", "clutch", "wallet", "backpack", "leather")),
+)
+_CATEGORY_WORD_RE = re.compile(r"[a-z]+")
+
+
+def prompt_category(value):
+    """Maps a catalog CATEGORY value (e.g. "Women's Handbags", "Fine Jewelry") to a prompt category, or None."""
+    if not isinstance(value, str):
+        return None
+    words = _CATEGORY_WORD_RE.findall(value.lower())
+    for category, keywords in _CATEGORY_KEYWORDS:
+        if any(word.startswith(keywords) for word in words):
+            return category
+    return None
+
+
+_INTRO = """
     You are an expert in luxury fashion products: Handbags, Shoes, Watches, and Fine Jewelry.
     
     Your task:
@@ -60,40 +109,46 @@ def correct_luxury_title(product_title: str) -> dict:
        Use null if missing.
     
     3. Generate a corrected luxury product title using **official naming conventions**:
+"""
 
+_FORMAT_SECTIONS = {
+    "Handbags": """
     ### Handbags:
-    Format → Brand → Style → Size → Color → Material → Subcategory → always end with "Bag" if missing
-
+    Format → Brand → Style → Size → Color → Material → Subcategory
+""",
+    "Shoes": """
     ### Shoes:
     Format → Brand → Style → Size → Color → Material → Subcategory
-
+""",
+    "Watches": """
     ### Watches:
     Format → Brand → Style → Model Name → Model Reference Number → Movement → Chronograph (if applicable) → Dial Color → Case Material → Gemstone → Gender → Wristwatch → Case Diameter
     - The word **“Chronograph”** must appear **after the movement**, not next to the style.
         Example: `IWC Aquatimer IW376805 Automatic Chronograph Black Dial Stainless Steel Men's Wristwatch 44mm`
     - **Do not include “and”** between materials such as "Stainless Steel" and "Yellow Gold".
         Example: `Jaeger-LeCoultre Reverso Classique 261.5.08 Silver Dial Stainless Steel 18k Yellow Gold Women's Wristwatch 20mm`
-
+""",
+    "Fine Jewelry": """
     ### Fine Jewelry:
     Format → Brand → Style → Serial Number → Movement → Dial Color → Material → Gender → Category → Case Size
-    
+    """,
+}
+
+_GENERAL_RULES = """
     4. Important rules:
        - Always expand the material to its **full official name** (e.g., "Clemence" → "Taurillon Clémence Leather", "Togo" → "Togo Calfskin Leather").
        - Color normalization:
-         - Extract all colors appearing in the title.
-         - If more than 3 distinct colors are mentioned → use "Multicolor".
-         - If 3 or fewer colors are mentioned → list them separated by commas, preserving order (e.g., "Black, Beige, Gold").
-         - Avoid repeating "Multicolor" or any color.
+         - Extract all colors appearing in the title and list them separated by commas, preserving order (e.g., "Black, Beige, Gold").
          - Use only official luxury color names from the provided list.
          - If no valid color is detected → use null
        - If the material is missing, infer the most likely luxury material.
        - Normalize subcategories:
          - Use the most specific **subcategory/type** if evident from the product title.
          - If no specific type is evident, use the main subcategory.
-         - For handbags, always ensure "Bag" is at the end.
-        - Don't repeat the same word twice in the title
-        - The language must be English only — replace any special characters with their correct English letters (e.g., é → e, @ → a, > → g)
-    
+        - The language must be English only — replace any special characters with their correct English letters (e.g., @ → a, > → g)
+    """
+
+_HANDBAG_RULES = """
     5. Handbag Subcategory/Type Selection:
        - Main subcategories: Totes, Belt Bags, Backpacks, Clutches, Crossbody Bags, Shoulder Bags, Satchels, Luggage & Travel, Wallets
        - Secondary/specific types: Beach, Fanny Pack, Bucket Backpack, Wristlet, Messenger, Hobo, Top Handle Bags, Suitcases, Card Holder, Shopper, Mini Backpacks, Bucket Bag, Saddle, Duffel Bag, Coin Purse, Mini Bag, Briefcases, Long Wallet, Wallet on Chain, Diaper Bag, Gym Bag
@@ -106,89 +161,925 @@ def correct_luxury_title(product_title: str) -> dict:
     6. Size normalization logic:
     
     ### Louis Vuitton
-    - strictly use PM, MM, GM for size if it is in title for Louis Vuitton items.
-    - Nano / Micro → XS, PM → S, MM → M, GM → L
-    - Map descriptive words: Mini/Nano → XS, Small/PM → S, Medium/MM → M, Large/GM → L
-    - Return **Generic Size (XS/S/M/L)** for internal attributes but maintain PM/MM/GM in corrected title.
+    - strictly use PM, MM, GM for size if it is in title for Louis Vuitton items, and keep PM/MM/GM in the corrected title.
     
     ### Hermes
     - Sizes for Hermes should remain exact as per style (Picotin, Constance, Lindy, Evelyne, Herbag, Jypsiere, Bride-a-Brac, Jige, 24/24, Bolide, Garden Party, Roulis, Verrou, Della Cavalleria, Geta, In The Loop, Hac a Dos)
     - **Do not convert Hermès sizes to XS/S/M/L. Use exact label.**
-    
+    """
+
+_WATCH_RULES = """
     7. Watches
     - Extract model info from **reference number**, not title.
     - Include dial color if available.
     - Correct gender based on reference number, not title.
-    
+    """
+
+_REFERENCE_LABELS = {
+    "brands": "Brands",
+    "sizes": "Sizes",
+    "colors": "Colors",
+    "materials": "Materials",
+    "handbag_subcategories": "Handbag subcategories",
+    "shoe_subcategories": "Shoe subcategories",
+    "jewelry_subcategories": "Jewelry subcategories",
+    "watch_subcategories": "Watch subcategories",
+}
+
+# Rule sections and reference lists each category's compact prompt keeps
+_CATEGORY_SECTIONS = {
+    "Handbags": ((_HANDBAG_RULES,), ("brands", "sizes", "colors", "materials", "handbag_subcategories")),
+    "Shoes": ((), ("brands", "sizes", "colors", "materials", "shoe_subcategories")),
+    "Watches": ((_WATCH_RULES,), ("brands", "colors", "watch_subcategories")),
+    "Fine Jewelry": ((), ("brands", "colors", "materials", "jewelry_subcategories")),
+}
+
+
+def build_instructions(category=None) -> str:
+    """
+    Builds the static instruction block and reference data sent as the system instruction.
+    For one of PROMPT_CATEGORIES only that category's format, rules and reference lists are
+    included; any other value gives the full prompt covering every category.
+    """
+    if category in _CATEGORY_SECTIONS:
+        formats = [_FORMAT_SECTIONS[category]]
+        rules, reference = _CATEGORY_SECTIONS[category]
+    else:
+        formats = [_FORMAT_SECTIONS[c] for c in PROMPT_CATEGORIES]
+        rules, reference = (_HANDBAG_RULES, _WATCH_RULES), tuple(_REFERENCE_LABELS)
+
+    reference_lines = "\n    ".join(f"{_REFERENCE_LABELS[key]}: {', '.join(luxury_data[key])}" for key in reference)
+    return (_INTRO + "".join(formats) + _GENERAL_RULES + "".join(rules)
+            + f"""
     8. Reference data:
     
-    Brands: {', '.join(luxury_data['brands'])}
-    Sizes: {', '.join(luxury_data['sizes'])}
-    Colors: {', '.join(luxury_data['colors'])}
-    Materials: {', '.join(luxury_data['materials'])}
-    Handbag subcategories: {', '.join(luxury_data['handbag_subcategories'])}
-    Shoe subcategories: {', '.join(luxury_data['shoe_subcategories'])}
-    Jewelry subcategories: {', '.join(luxury_data['jewelry_subcategories'])}
-    Watch subcategories: {', '.join(luxury_data['watch_subcategories'])}
-    
-    Input title: "{product_title}"
-    
-    Return a single JSON object:
-    {{
-      "detected_category": "category",
-      "attributes": {{
-          "brand": "value or null",
-          "style": "value or null",
-          "size": "Hermès exact label or Generic Size (XS/S/M/L) or null",
-          "color": "value or null",
-          "material": "value or null",
-          "subcategory": "most appropriate subcategory/type or null",
-          "model_name": "value or null",
-          "model_reference_number": "value or null",
-          "dial_color": "value or null",
-          "case_material": "value or null",
-          "gender": "value or null",
-          "case_diameter": "value or null"
-      }},
-      "corrected_title": "Final corrected title with normalized size, subcategory, 'Bag' suffix, and color deduplication"
-    }}
-    """
-
-
-
-    model = genai.GenerativeModel("gemini-2.5-pro")
-    response = model.generate_content(prompt)
-
-    result_text = response.text.strip()
+    {reference_lines}
+    """)
+
+
+# Shown to the model only without structured output; with it, the response schema says the same
+RESULT_FORMAT = result_format()
+
+
+def build_system_instruction(category=None) -> str:
+    if STRUCTURED_OUTPUT:
+        return build_instructions(category)
+    return build_instructions(category) + """
+    Result format (one JSON object per input title):""" + RESULT_FORMAT
+
+
+# Built once at import: the rules, reference lists and, without structured output, the result
+# format go into the model's system instruction, so each request only carries the title(s) being corrected.
+# Rules that can be applied deterministically (repeated words, accents, "Multicolor", the "Bag"
+# suffix, Louis Vuitton generic sizes) are left to postprocess.py instead of the prompt.
+# Titles with a known category get a compact variant holding only that category's rules.
+SYSTEM_INSTRUCTION = build_system_instruction()
+CATEGORY_SYSTEM_INSTRUCTIONS = {category: build_system_instruction(category) for category in PROMPT_CATEGORIES}
+
+TITLE_PROMPT_TEMPLATE = """Input title: "{product_title}"
+
+Return a single JSON object in the result format."""
+
+BATCH_PROMPT_TEMPLATE = """Input titles (JSON array, numbered from 0):
+{titles_json}
+
+Return a JSON array with exactly {count} objects, one per input title, in input order.
+Each object must add an "index" field holding the title's position in the input array
+and otherwise follow the result format."""
+
+
+def build_prompt(product_title: str) -> str:
+    """Builds the per-request content for a single product title."""
+    return TITLE_PROMPT_TEMPLATE.format(product_title=product_title)
+
+
+def build_batch_prompt(product_titles: list) -> str:
+    """Builds one request that asks for a JSON array of results, one per title."""
+    return BATCH_PROMPT_TEMPLATE.format(
+        titles_json=json.dumps([str(t) for t in product_titles], ensure_ascii=False),
+        count=len(product_titles),
+    )
+
+
+# Structured-output mode: responses are constrained to the pydantic result schema
+if STRUCTURED_OUTPUT:
+    TITLE_GENERATION_CONFIG = {
+        "response_mime_type": "application/json",
+        "response_schema": gemini_schema(TitleResult),
+    }
+    BATCH_GENERATION_CONFIG = {
+        "response_mime_type": "application/json",
+        "response_schema": gemini_schema(BatchTitleResult, many=True),
+    }
+else:
+    TITLE_GENERATION_CONFIG = BATCH_GENERATION_CONFIG = None
+
+
+# Changes whenever the prompt wording or the models change, so stale cache entries stop matching
+PROMPT_FINGERPRINT = hashlib.sha256(
+    (MODEL_NAME + (FAST_MODEL_NAME if CASCADE else "") + SYSTEM_INSTRUCTION
+     + "".join(CATEGORY_SYSTEM_INSTRUCTIONS.values()) + TITLE_PROMPT_TEMPLATE).encode("utf-8")
+).hexdigest()[:16]
+
+
+# ==========================
+# 4. Model Client
+# ==========================
+# One backend per (tier, prompt category), since the system instruction is bound to the model
+_models = {}
+# Backends installed by `set_model`, keyed by tier; they serve every category
+_replacements = {}
+_model_lock = threading.Lock()
+
+
+def build_backend(name=None, model_name=MODEL_NAME, category=None):
+    """
+    Creates the named backend ("gemini", "fake"; default RETITLING_BACKEND) with this module's
+    model settings and the system instruction for `category` (full prompt when None or unknown).
+    """
+    return create_backend(
+        name,
+        model_name=model_name,
+        system_instruction=CATEGORY_SYSTEM_INSTRUCTIONS.get(category, SYSTEM_INSTRUCTION),
+        generation_config=TITLE_GENERATION_CONFIG,
+    )
+
+
+def _shared_backend(tier, category):
+    if tier in _replacements:
+        return _replacements[tier]
+    category = category if category in CATEGORY_SYSTEM_INSTRUCTIONS else None
+    key = (tier, category)
+    if key not in _models:
+        with _model_lock:
+            if key not in _models:
+                _models[key] = build_backend(model_name=FAST_MODEL_NAME if tier == "fast" else MODEL_NAME,
+                                             category=category)
+    return _models[key]
+
+
+def get_model(category=None):
+    """
+    Returns the shared model backend for a prompt category. Each is created once per process so
+    every thread and the async loop reuse the same client and transport channel.
+    """
+    return _shared_backend("pro", category)
+
+
+def get_fast_model(category=None):
+    """Returns the shared backend for the cascade's first tier (FAST_MODEL_NAME)."""
+    return _shared_backend("fast", category)
+
+
+def set_model(model, fast_model=None):
+    """
+    Replaces the shared model backends with any objects exposing `generate_content` and
+    `generate_content_async`, e.g. `backends.FakeBackend` for offline runs.
+    `fast_model` defaults to `model`, so both cascade tiers use the replacement for every category.
+    """
+    with _model_lock:
+        _replacements["pro"] = model
+        _replacements["fast"] = fast_model if fast_model is not None else model
+
+
+# ==========================
+# 5. Result Cache
+# ==========================
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+_cache = None
+_cache_lock = threading.Lock()
+_near_duplicates = None
+
+
+def normalize_title(product_title) -> str:
+    """Lowercases, strips punctuation and collapses whitespace so equivalent titles share a key."""
+    text = _PUNCTUATION_RE.sub(" ", str(product_title).lower())
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def cache_key(product_title) -> str:
+    return f"{PROMPT_FINGERPRINT}:{normalize_title(product_title)}"
+
+
+def get_cache() -> ResultCache:
+    """Returns the process-wide result cache, opening it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache()
+    return _cache
+
+
+def get_near_duplicate_index() -> NearDuplicateIndex:
+    """
+    Returns the process-wide near-duplicate index of cached titles. On first use it is seeded
+    from the result cache on a background thread; lookups made meanwhile see the titles added so far.
+    """
+    global _near_duplicates
+    if _near_duplicates is None:
+        with _cache_lock:
+            if _near_duplicates is None:
+                index = NearDuplicateIndex(luxury_data)
+                prefix = cache_key("")
+                threading.Thread(
+                    target=lambda: index.add_many(key[len(prefix):] for key in get_cache().keys(prefix)),
+                    name="retitling-near-duplicates", daemon=True,
+                ).start()
+                _near_duplicates = index
+    return _near_duplicates
+
+
+def _cache_result(product_title, result):
+    """Stores a model result in the result cache and indexes its title for near-duplicate reuse."""
+    get_cache().put(cache_key(product_title), result)
+    if NEAR_DUPLICATES:
+        get_near_duplicate_index().add(normalize_title(product_title))
+
+
+def _near_duplicate_result(product_title):
+    """The cached result of an indexed near-duplicate of `product_title`, flagged as reused, or None."""
+    match = get_near_duplicate_index().lookup(normalize_title(product_title))
+    if match is None:
+        return None
+    matched_title, similarity = match
+    cached = get_cache().get(cache_key(matched_title))
+    if cached is None:
+        return None
+    return {**cached, "source": "near_duplicate", "near_duplicate_of": matched_title,
+            "similarity": round(similarity, 3)}
+
+
+# ==========================
+# 6. Response Parsing + Post Processing
+# ==========================
+def _parse_response(result_text: str) -> dict:
+    result_text = result_text.strip()
+    if STRUCTURED_OUTPUT:
+        # A single validated load; anything off-schema is reported rather than guessed at
+        try:
+            return parse_result(result_text)
+        except ValidationError as e:
+            return {"error": f"Gemini response did not match the result schema ({e.error_count()} errors)",
+                    "raw_response": result_text}
     try:
-        result_json = json.loads(result_text)
+        return json.loads(result_text)
     except:
         match = re.search(r'\{.*\}', result_text, re.DOTALL)
         if match:
-            result_json = json.loads(match.group(0))
-        else:
-            result_json = {"error": "Failed to parse Gemini response", "raw_response": result_text}
-            return result_json
+            return json.loads(match.group(0))
+        return {"error": "Failed to parse Gemini response", "raw_response": result_text}
+
+
+def _is_valid_result(item) -> bool:
+    return (
+        isinstance(item, dict)
+        and isinstance(item.get("corrected_title"), str)
+        and bool(item["corrected_title"].strip())
+        and isinstance(item.get("attributes"), dict)
+    )
+
+
+# ==========================
+# 7. Retries + Adaptive Concurrency
+# ==========================
+THROTTLE_STATUS_CODES = {429, 503}
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# gRPC status names surfaced by the async transport, mapped to their HTTP equivalents
+_GRPC_STATUS_TO_HTTP = {
+    "RESOURCE_EXHAUSTED": 429,
+    "UNAVAILABLE": 503,
+    "INTERNAL": 500,
+    "DEADLINE_EXCEEDED": 504,
+}
+
+
+def _status_code(exc):
+    code = getattr(exc, "code", None)
+    if callable(code):
+        code = code()
+    try:
+        return int(code)
+    except (TypeError, ValueError):
+        return _GRPC_STATUS_TO_HTTP.get(getattr(code, "name", None))
 
-    # ==========================
-    # Post Processing
-    # ==========================
-    if "attributes" in result_json:
-        attrs = result_json["attributes"]
 
-        # Subcategory normalization
-        if attrs.get("subcategory"):
-            if attrs["subcategory"].lower() in ["handbag", "bucket bag", "Top Handle Bag"]:
-                attrs["subcategory"] = "Shoulder Bag"
+def is_throttled(exc) -> bool:
+    """True for quota / overload errors that should shrink concurrency."""
+    return _status_code(exc) in THROTTLE_STATUS_CODES
 
 
-        # Update corrected title too
-        corrected_title = result_json.get("corrected_title", "")
+def is_transient(exc) -> bool:
+    """True for errors worth retrying: throttling, server errors, timeouts and dropped connections."""
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    return _status_code(exc) in RETRYABLE_STATUS_CODES
 
-        corrected_title = corrected_title.replace("Handbag", "Shoulder Bag")
-        corrected_title = corrected_title.replace("Bucket Bag", "Shoulder Bag")
 
-        result_json["corrected_title"] = corrected_title
-        result_json["attributes"] = attrs
+def _retry_policy(max_attempts=MAX_ATTEMPTS):
+    return dict(
+        retry=retry_if_exception(is_transient),
+        wait=wait_random_exponential(multiplier=1, max=60),
+        stop=stop_after_attempt(max_attempts),
+        reraise=True,
+    )
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD controller for in-flight requests on one event loop.
+    Starts in slow start (+1 slot per success, doubling each round trip), switches to
+    additive increase (+1 slot per `limit` successes) after the first throttle, and
+    multiplies the limit by `decrease_factor` on 429/503 (at most once per `cooldown` seconds,
+    so one burst of rejections counts as a single congestion signal).
+    """
+
+    def __init__(self, max_limit=DEFAULT_CONCURRENCY, initial_limit=None, min_limit=1,
+                 decrease_factor=0.5, cooldown=2.0):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = float(min(initial_limit or min(10, self.max_limit), self.max_limit))
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.throttle_events = 0
+        self._slow_start = True
+        self._last_decrease = 0.0
+        self._waiters = deque()
+
+    async def acquire(self):
+        while self.in_flight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            await waiter
+        self.in_flight += 1
+
+    def release(self, succeeded=False, throttled=False):
+        self.in_flight -= 1
+        if throttled:
+            self.throttle_events += 1
+            self._slow_start = False
+            now = time.monotonic()
+            if now - self._last_decrease >= self.cooldown:
+                self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                self._last_decrease = now
+        elif succeeded:
+            step = 1.0 if self._slow_start else 1.0 / self.limit
+            self.limit = min(self.max_limit, self.limit + step)
+        self._wake()
+
+    def _wake(self):
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+
+class HedgePolicy:
+    """
+    Decides when to hedge a slow call with a duplicate request. Keeps a rolling window of
+    successful call latencies per key (the cascade tier) and, once `min_samples` are in, hedges
+    calls still running at the window's `quantile`. At most `budget` hedges per model call are
+    sent over the run, which bounds the extra API spend.
+    """
+
+    def __init__(self, budget=HEDGE_BUDGET, quantile=0.95, window=500, min_samples=20, min_delay=0.05):
+        self.budget = budget
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.calls = 0
+        self.hedges = 0
+        self._latencies = defaultdict(lambda: deque(maxlen=window))
+        self._samples = defaultdict(int)
+        self._delays = {}
+
+    def delay(self, key):
+        """Seconds to wait before hedging a call starting now, or None when it should not be hedged."""
+        self.calls += 1
+        if self.budget <= 0:
+            return None
+        latencies = self._latencies[key]
+        if len(latencies) < self.min_samples:
+            return None
+        if key not in self._delays:
+            ordered = sorted(latencies)
+            self._delays[key] = max(self.min_delay, ordered[min(len(ordered) - 1, int(self.quantile * len(ordered)))])
+        return self._delays[key]
+
+    def try_spend(self) -> bool:
+        if self.hedges + 1 > self.budget * self.calls:
+            return False
+        self.hedges += 1
+        return True
+
+    def observe(self, key, seconds):
+        self._latencies[key].append(seconds)
+        # Recomputed lazily rather than on every call; samples are counted apart from the window,
+        # whose length stops changing once it is full
+        self._samples[key] += 1
+        if self._samples[key] % HEDGE_RECOMPUTE_EVERY == 0:
+            self._delays.pop(key, None)
+
+
+async def _call_with_deadline(model, prompt, timeout=CALL_TIMEOUT_SECONDS, hedger=None, key=None, stats=None):
+    """
+    One model request that fails with asyncio.TimeoutError after `timeout` seconds. With a
+    `hedger`, a duplicate is sent once the call outlives the hedge delay (budget permitting);
+    the first successful answer wins and the other request is cancelled.
+    """
+    started = time.perf_counter()
+    pending = {asyncio.ensure_future(model.generate_content_async(prompt))}
+    hedge = None
+    delay = hedger.delay(key) if hedger is not None else None
+    error = None
+    try:
+        while pending:
+            elapsed = time.perf_counter() - started
+            if elapsed >= timeout:
+                raise asyncio.TimeoutError(f"Model call exceeded {timeout:g}s")
+            wait_for = timeout - elapsed
+            if delay is not None:
+                wait_for = min(wait_for, max(0.0, delay - elapsed))
+            done, pending = await asyncio.wait(pending, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if hedger is not None:
+                        hedger.observe(key, time.perf_counter() - started)
+                    if stats is not None and task is hedge:
+                        stats.hedge_wins += 1
+                    return task.result()
+                error = task.exception()
+            if not done and delay is not None and time.perf_counter() - started >= delay:
+                # One hedging decision per call, whether or not the budget allows it
+                delay = None
+                if hedger.try_spend():
+                    hedge = asyncio.ensure_future(model.generate_content_async(prompt))
+                    pending.add(hedge)
+                    if stats is not None:
+                        stats.hedges += 1
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+# ==========================
+# 8. Luxury Title Correction
+# ==========================
+def _resolve_without_model(product_title, use_cache, local_threshold):
+    """
+    Returns a result from the local fast path, the cache or a cached near-duplicate title, or None
+    when the model is needed.
+    """
+    local = _local_extractor.extract(product_title)
+    if local["confidence"] >= local_threshold:
+        local["source"] = "local"
+        return local
+    if use_cache:
+        cached = get_cache().get(cache_key(product_title))
+        if cached is not None:
+            return {**cached, "source": "cache"}
+        if NEAR_DUPLICATES:
+            return _near_duplicate_result(product_title)
+    return None
+
+
+def _finish_model_result(product_title, result_text, use_cache):
+    result_json = _parse_response(result_text)
+    result_json["source"] = "llm"
+    if "error" in result_json:
+        return result_json
+    result_json["model"] = MODEL_NAME
+
+    if use_cache:
+        _cache_result(product_title, result_json)
+
+    return result_json
+
+
+def _accept_fast_result(product_title, result_text, use_cache):
+    """Parses a fast-tier response and returns (and caches) it when it passes local validation, otherwise None."""
+    try:
+        result_json = _parse_response(result_text)
+    except ValueError:
+        return None
+    if "error" in result_json or not _is_valid_result(result_json):
+        return None
+    # Validated after normalization, so only what the rule engine cannot fix escalates
+    result_json = normalize_result(result_json)
+    if _validator.problems(product_title, result_json):
+        return None
+    result_json["source"] = "llm"
+    result_json["model"] = FAST_MODEL_NAME
+
+    if use_cache:
+        _cache_result(product_title, result_json)
 
     return result_json
+
+
+def _post_processed(result, post_process):
+    return normalize_result(result) if post_process else result
+
+
+class _CallStats:
+    """
+    Attempts, limiter wait, token usage and fast-tier time accumulated over the model calls for one title.
+    `retries` only counts attempts after the first within a tier, so escalating to the pro model is not a retry.
+    """
+
+    def __init__(self):
+        self.attempts = 0
+        self.retries = 0
+        self.queued = 0.0
+        self.tokens = (0, 0, 0)
+        self.tier = None
+        self.fast_seconds = 0.0
+        self.escalated = False
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def add_attempts(self, retrying):
+        attempts = retrying.statistics.get("attempt_number", 0)
+        self.attempts += attempts
+        self.retries += max(attempts - 1, 0)
+
+    def add_usage(self, response):
+        self.tokens = tuple(a + b for a, b in zip(self.tokens, usage_counts(response)))
+
+    def end_fast_tier(self, tier_started, accepted):
+        self.fast_seconds = time.perf_counter() - tier_started - self.queued
+        self.tier = "fast" if accepted else None
+        self.escalated = not accepted
+
+
+def _record_call(metrics, started, result, stats=None):
+    """
+    Adds one title's latency, attempts, token usage and cascade tier to `metrics` (a RunMetrics), if given.
+    Seconds spent waiting for a limiter slot are reported apart from the call latency.
+    """
+    if metrics is None:
+        return
+    stats = stats or _CallStats()
+    metrics.record(
+        source=result.get("source", "llm"),
+        latency_seconds=time.perf_counter() - started - stats.queued,
+        category=result.get("detected_category"),
+        queue_seconds=stats.queued,
+        attempts=stats.attempts,
+        retries=stats.retries,
+        tokens=stats.tokens,
+        parse_failed="raw_response" in result,
+        error="error" in result,
+        tier=stats.tier,
+        escalated=stats.escalated,
+        fast_seconds=stats.fast_seconds,
+        hedges=stats.hedges,
+        hedge_wins=stats.hedge_wins,
+    )
+
+
+def _generate(model, prompt, stats, max_attempts=MAX_ATTEMPTS):
+    retrying = Retrying(**_retry_policy(max_attempts))
+    try:
+        response = retrying(model.generate_content, prompt, request_options={"timeout": CALL_TIMEOUT_SECONDS})
+    finally:
+        stats.add_attempts(retrying)
+    stats.add_usage(response)
+    return response
+
+
+async def _generate_async(model, prompt, limiter, stats, max_attempts=MAX_ATTEMPTS, hedger=None, tier=None):
+    """
+    Calls `model` with retries, each attempt bounded by CALL_TIMEOUT_SECONDS and hedged through
+    `hedger` (a HedgePolicy) when given. When a limiter is given each attempt holds one of its slots
+    (shared with its hedge) and reports success or throttling back to it; time spent waiting for a
+    slot is added to `stats`.
+    """
+    retrying = AsyncRetrying(**_retry_policy(max_attempts))
+    try:
+        async for attempt in retrying:
+            with attempt:
+                if limiter is None:
+                    response = await _call_with_deadline(model, prompt, hedger=hedger, key=tier, stats=stats)
+                else:
+                    wait_started = time.perf_counter()
+                    await limiter.acquire()
+                    stats.queued += time.perf_counter() - wait_started
+                    try:
+                        response = await _call_with_deadline(model, prompt, hedger=hedger, key=tier, stats=stats)
+                    except Exception as e:
+                        limiter.release(throttled=is_throttled(e))
+                        raise
+                    limiter.release(succeeded=True)
+    finally:
+        stats.add_attempts(retrying)
+    stats.add_usage(response)
+    return response
+
+
+def correct_luxury_title(product_title: str, use_cache: bool = True,
+                         local_threshold: float = LOCAL_CONFIDENCE_THRESHOLD, metrics=None, category=None,
+                         post_process: bool = True) -> dict:
+    """
+    Uses Gemini 2.5 to detect category, extract structured attributes,
+    and generate a corrected luxury title.
+    Titles the local extractor handles with at least `local_threshold` confidence skip the model,
+    and results are served from / stored in the persistent cache when `use_cache` is set.
+    With CASCADE on, FAST_MODEL_NAME answers first and only titles whose result fails
+    `validation.ResultValidator` (or whose fast call fails) are sent to MODEL_NAME.
+    The returned dict's "source" is "local", "cache", "near_duplicate" or "llm"; model results carry
+    the "model" used, and near-duplicate results the normalized title they reuse ("near_duplicate_of").
+    `category` (a catalog CATEGORY value, see `prompt_category`) selects the compact prompt for
+    that category; titles without a recognised category get the full prompt.
+    Latency, attempts, token usage and parse failures are recorded to `metrics` (a RunMetrics).
+    Results are normalized by `postprocess.normalize_result` unless `post_process` is False, for
+    callers that normalize whole batches themselves (see `pipeline.fill_missing_titles`).
+    """
+    started = time.perf_counter()
+    resolved = _resolve_without_model(product_title, use_cache, local_threshold)
+    if resolved is not None:
+        _record_call(metrics, started, resolved)
+        return _post_processed(resolved, post_process)
+
+    prompt = build_prompt(product_title)
+    category = prompt_category(category)
+    stats = _CallStats()
+    if CASCADE:
+        tier_started = time.perf_counter()
+        try:
+            response = _generate(get_fast_model(category), prompt, stats, FAST_MAX_ATTEMPTS)
+            result = _accept_fast_result(product_title, response.text, use_cache)
+        except Exception:
+            result = None
+        stats.end_fast_tier(tier_started, accepted=result is not None)
+        if result is not None:
+            _record_call(metrics, started, result, stats)
+            return result
+
+    stats.tier = "pro"
+    try:
+        response = _generate(get_model(category), prompt, stats)
+    except Exception as e:
+        _record_call(metrics, started, {"error": str(e)}, stats)
+        raise
+    result = _finish_model_result(product_title, response.text, use_cache)
+    _record_call(metrics, started, result, stats)
+    return _post_processed(result, post_process)
+
+
+async def correct_luxury_title_async(product_title: str, use_cache: bool = True, limiter=None,
+                                     local_threshold: float = LOCAL_CONFIDENCE_THRESHOLD, metrics=None,
+                                     category=None, post_process: bool = True, hedger=None) -> dict:
+    """
+    Async counterpart of `correct_luxury_title`, built on the SDK's `generate_content_async`.
+    Transient errors, including calls past CALL_TIMEOUT_SECONDS, are retried with jittered
+    exponential backoff; when an `AdaptiveConcurrencyLimiter` is given, each attempt holds one of
+    its slots and reports success or throttling back to it. Local and cache hits never take a slot.
+    A `HedgePolicy` duplicates calls that run past the rolling p95 latency.
+    """
+    started = time.perf_counter()
+    resolved = _resolve_without_model(product_title, use_cache, local_threshold)
+    if resolved is not None:
+        _record_call(metrics, started, resolved)
+        return _post_processed(resolved, post_process)
+
+    prompt = build_prompt(product_title)
+    category = prompt_category(category)
+    stats = _CallStats()
+    if CASCADE:
+        tier_started = time.perf_counter()
+        try:
+            response = await _generate_async(get_fast_model(category), prompt, limiter, stats, FAST_MAX_ATTEMPTS,
+                                             hedger=hedger, tier="fast")
+            result = _accept_fast_result(product_title, response.text, use_cache)
+        except Exception:
+            result = None
+        stats.end_fast_tier(tier_started, accepted=result is not None)
+        if result is not None:
+            _record_call(metrics, started, result, stats)
+            return result
+
+    stats.tier = "pro"
+    try:
+        response = await _generate_async(get_model(category), prompt, limiter, stats, hedger=hedger, tier="pro")
+    except Exception as e:
+        _record_call(metrics, started, {"error": str(e)}, stats)
+        raise
+
+    result = _finish_model_result(product_title, response.text, use_cache)
+    _record_call(metrics, started, result, stats)
+    return _post_processed(result, post_process)
+
+
+# ==========================
+# 9. Batched Requests
+# ==========================
+def _parse_batch_response(result_text: str, count: int) -> dict:
+    """Maps input position → result for every well-formed entry of a batched response."""
+    result_text = result_text.strip()
+    if STRUCTURED_OUTPUT:
+        return parse_batch_results(result_text, count)
+    try:
+        items = json.loads(result_text)
+    except:
+        match = re.search(r'\[.*\]', result_text, re.DOTALL)
+        if not match:
+            return {}
+        try:
+            items = json.loads(match.group(0))
+        except:
+            return {}
+    if not isinstance(items, list):
+        return {}
+
+    parsed = {}
+    for position, item in enumerate(items):
+        if not _is_valid_result(item):
+            continue
+        index = item.pop("index", position)
+        if isinstance(index, int) and 0 <= index < count and index not in parsed:
+            parsed[index] = item
+    return parsed
+
+
+def correct_luxury_titles(product_titles: list, batch_size: int = 10, max_retries: int = 2,
+                          use_cache: bool = True, local_threshold: float = LOCAL_CONFIDENCE_THRESHOLD) -> list:
+    """
+    Batched version of `correct_luxury_title`: packs `batch_size` titles into a single request
+    so the instruction block is sent once per batch instead of once per title.
+    Titles whose entries come back missing or malformed are re-sent (up to `max_retries` more rounds).
+    Returns one result dict per input title, in input order.
+    """
+    results = [None] * len(product_titles)
+
+    outstanding = []
+    for i, title in enumerate(product_titles):
+        resolved = _resolve_without_model(title, use_cache, local_threshold)
+        if resolved is not None:
+            results[i] = resolved
+        else:
+            outstanding.append(i)
+
+    model = get_model()
+    last_error = {}
+    for _ in range(max_retries + 1):
+        if not outstanding:
+            break
+        missing = []
+        for start in range(0, len(outstanding), batch_size):
+            chunk = outstanding[start:start + batch_size]
+            titles = [product_titles[i] for i in chunk]
+            try:
+                response = Retrying(**_retry_policy())(
+                    model.generate_content, build_batch_prompt(titles), generation_config=BATCH_GENERATION_CONFIG,
+                    request_options={"timeout": CALL_TIMEOUT_SECONDS},
+                )
+                parsed = _parse_batch_response(response.text, len(chunk))
+            except Exception as e:
+                parsed = {}
+                for i in chunk:
+                    last_error[i] = str(e)
+
+            for position, i in enumerate(chunk):
+                if position not in parsed:
+                    missing.append(i)
+                    continue
+                result_json = parsed[position]
+                result_json["source"] = "llm"
+                results[i] = result_json
+                if use_cache:
+                    _cache_result(product_titles[i], result_json)
+        outstanding = missing
+
+    for i in outstanding:
+        results[i] = {
+            "error": last_error.get(i, "Missing or malformed entry in batched Gemini response"),
+            "source": "llm",
+        }
+
+    return normalize_results(results)
+
+
+# ==========================
+# 10. Async Driver
+# ==========================
+async def correct_titles_async(product_titles: list, concurrency: int = DEFAULT_CONCURRENCY,
+                               on_result=None, use_cache: bool = True,
+                               local_threshold: float = LOCAL_CONFIDENCE_THRESHOLD, metrics=None,
+                               categories=None, post_process: bool = True, limiter=None, hedger=None) -> list:
+    """
+    Corrects every title with at most `concurrency` requests in flight. Within that ceiling an
+    `AdaptiveConcurrencyLimiter` backs off when Gemini throttles and grows again as calls succeed.
+    `on_result(index, result)` is called as each title completes; titles that still fail after
+    all retries are returned as {"error": ...} results. Per-title measurements go to `metrics`.
+    `categories`, when given, holds each title's catalog category and routes it to a compact prompt.
+    With `post_process=False` results are returned un-normalized, for callers that normalize in batches.
+    Every call is bounded by CALL_TIMEOUT_SECONDS, and one HedgePolicy (HEDGE_BUDGET) covers the run.
+    Callers that split one run into several calls (e.g. one per chunk) pass the same `limiter` and
+    `hedger` to each, so the learned concurrency limit, latency window and hedge budget carry over
+    and calls running at the same time share one limit; otherwise each call gets its own.
+    Returns results in input order.
+    """
+    limiter = limiter or AdaptiveConcurrencyLimiter(max_limit=concurrency)
+    hedger = hedger or HedgePolicy()
+    results = [None] * len(product_titles)
+    categories = categories if categories is not None else [None] * len(product_titles)
+
+    async def run_one(index, title):
+        try:
+            return index, await correct_luxury_title_async(
+                title, use_cache=use_cache, limiter=limiter, local_threshold=local_threshold, metrics=metrics,
+                category=categories[index], post_process=post_process, hedger=hedger,
+            )
+        except Exception as e:
+            return index, {"error": str(e), "source": "llm"}
+
+    tasks = [asyncio.create_task(run_one(i, title)) for i, title in enumerate(product_titles)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            index, result = await next_done
+            results[index] = result
+            if on_result:
+                on_result(index, result)
+    finally:
+        # On cancellation, stop the titles still waiting or in flight (no-op for finished tasks)
+        for task in tasks:
+            task.cancel()
+    return results
+
+
+# The SDK caches its async gRPC client globally and binds it to the loop it was created on,
+# so every async call runs on one long-lived loop instead of a fresh asyncio.run() loop.
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _get_loop():
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="retitling-async", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def correct_titles(product_titles: list, concurrency: int = DEFAULT_CONCURRENCY,
+                   on_result=None, progress_callback=None, use_cache: bool = True,
+                   local_threshold: float = LOCAL_CONFIDENCE_THRESHOLD, cancel_event=None, metrics=None,
+                   categories=None, post_process: bool = True, limiter=None, hedger=None) -> list:
+    """
+    Blocking wrapper around `correct_titles_async` for synchronous callers such as Streamlit.
+    `on_result(index, result)` and `progress_callback(completed, total)` run on the calling
+    thread, so they may update UI elements.
+    Setting `cancel_event` (a threading.Event) stops outstanding calls; the results gathered so far
+    are returned with None for titles that never completed. A shared `limiter` may be used by
+    several concurrent calls, since they all run on the one background loop.
+    """
+    completed_queue = queue.Queue()
+    future = asyncio.run_coroutine_threadsafe(
+        correct_titles_async(
+            product_titles,
+            concurrency=concurrency,
+            on_result=lambda index, result: completed_queue.put((index, result)),
+            use_cache=use_cache,
+            local_threshold=local_threshold,
+            metrics=metrics,
+            categories=categories,
+            post_process=post_process,
+            limiter=limiter,
+            hedger=hedger,
+        ),
+        _get_loop(),
+    )
+
+    total = len(product_titles)
+    results = [None] * total
+    completed = 0
+    if progress_callback and total:
+        progress_callback(0, total)
+    while completed < total:
+        if cancel_event is not None and cancel_event.is_set():
+            future.cancel()
+            return results
+        try:
+            index, result = completed_queue.get(timeout=0.5)
+        except queue.Empty:
+            if future.done():
+                break
+            continue
+        completed += 1
+        results[index] = result
+        if on_result:
+            on_result(index, result)
+        if progress_callback:
+            progress_callback(completed, total)
+    return future.result()
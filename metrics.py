@@ -0,0 +1,234 @@
+import csv
+import io
+import json
+import threading
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+
+# ==========================
+# Run Metrics
+# ==========================
+QUANTILES = (0.5, 0.95, 0.99)
+
+CALL_FIELDS = [
+    "source", "category", "latency_seconds", "queue_seconds", "attempts", "retries", "prompt_tokens", "response_tokens",
+    "total_tokens", "parse_failed", "error", "tier", "escalated", "fast_seconds",
+    "hedges", "hedge_wins",
+]
+
+
+def _percentiles(values) -> dict:
+    if not values:
+        return {f"p{int(q * 100)}": None for q in QUANTILES}
+    points = np.percentile(values, [q * 100 for q in QUANTILES])
+    return {f"p{int(q * 100)}": round(float(p), 4) for q, p in zip(QUANTILES, points)}
+
+
+def usage_counts(response) -> tuple:
+    """(prompt, response, total) token counts from a Gemini response's usage metadata; zeros when absent."""
+    usage = getattr(response, "usage_metadata", None)
+    counts = [getattr(usage, field, 0) or 0 for field in
+              ("prompt_token_count", "candidates_token_count", "total_token_count")]
+    return tuple(int(c) for c in counts)
+
+
+class RunMetrics:
+    """
+    Thread-safe per-run collector. One record per corrected title: where the result came from,
+    wall latency (including retries and backoff), time spent queued for a concurrency slot,
+    attempts and retries, token usage, whether the response failed to parse, and the model cascade tier
+    that answered ("fast" or "pro") with the time spent on the fast tier before escalating, and
+    how many hedge requests were sent for it and whether one of them answered first. `summary()` aggregates them
+    into percentiles and per-category breakdowns; `to_json`, `to_csv` and `to_prometheus`
+    export a run report.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._calls = []
+        self._lock = threading.Lock()
+
+    def record(self, source, latency_seconds, category=None, queue_seconds=0.0, attempts=0, retries=None,
+               tokens=(0, 0, 0),
+               parse_failed=False, error=False, tier=None, escalated=False, fast_seconds=0.0,
+               hedges=0, hedge_wins=0):
+        prompt_tokens, response_tokens, total_tokens = tokens
+        call = {
+            "source": source,
+            "category": category or "Unknown",
+            "latency_seconds": round(latency_seconds, 6),
+            "queue_seconds": round(queue_seconds, 6),
+            "attempts": attempts,
+            # Attempts beyond the first of each cascade tier; without tiers, every attempt after the first
+            "retries": max(attempts - 1, 0) if retries is None else retries,
+            "prompt_tokens": prompt_tokens,
+            "response_tokens": response_tokens,
+            "total_tokens": total_tokens,
+            "parse_failed": parse_failed,
+            "error": error,
+            "tier": tier,
+            "escalated": escalated,
+            "fast_seconds": round(fast_seconds, 6),
+            "hedges": hedges,
+            "hedge_wins": hedge_wins,
+        }
+        with self._lock:
+            self._calls.append(call)
+
+    def calls(self) -> list:
+        with self._lock:
+            return list(self._calls)
+
+    def summary(self) -> dict:
+        calls = self.calls()
+        model_calls = [c for c in calls if c["source"] == "llm"]
+        retries = Counter(c["retries"] for c in model_calls)
+
+        by_category = defaultdict(list)
+        for c in model_calls:
+            by_category[c["category"]].append(c)
+        categories = {
+            category: {
+                "calls": len(group),
+                "latency_seconds": _percentiles([c["latency_seconds"] for c in group]),
+                "prompt_tokens": sum(c["prompt_tokens"] for c in group),
+                "response_tokens": sum(c["response_tokens"] for c in group),
+                "retries": sum(c["retries"] for c in group),
+                "parse_failures": sum(c["parse_failed"] for c in group),
+                "errors": sum(c["error"] for c in group),
+            }
+            for category, group in sorted(by_category.items())
+        }
+
+        return {
+            "titles": len(calls),
+            "sources": dict(Counter(c["source"] for c in calls)),
+            "model_calls": len(model_calls),
+            "latency_seconds": _percentiles([c["latency_seconds"] for c in model_calls]),
+            "queue_seconds": _percentiles([c["queue_seconds"] for c in model_calls]),
+            "prompt_tokens": {"total": sum(c["prompt_tokens"] for c in model_calls),
+                              **_percentiles([c["prompt_tokens"] for c in model_calls])},
+            "response_tokens": {"total": sum(c["response_tokens"] for c in model_calls),
+                                **_percentiles([c["response_tokens"] for c in model_calls])},
+            "retries": {"total": sum(n * count for n, count in retries.items()),
+                        "histogram": {str(n): retries[n] for n in sorted(retries)}},
+            "parse_failures": sum(c["parse_failed"] for c in model_calls),
+            "errors": sum(c["error"] for c in model_calls),
+            "hedges": {"sent": sum(c["hedges"] for c in model_calls), "won": sum(c["hedge_wins"] for c in model_calls)},
+            "categories": categories,
+            "cascade": _cascade_summary(model_calls),
+        }
+
+    def to_json(self) -> str:
+        return json.dumps({"started_at": self.started_at, "summary": self.summary(), "calls": self.calls()}, indent=2)
+
+    def to_csv(self) -> str:
+        """One row per title, for spreadsheet analysis."""
+        output = io.StringIO()
+        writer = csv.DictWriter(output, fieldnames=CALL_FIELDS)
+        writer.writeheader()
+        writer.writerows(self.calls())
+        return output.getvalue()
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format (summaries and counters), e.g. for the node exporter's textfile collector."""
+        calls = self.calls()
+        model_calls = [c for c in calls if c["source"] == "llm"]
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        latencies = [c["latency_seconds"] for c in model_calls]
+        metric("retitling_call_latency_seconds", "summary", "Wall latency of Gemini calls, including retries", [
+            ({"quantile": q}, v)
+            for q, v in zip(map(str, QUANTILES), _percentiles(latencies).values()) if v is not None
+        ])
+        lines.append(f"retitling_call_latency_seconds_sum {sum(latencies)}")
+        lines.append(f"retitling_call_latency_seconds_count {len(latencies)}")
+        queued = [c["queue_seconds"] for c in model_calls]
+        metric("retitling_queue_seconds", "summary", "Time Gemini calls waited for a concurrency slot", [
+            ({"quantile": q}, v)
+            for q, v in zip(map(str, QUANTILES), _percentiles(queued).values()) if v is not None
+        ])
+        lines.append(f"retitling_queue_seconds_sum {sum(queued)}")
+        lines.append(f"retitling_queue_seconds_count {len(queued)}")
+
+        by_category = defaultdict(list)
+        for c in model_calls:
+            by_category[c["category"]].append(c["latency_seconds"])
+        metric("retitling_category_latency_seconds", "summary", "Gemini call latency quantiles per detected category", [
+            ({"category": category, "quantile": q}, v)
+            for category, values in sorted(by_category.items())
+            for q, v in zip(map(str, QUANTILES), _percentiles(values).values())
+        ])
+        for category, values in sorted(by_category.items()):
+            label = f'category="{_escape(category)}"'
+            lines.append(f"retitling_category_latency_seconds_sum{{{label}}} {sum(values)}")
+            lines.append(f"retitling_category_latency_seconds_count{{{label}}} {len(values)}")
+
+        metric("retitling_titles_total", "counter", "Titles resolved, by result source",
+               [({"source": s}, n) for s, n in sorted(Counter(c["source"] for c in calls).items())])
+        metric("retitling_tokens_total", "counter", "Gemini tokens used", [
+            ({"kind": "prompt"}, sum(c["prompt_tokens"] for c in model_calls)),
+            ({"kind": "response"}, sum(c["response_tokens"] for c in model_calls)),
+        ])
+        metric("retitling_retries_total", "counter", "Gemini call retries",
+               [({}, sum(c["retries"] for c in model_calls))])
+        metric("retitling_parse_failures_total", "counter", "Gemini responses that failed to parse",
+               [({}, sum(c["parse_failed"] for c in model_calls))])
+        metric("retitling_errors_total", "counter", "Titles that failed after all retries",
+               [({}, sum(c["error"] for c in model_calls))])
+        metric("retitling_hedges_total", "counter", "Duplicate requests sent for slow calls, and how many answered first", [
+            ({"outcome": "sent"}, sum(c["hedges"] for c in model_calls)),
+            ({"outcome": "won"}, sum(c["hedge_wins"] for c in model_calls)),
+        ])
+        metric("retitling_cascade_titles_total", "counter", "Model titles by the cascade tier that answered", [
+            ({"tier": "fast"}, sum(c["tier"] == "fast" for c in model_calls)),
+            ({"tier": "pro", "escalated": "true"}, sum(c["escalated"] for c in model_calls)),
+            ({"tier": "pro", "escalated": "false"}, sum(c["tier"] == "pro" and not c["escalated"] for c in model_calls)),
+        ])
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, path):
+        """Writes the report as JSON, CSV or Prometheus text, chosen by the file extension (.json/.csv/.prom)."""
+        if path.endswith(".csv"):
+            text = self.to_csv()
+        elif path.endswith((".prom", ".txt")):
+            text = self.to_prometheus()
+        else:
+            text = self.to_json()
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+
+
+def _cascade_summary(model_calls) -> dict:
+    """
+    Escalation rate of the fast → pro cascade and an estimate of the call time it saved:
+    every title the fast tier answered would otherwise have taken a mean pro call, less the
+    fast-tier time spent on every title (including the ones that escalated anyway).
+    The saving is summed call time, not wall time, and is None until a pro call has been measured.
+    """
+    fast = [c for c in model_calls if c["tier"] == "fast"]
+    escalated = [c for c in model_calls if c["escalated"]]
+    pro_seconds = [c["latency_seconds"] - c["fast_seconds"] for c in model_calls if c["tier"] == "pro"]
+    tried = len(fast) + len(escalated)
+    fast_total = sum(c["fast_seconds"] for c in fast + escalated)
+    return {
+        "fast_accepted": len(fast),
+        "escalated": len(escalated),
+        "escalation_rate": round(len(escalated) / tried, 4) if tried else None,
+        "fast_seconds": _percentiles([c["fast_seconds"] for c in fast + escalated]),
+        "pro_seconds": _percentiles(pro_seconds),
+        "seconds_saved": round(len(fast) * float(np.mean(pro_seconds)) - fast_total, 3) if pro_seconds else None,
+    }
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
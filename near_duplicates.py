@@ -0,0 +1,186 @@
+import os
+import re
+import threading
+import unicodedata
+from itertools import chain
+
+import numpy as np
+
+# ==========================
+# Near-Duplicate Title Index
+# ==========================
+# Seller feeds list the same product under titles that differ only by noise (SKUs, "AUTHENTIC",
+# condition grades, emoji, word order), and each variant misses the exact-key result cache.
+# Corrected titles are therefore also indexed by a MinHash signature of their noise-stripped form;
+# locality-sensitive hashing over signature bands finds candidates, and a candidate is only reused
+# when its exact similarity clears the threshold and every protected token matches.
+NEAR_DUPLICATES = os.getenv("RETITLING_NEAR_DUPLICATES", "1") != "0"
+# Minimum Jaccard similarity of the character-shingle sets of two noise-stripped titles
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("RETITLING_NEAR_DUPLICATE_THRESHOLD", "0.9"))
+
+SHINGLE_SIZE = 3
+# 6 bands of 4 rows: a pair at the 0.9 threshold shares a band with probability ~0.998
+BANDS = 6
+ROWS_PER_BAND = 4
+NUM_PERMUTATIONS = BANDS * ROWS_PER_BAND
+# Signatures of this many titles are computed together when the index is seeded
+SEED_BATCH_SIZE = 5000
+
+# Multiply-shift hash family: (a·x + b) mod 2^64, top 32 bits; a is odd
+_rng = np.random.default_rng(20240601)
+_PERM_A = _rng.integers(0, 1 << 63, size=NUM_PERMUTATIONS, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_PERM_B = _rng.integers(0, 1 << 63, size=NUM_PERMUTATIONS, dtype=np.uint64)
+
+# Words that say nothing about which product a listing is
+NOISE_WORDS = {
+    "authentic", "authenticated", "authenticity", "genuine", "original", "guaranteed", "100",
+    "new", "nwt", "nwot", "bnwt", "bnib", "nib", "unused", "pre", "owned", "preowned", "used",
+    "excellent", "pristine", "mint", "condition", "like", "rare", "hot", "sale", "free", "shipping",
+}
+# Condition grades: "Rank AB", "Grade A", "Condition: B", "AB Rank"
+_GRADE_WORDS = {"rank", "grade", "condition"}
+_GRADES = {"n", "ns", "s", "sa", "a", "ab", "b", "bc", "c", "d"}
+# Words introducing a seller reference: "SKU 12345", "Item No. 883"
+_SKU_MARKERS = {"sku", "item", "stock", "lot", "upc", "ean", "listing"}
+_SKU_FILLERS = {"no", "number", "code", "id"}
+# Words that turn a listing into a different product ("No Date" vs "Date"), so they must match exactly
+NEGATION_WORDS = {"no", "non", "not", "without", "w/o", "none", "missing"}
+# Standalone codes too long to be a model reference or size: 7+ digits, or 10+ characters with a digit
+_CODE_RE = re.compile(r"^(?=.*\d)(?:\d{7,}|\w{10,})$")
+_DIGIT_RE = re.compile(r"\d")
+
+
+def _fold(text) -> str:
+    if text.isascii():
+        return text.lower()
+    decomposed = unicodedata.normalize("NFKD", str(text))
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+
+
+def _shingles(text) -> set:
+    """
+    Character n-grams of each word of `text`, padded with spaces. Words are separated by two
+    spaces, so no n-gram spans two words and word order does not matter.
+    """
+    padded = f" {text.replace(' ', '  ')} "
+    return {padded[i:i + SHINGLE_SIZE] for i in range(len(padded) - SHINGLE_SIZE + 1)}
+
+
+def _jaccard(a, b) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def _signatures(shingle_sets) -> np.ndarray:
+    """MinHash signature (NUM_PERMUTATIONS values) of each non-empty shingle set, computed in one pass."""
+    lengths = np.fromiter((len(s) for s in shingle_sets), dtype=np.int64, count=len(shingle_sets))
+    # The index lives in memory only, so the built-in (per-process) string hash is stable enough
+    hashes = np.fromiter(map(hash, chain.from_iterable(shingle_sets)), dtype=np.int64, count=int(lengths.sum()))
+    values = (_PERM_A[:, None] * hashes.view(np.uint64)[None, :] + _PERM_B[:, None]) >> np.uint64(32)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    return np.minimum.reduceat(values, starts, axis=1).T
+
+
+class NearDuplicateIndex:
+    """
+    MinHash/LSH index of normalized titles (see `luxury_correction.normalize_title`).
+    Two titles match when their protected tokens (anything containing a digit, negations such as
+    "no" or "without", plus brand, size, color, material and subcategory words from `vocabulary`)
+    are identical, so "Birkin 25" never reuses "Birkin 30", "Black" never reuses "Beige" and
+    "No Date" never reuses "Date", and the Jaccard similarity of the character shingles of their
+    noise-stripped words is at least `threshold`.
+    """
+
+    def __init__(self, vocabulary: dict, threshold=NEAR_DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        self._protected_words = {word for values in vocabulary.values() for value in values
+                                 for word in _fold(value).split()}
+        self._titles = []
+        self._protected = []
+        self._stripped = []
+        self._positions = {}
+        self._bands = [{} for _ in range(BANDS)]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._titles)
+
+    def strip_noise(self, title) -> tuple:
+        """
+        Drops noise words, condition grades and SKUs from a normalized title and returns
+        (protected tokens, all remaining tokens), each as a sorted space-joined string.
+        """
+        words = _fold(str(title)).split()
+        kept = []
+        i = 0
+        while i < len(words):
+            word = words[i]
+            following = words[i + 1] if i + 1 < len(words) else None
+            if word in _GRADE_WORDS and following in _GRADES:
+                i += 2
+            elif word in _GRADES and following in _GRADE_WORDS:
+                i += 2
+            elif word in _SKU_MARKERS and following is not None:
+                i += 1
+                while i < len(words) - 1 and words[i] in _SKU_FILLERS:
+                    i += 1
+                i += 1
+            else:
+                if word not in NOISE_WORDS and not _CODE_RE.match(word):
+                    kept.append(word)
+                i += 1
+        kept = sorted(set(kept))
+        protected = [w for w in kept if w in self._protected_words or w in NEGATION_WORDS or _DIGIT_RE.search(w)]
+        return " ".join(protected), " ".join(kept)
+
+    def add(self, title):
+        """Indexes one normalized title (already indexed titles are ignored)."""
+        self.add_many([title])
+
+    def add_many(self, titles):
+        """Indexes normalized titles, computing their signatures in batches."""
+        with self._lock:
+            titles = [t for t in dict.fromkeys(titles) if t not in self._positions]
+        for start in range(0, len(titles), SEED_BATCH_SIZE):
+            batch = titles[start:start + SEED_BATCH_SIZE]
+            stripped = [self.strip_noise(t) for t in batch]
+            batch = [(t, s) for t, s in zip(batch, stripped) if s[1]]
+            if not batch:
+                continue
+            signatures = _signatures([_shingles(text) for _, (_, text) in batch])
+            with self._lock:
+                for (title, (protected, text)), signature in zip(batch, signatures):
+                    if title in self._positions:
+                        continue
+                    position = len(self._titles)
+                    self._positions[title] = position
+                    self._titles.append(title)
+                    self._protected.append(protected)
+                    self._stripped.append(text)
+                    for band, key in zip(self._bands, self._band_keys(signature)):
+                        band.setdefault(key, []).append(position)
+
+    def lookup(self, title):
+        """
+        Returns (indexed title, similarity) for the closest indexed title at or above the
+        threshold, or None. A title that is itself indexed is not reported as its own duplicate.
+        """
+        protected, text = self.strip_noise(title)
+        if not text:
+            return None
+        shingles = _shingles(text)
+        keys = self._band_keys(_signatures([shingles])[0])
+        with self._lock:
+            candidates = {p for band, key in zip(self._bands, keys) for p in band.get(key, ())}
+            candidates = [(self._titles[p], self._stripped[p]) for p in candidates
+                          if self._protected[p] == protected and self._titles[p] != title]
+        best = None
+        for candidate, candidate_text in candidates:
+            score = 1.0 if candidate_text == text else _jaccard(shingles, _shingles(candidate_text))
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (candidate, score)
+        return best
+
+    @staticmethod
+    def _band_keys(signature):
+        # Python's hash of the band bytes keeps the bucket keys small; a collision only adds a candidate
+        return [hash(signature[b * ROWS_PER_BAND:(b + 1) * ROWS_PER_BAND].tobytes()) for b in range(BANDS)]
@@ -0,0 +1,174 @@
+import time
+from collections import Counter
+from contextlib import nullcontext
+
+from luxury_correction import correct_titles, DEFAULT_CONCURRENCY
+from near_duplicates import NEAR_DUPLICATES
+from postprocess import normalize_results
+
+# ==========================
+# Column Detection
+# ==========================
+NAME_COLUMNS = ["NAME", "Product Name", "Title", "Product", "Item Name", "Item"]
+TITLE_COLUMNS = ["Updated Title", "New Title", "Corrected Title", "Title Output", "Generated Title"]
+CATEGORY_COLUMNS = ["CATEGORY", "Category", "Product Category", "Type", "Product Type"]
+
+
+def find_column(df, possible_names):
+    df_columns_lower = {col.lower(): col for col in df.columns}
+
+    # 1️⃣ Exact match (case-insensitive)
+    for name in possible_names:
+        if name.lower() in df_columns_lower:
+            return df_columns_lower[name.lower()]
+
+    # 2️⃣ Partial match only if exact match not found
+    for name in possible_names:
+        name_lower = name.lower()
+        for col_lower, col_original in df_columns_lower.items():
+            if name_lower in col_lower and col_lower != name_lower:
+                return col_original
+
+    return None
+
+
+# ==========================
+# Deduplication + Title Filling
+# ==========================
+# Results are normalized by the post-processing rule engine in batches of up to this many,
+# flushed at least this often so progress and partial downloads stay current
+POSTPROCESS_BATCH_SIZE = 500
+POSTPROCESS_MAX_DELAY = 1.0
+# Output column naming the stored title whose correction a near-duplicate row reused (None when disabled)
+NEAR_DUPLICATE_COLUMN = "Near-Duplicate Of" if NEAR_DUPLICATES else None
+
+def normalize_names(series):
+    """Vectorized counterpart of luxury_correction.normalize_title (case, punctuation, whitespace)"""
+    return (
+        series.astype(str)
+        .str.lower()
+        .str.replace(r"[^\w\s]", " ", regex=True)
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip()
+    )
+
+
+def result_to_title(result):
+    """Turns a correction result into the value written to the title column."""
+    # Expecting dict with "corrected_title" or just a string; handle both
+    if isinstance(result, dict):
+        if "error" in result:
+            return f"Error: {result['error']}"
+        return result.get("corrected_title", "")
+    return str(result)
+
+
+def fill_missing_titles(df, name_col, title_col, concurrency=DEFAULT_CONCURRENCY,
+                        progress_callback=None, memo=None, journal=None, replayed=None,
+                        cancel_event=None, lock=None, metrics=None, category_col=None, near_duplicate_col=None,
+                        limiter=None, hedger=None):
+    """
+    Fills blank `title_col` cells of `df` in place. Pending rows are grouped by normalized NAME,
+    each unique title is corrected once and the result is scattered back to every row of its group.
+    `progress_callback(completed, total)` counts unique titles. `memo` is an optional mapping of
+    normalized key → corrected title used to skip keys already seen (e.g. in earlier chunks).
+    Each successful correction is appended to `journal` (a RunJournal) as it arrives, and keys in
+    `replayed` (from `RunJournal.replay()`) are filled without being submitted again.
+    `cancel_event` stops the run early, leaving unfinished rows blank; writes to `df` and `memo` hold
+    `lock` when one is given, so another thread can copy the frame while it fills, or fill another
+    chunk with the same memo. `limiter` and `hedger` are passed to `correct_titles` to share them
+    across chunks. Per-title latency,
+    token and retry measurements are recorded to `metrics` (a RunMetrics) when given.
+    Results are normalized by `postprocess.normalize_results` in batches before they are written,
+    memoized or journaled. With `category_col`, each title's category (from the first row of its group) selects a compact
+    category prompt; titles whose category is blank or unrecognised use the full prompt.
+    With `near_duplicate_col` (created if missing), rows filled from a near-duplicate's cached
+    correction are flagged with the normalized title they reused.
+    Returns a summary dict with row/unique counts, result sources, errors and whether it was cancelled.
+    """
+    lock = lock or nullcontext()
+    pending = df[df[title_col].isna()]
+    keys = normalize_names(pending[name_col])
+    row_groups = pending.groupby(keys, sort=False).groups
+    to_process = pending[name_col].groupby(keys, sort=False).first()
+    with lock:
+        df[title_col] = df[title_col].astype(object)
+        if near_duplicate_col is not None and near_duplicate_col not in df.columns:
+            df[near_duplicate_col] = None
+
+    sources = Counter()
+    errors = 0
+    for source, known in (("journal", replayed), ("memo", memo)):
+        if not known:
+            continue
+        seen = [key in known for key in to_process.index]
+        with lock:
+            for key in to_process.index[seen]:
+                df.loc[row_groups[key], title_col] = known[key]
+                sources[source] += 1
+        to_process = to_process[[not s for s in seen]]
+    reused = sources["journal"] + sources["memo"]
+    unique_keys = to_process.index.tolist()
+    categories = None
+    if category_col is not None:
+        categories = pending[category_col].groupby(keys, sort=False).first().reindex(to_process.index).tolist()
+
+    buffered = []
+    last_flush = time.monotonic()
+
+    def write_result(i, result):
+        nonlocal errors
+        updated_title = result_to_title(result)
+        if isinstance(result, dict):
+            sources[result.get("source", "llm")] += 1
+            errors += "error" in result
+        key = unique_keys[i]
+        with lock:
+            df.loc[row_groups[key], title_col] = updated_title
+            if near_duplicate_col is not None and isinstance(result, dict) and "near_duplicate_of" in result:
+                df.loc[row_groups[key], near_duplicate_col] = result["near_duplicate_of"]
+        if updated_title.startswith("Error: "):
+            return
+        if memo is not None:
+            with lock:
+                memo[key] = updated_title
+        if journal is not None:
+            attributes = result.get("attributes") if isinstance(result, dict) else None
+            journal.append(key, updated_title, attributes)
+
+    def flush():
+        nonlocal last_flush
+        normalized = normalize_results([result for _, result in buffered])
+        for (i, _), result in zip(buffered, normalized):
+            write_result(i, result)
+        buffered.clear()
+        last_flush = time.monotonic()
+
+    def process_row(i, result):
+        buffered.append((i, result))
+        if len(buffered) >= POSTPROCESS_BATCH_SIZE or time.monotonic() - last_flush >= POSTPROCESS_MAX_DELAY:
+            flush()
+
+    try:
+        correct_titles(
+            to_process.tolist(),
+            concurrency=concurrency,
+            on_result=process_row,
+            progress_callback=progress_callback,
+            cancel_event=cancel_event,
+            metrics=metrics,
+            categories=categories,
+            post_process=False,
+            limiter=limiter,
+            hedger=hedger,
+        )
+    finally:
+        flush()
+
+    return {
+        "rows": len(pending),
+        "unique_titles": len(unique_keys) + reused,
+        "sources": sources,
+        "errors": errors,
+        "cancelled": cancel_event is not None and cancel_event.is_set(),
+    }
@@ -0,0 +1,259 @@
+import re
+import string
+import unicodedata
+
+import pandas as pd
+
+# ==========================
+# Result Post-Processing
+# ==========================
+# Deterministic normalizations applied to model and local-extractor results. The rules are
+# compiled once at import and, for a batch, run column-wise over the whole results frame, so
+# they behave the same on every row and no longer need to be spelled out in the prompt.
+
+# Subcategories reported as "Shoulder Bag" (compared lowercased)
+SHOULDER_BAG_SUBCATEGORIES = {"handbag", "bucket bag", "top handle bag"}
+MULTICOLOR = "Multicolor"
+# More distinct colors than this collapse to MULTICOLOR
+MAX_LISTED_COLORS = 3
+# Louis Vuitton size labels and words → generic size attribute (the label stays in the title)
+LV_GENERIC_SIZES = {
+    "NANO": "XS", "MICRO": "XS", "MINI": "XS",
+    "PM": "S", "SMALL": "S",
+    "MM": "M", "MEDIUM": "M",
+    "GM": "L", "LARGE": "L",
+}
+
+# (pattern, replacement) pairs applied to every corrected title, in order
+TITLE_REPLACEMENTS = (
+    (re.compile(r"(?<=Bag)s$", re.IGNORECASE), ""),
+    (re.compile(r"\b(?:Handbag|Bucket Bag|Top Handle Bag)\b", re.IGNORECASE), "Shoulder Bag"),
+)
+_COMBINING_MARKS_RE = re.compile(r"[\u0300-\u036f]")
+# detected_category values that mean handbags, compared by `_category_key` ("Handbags", "handbag", "Bags")
+HANDBAG_CATEGORY_KEYS = {"handbag", "bag"}
+_NON_LETTERS_RE = re.compile(r"[^a-z]+")
+# Color values `normalize_color_list` can change: lists, or a lone "multicolor" in another case
+_COLOR_LIST_RE = re.compile(r",|^\s*multicolor\s*$", re.IGNORECASE)
+# What may separate the colors of a list in a title
+_COLOR_SEPARATOR = r"(?:\s*[,/&]\s*|\s+and\s+|\s+)"
+# Punctuation ignored when comparing words ("Black," repeats "Black")
+_WORD_KEY_TABLE = str.maketrans("", "", string.punctuation)
+
+RESULT_COLUMNS = ("detected_category", "corrected_title")
+ATTRIBUTE_COLUMNS = ("brand", "size", "color", "subcategory")
+
+
+# --- Rules on one value ---
+def fold_accents(text: str) -> str:
+    """Removes accents: "Hermès" → "Hermes"."""
+    return _COMBINING_MARKS_RE.sub("", unicodedata.normalize("NFKD", text))
+
+
+def is_handbag_category(category) -> bool:
+    """True for a detected_category naming handbags, whatever its case or number ("Handbag", "BAGS")."""
+    return isinstance(category, str) and _category_key(category) in HANDBAG_CATEGORY_KEYS
+
+
+def _category_key(category: str) -> str:
+    return _NON_LETTERS_RE.sub("", category.lower()).removesuffix("s")
+
+
+def normalize_color_list(colors: str) -> str:
+    """
+    Deduplicates a comma-separated color list (case-insensitively, keeping order) and collapses
+    more than MAX_LISTED_COLORS colors, or any list containing MULTICOLOR, to MULTICOLOR.
+    """
+    seen = {}
+    for color in colors.split(","):
+        color = color.strip()
+        if color and color.lower() not in seen:
+            seen[color.lower()] = color
+    if len(seen) > MAX_LISTED_COLORS or MULTICOLOR.lower() in seen:
+        return MULTICOLOR
+    return ", ".join(seen.values()) or colors
+
+
+def rewrite_colors(title: str, original_colors: str, colors: str) -> str:
+    """
+    Replaces the colors of `original_colors` as the title writes them with the normalized
+    `colors`: the longest run of those color names (in any case, separated by spaces, commas,
+    "/", "&" or "and") becomes `colors`, so "Red Blue Green Gold Leather" with four colors becomes
+    "Multicolor Leather" even when the title does not spell the list the way the attribute does.
+    """
+    names = sorted({c.strip() for c in original_colors.split(",") if c.strip()}, key=len, reverse=True)
+    if not names:
+        return title
+    name = r"\b(?:" + "|".join(map(re.escape, names)) + r")\b"
+    runs = list(re.finditer(rf"{name}(?:{_COLOR_SEPARATOR}{name})*", title, re.IGNORECASE))
+    if not runs:
+        return title
+    run = max(runs, key=lambda m: len(m.group()))
+    return title[:run.start()] + colors + title[run.end():]
+
+
+def word_keys(title: str) -> list:
+    """The whitespace-separated words of `title`, lowercased with punctuation removed ("311.30.42" is one word)."""
+    return [word.lower().translate(_WORD_KEY_TABLE) for word in title.split()]
+
+
+def repeated_words(title: str) -> list:
+    """
+    Words (as `word_keys`) that directly follow themselves in `title`, plus "bag" when it appears
+    more than once; the repeats `drop_repeated_words` removes.
+    """
+    keys = [key for key in word_keys(title) if key]
+    repeated = {key for previous, key in zip(keys, keys[1:]) if key == previous}
+    if keys.count("bag") > 1:
+        repeated.add("bag")
+    return sorted(repeated)
+
+
+def drop_repeated_words(title: str) -> str:
+    """
+    Collapses a word repeated back to back ("Black Black Leather" → "Black Leather"), compared
+    case-insensitively and ignoring punctuation. Repeats further apart are kept, since style names
+    often contain the brand ("Dior Lady Dior Bag", "Cartier Tank Louis Cartier"). "Bag" keeps only
+    its last occurrence, so handbag titles still end with it.
+    """
+    words = title.split()
+    keys = word_keys(title)
+    if len(set(keys)) == len(keys):
+        return title
+    last_bag = len(keys) - 1 - keys[::-1].index("bag") if "bag" in keys else None
+    kept, previous = [], None
+    for position, (word, key) in enumerate(zip(words, keys)):
+        if key == "bag" and position != last_bag:
+            continue
+        if not key or key != previous:
+            kept.append(word)
+        if key:
+            previous = key
+    return " ".join(kept)
+
+
+def _title_rules(title: str) -> str:
+    for pattern, replacement in TITLE_REPLACEMENTS:
+        title = pattern.sub(replacement, title)
+    return fold_accents(title)
+
+
+def _is_lv(brand) -> bool:
+    return isinstance(brand, str) and brand.strip().lower() == "louis vuitton"
+
+
+# --- Rules over a batch ---
+def normalize_frame(frame) -> pd.DataFrame:
+    """
+    Applies every rule to a frame with RESULT_COLUMNS and ATTRIBUTE_COLUMNS (one row per result,
+    unique index) and returns the normalized copy. Rows with a missing title keep it missing.
+    """
+    frame = frame.copy()
+    titles = frame["corrected_title"].astype(object)
+
+    subcategories = frame["subcategory"]
+    frame["subcategory"] = subcategories.mask(
+        subcategories.str.lower().isin(SHOULDER_BAG_SUBCATEGORIES), "Shoulder Bag")
+
+    frame["brand"] = _fold_accents_column(frame["brand"])
+
+    generic = frame["size"].str.strip().str.upper().map(LV_GENERIC_SIZES)
+    is_lv = frame["brand"].str.strip().str.lower().eq("louis vuitton")
+    frame["size"] = frame["size"].mask(is_lv & generic.notna(), generic)
+
+    # Only color lists the rule can change are rewritten, in the color column and in the title
+    # (from the color words the title contains, see `rewrite_colors`)
+    original_colors = frame["color"].copy()
+    listed = original_colors.str.contains(_COLOR_LIST_RE).eq(True)
+    colors = original_colors.loc[listed].map(normalize_color_list)
+    frame.loc[listed, "color"] = colors
+    # A list that only lost surrounding whitespace is not rewritten in the title
+    changed = colors.index[colors.ne(original_colors.loc[listed].str.strip()).to_numpy()]
+    titles.loc[changed] = [
+        rewrite_colors(t, before, after) if isinstance(t, str) else t
+        for t, before, after in zip(titles.loc[changed], original_colors.loc[changed], colors.loc[changed])
+    ]
+
+    for pattern, replacement in TITLE_REPLACEMENTS:
+        titles = titles.str.replace(pattern, replacement, regex=True)
+    titles = _fold_accents_column(titles)
+    categories = frame["detected_category"].str.lower().str.replace(_NON_LETTERS_RE, "", regex=True)
+    is_handbag = categories.str.removesuffix("s").isin(HANDBAG_CATEGORY_KEYS)
+    needs_suffix = titles.notna() & is_handbag & ~titles.str.endswith("Bag").eq(True)
+    titles.loc[needs_suffix] = titles.loc[needs_suffix] + " Bag"
+    # The one rule with no column form; it returns titles without a repeated word untouched
+    has_title = titles.notna()
+    titles.loc[has_title] = titles.loc[has_title].map(drop_repeated_words)
+
+    frame["corrected_title"] = titles
+    return frame
+
+
+def _fold_accents_column(values) -> pd.Series:
+    """Column form of `fold_accents`; missing values stay missing."""
+    folded = values.str.normalize("NFKD").str.replace(_COMBINING_MARKS_RE, "", regex=True)
+    return folded.where(values.notna(), values)
+
+
+def normalize_results(results) -> list:
+    """
+    Normalizes a list of result dicts in one column-wise pass and returns new dicts (the inputs
+    are not modified). Error results and anything without a corrected title pass through as is.
+    """
+    positions = [i for i, r in enumerate(results)
+                 if isinstance(r, dict) and "error" not in r and isinstance(r.get("corrected_title"), str)]
+    if not positions:
+        return list(results)
+
+    rows = []
+    for i in positions:
+        attributes = results[i].get("attributes") or {}
+        rows.append([results[i].get(c) for c in RESULT_COLUMNS] + [attributes.get(c) for c in ATTRIBUTE_COLUMNS])
+    frame = normalize_frame(pd.DataFrame(rows, columns=RESULT_COLUMNS + ATTRIBUTE_COLUMNS, dtype=object))
+    frame = frame.astype(object).where(frame.notna(), None)
+
+    normalized = list(results)
+    for i, values in zip(positions, frame.itertuples(index=False)):
+        normalized[i] = _with_values(results[i], values._asdict())
+    return normalized
+
+
+def normalize_result(result) -> dict:
+    """
+    Single-result form of `normalize_results`: the same rules applied without building a frame,
+    for per-title callers such as the model cascade's validation step. Both forms must agree;
+    tests/test_postprocess.py checks them against each other.
+    """
+    if not isinstance(result, dict) or "error" in result or not isinstance(result.get("corrected_title"), str):
+        return result
+    attributes = result.get("attributes") or {}
+    values = {c: result.get(c) for c in RESULT_COLUMNS}
+    values.update({c: attributes.get(c) for c in ATTRIBUTE_COLUMNS})
+    title = values["corrected_title"]
+
+    subcategory = values["subcategory"]
+    if isinstance(subcategory, str) and subcategory.lower() in SHOULDER_BAG_SUBCATEGORIES:
+        values["subcategory"] = "Shoulder Bag"
+    if isinstance(values["brand"], str):
+        values["brand"] = fold_accents(values["brand"])
+    size = values["size"]
+    if _is_lv(values["brand"]) and isinstance(size, str) and size.strip().upper() in LV_GENERIC_SIZES:
+        values["size"] = LV_GENERIC_SIZES[size.strip().upper()]
+    color = values["color"]
+    if isinstance(color, str) and _COLOR_LIST_RE.search(color):
+        colors = normalize_color_list(color)
+        if colors != color.strip():
+            title = rewrite_colors(title, color, colors)
+        values["color"] = colors
+
+    title = _title_rules(title)
+    if is_handbag_category(values["detected_category"]) and not title.endswith("Bag"):
+        title += " Bag"
+    values["corrected_title"] = drop_repeated_words(title)
+    return _with_values(result, values)
+
+
+def _with_values(result, values) -> dict:
+    attributes = dict(result.get("attributes") or {})
+    attributes.update({c: values[c] for c in ATTRIBUTE_COLUMNS if c in attributes or values[c] is not None})
+    return {**result, "corrected_title": values["corrected_title"], "attributes": attributes}
@@ -0,0 +1,154 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# ==========================
+# Persistent Result Cache
+# ==========================
+DEFAULT_CACHE_PATH = os.getenv("RETITLING_CACHE_PATH", ".retitling_cache.sqlite3")
+DEFAULT_MAX_ENTRIES = int(os.getenv("RETITLING_CACHE_MAX_ENTRIES", "200000"))
+DEFAULT_MAX_AGE_DAYS = float(os.getenv("RETITLING_CACHE_MAX_AGE_DAYS", "30"))
+
+# Run the eviction sweep once every this many writes instead of on every put
+EVICT_EVERY = 500
+# Keys per statement in get_many (SQLite caps bound parameters)
+BATCH_SIZE = 500
+# get_many only refreshes access times older than this, so repeated bulk reads stay mostly read-only
+TOUCH_INTERVAL = 3600
+
+
+class ResultCache:
+    """
+    SQLite-backed key → JSON store shared by every thread of the process.
+    Entries older than `max_age_days` are treated as misses and removed;
+    when more than `max_entries` are stored, the least recently used are dropped.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_age_days=DEFAULT_MAX_AGE_DAYS):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 24 * 3600
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries(accessed_at)")
+
+    def get(self, key):
+        """Return the cached value for `key`, or None on a miss or expired entry."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.max_age:
+                if row is not None:
+                    self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        """Store a JSON-serializable value under `key`."""
+        now = time.time()
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, payload, now, now),
+            )
+            self._writes += 1
+            if self._writes % EVICT_EVERY == 0:
+                self._evict_locked(now)
+
+    def get_many(self, keys) -> dict:
+        """Batched `get`: returns key → value for every live key found; absent keys are misses."""
+        keys = list(dict.fromkeys(keys))
+        now = time.time()
+        found = {}
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            for start in range(0, len(keys), BATCH_SIZE):
+                batch = keys[start:start + BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM entries WHERE key IN ({placeholders}) AND created_at >= ?",
+                    (*batch, now - self.max_age),
+                ).fetchall()
+                self._conn.execute(
+                    f"UPDATE entries SET accessed_at = ? WHERE key IN ({placeholders}) AND accessed_at < ?",
+                    (now, *batch, now - TOUCH_INTERVAL),
+                )
+                if rows:
+                    # One decode per batch rather than per row
+                    values = json.loads("[" + ",".join(value for _, value in rows) + "]")
+                    found.update(zip((key for key, _ in rows), values))
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items):
+        """Batched `put` of (key, value) pairs in a single transaction."""
+        now = time.time()
+        rows = [(key, json.dumps(value, ensure_ascii=False), now, now) for key, value in items]
+        with self._lock:
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO entries (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+            previous = self._writes
+            self._writes += len(rows)
+            if self._writes // EVICT_EVERY != previous // EVICT_EVERY:
+                self._evict_locked(now)
+
+    def keys(self, prefix="") -> list:
+        """Live keys starting with `prefix`, most recently used first (access times are not refreshed)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key FROM entries WHERE substr(key, 1, ?) = ? AND created_at >= ? ORDER BY accessed_at DESC",
+                (len(prefix), prefix, time.time() - self.max_age),
+            ).fetchall()
+        return [key for (key,) in rows]
+
+    def evict(self):
+        """Drop expired entries, then trim to `max_entries` by least recent access."""
+        with self._lock:
+            self._evict_locked(time.time())
+
+    def _evict_locked(self, now):
+        self._conn.execute("DELETE FROM entries WHERE created_at < ?", (now - self.max_age,))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed_at LIMIT ?)",
+                (overflow,),
+            )
+
+    def stats(self):
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+            return {"hits": self.hits, "misses": self.misses, "entries": count}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,131 @@
+import json
+from typing import Optional
+
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, field_validator
+
+# ==========================
+# Result Schema
+# ==========================
+# The one definition of a correction result. It validates parsed responses, is sent to Gemini
+# as the response schema in structured-output mode (`gemini_schema`), and otherwise is shown to
+# it as a JSON example in the prompt (`result_format`).
+
+
+class TitleAttributes(BaseModel):
+    brand: Optional[str] = None
+    style: Optional[str] = None
+    size: Optional[str] = Field(None, description="Hermès exact label or Generic Size (XS/S/M/L)")
+    color: Optional[str] = None
+    material: Optional[str] = None
+    subcategory: Optional[str] = Field(None, description="Most appropriate subcategory/type")
+    model_name: Optional[str] = None
+    model_reference_number: Optional[str] = None
+    dial_color: Optional[str] = None
+    case_material: Optional[str] = None
+    gender: Optional[str] = None
+    case_diameter: Optional[str] = None
+
+
+class TitleResult(BaseModel):
+    detected_category: str = Field(description="category")
+    attributes: TitleAttributes
+    corrected_title: str = Field(
+        description="Final corrected title with normalized size, subcategory, 'Bag' suffix, and color deduplication"
+    )
+
+    @field_validator("corrected_title")
+    @classmethod
+    def _not_blank(cls, value):
+        if not value.strip():
+            raise ValueError("corrected_title is blank")
+        return value
+
+
+class BatchTitleResult(TitleResult):
+    index: int = Field(description="Position of the title in the input array")
+
+
+# Every attribute a result carries, in prompt order
+ATTRIBUTE_KEYS = list(TitleAttributes.model_fields)
+
+
+def result_format() -> str:
+    """
+    A JSON example of one TitleResult for prompts that are not constrained by a response schema:
+    each field holds its description ("value" when it has none), with "or null" when optional.
+    """
+    def example(model):
+        values = {}
+        for name, field in model.model_fields.items():
+            if isinstance(field.annotation, type) and issubclass(field.annotation, BaseModel):
+                values[name] = example(field.annotation)
+            else:
+                values[name] = (field.description or "value") + ("" if field.is_required() else " or null")
+        return values
+
+    lines = json.dumps(example(TitleResult), indent=4, ensure_ascii=False).splitlines()
+    return "\n" + "".join(f"    {line}\n" for line in lines) + "    "
+
+
+# JSON-schema keywords Gemini's response schema understands
+_GEMINI_KEYWORDS = ("type", "format", "description", "enum")
+
+
+def gemini_schema(model, many=False) -> dict:
+    """
+    Converts a pydantic model (or a list of it, with `many`) into Gemini's OpenAPI-subset
+    response schema: references are inlined, Optional fields become `nullable`, and every
+    property is required so the model always emits the full attribute set.
+    """
+    schema = TypeAdapter(list[model] if many else model).json_schema()
+    definitions = schema.get("$defs", {})
+
+    def convert(node):
+        if "$ref" in node:
+            node = definitions[node["$ref"].rsplit("/", 1)[-1]]
+        if "anyOf" in node:
+            options = [option for option in node["anyOf"] if option.get("type") != "null"]
+            converted = convert(options[0])
+            if len(options) < len(node["anyOf"]):
+                converted["nullable"] = True
+            if "description" in node:
+                converted["description"] = node["description"]
+            return converted
+        converted = {key: node[key] for key in _GEMINI_KEYWORDS if key in node}
+        if "properties" in node:
+            converted["properties"] = {name: convert(prop) for name, prop in node["properties"].items()}
+            converted["required"] = list(node["properties"])
+        if "items" in node:
+            converted["items"] = convert(node["items"])
+        return converted
+
+    return convert(schema)
+
+
+def parse_result(text: str) -> dict:
+    """Validates one structured response; raises ValidationError when it does not fit the schema."""
+    return TitleResult.model_validate_json(text).model_dump()
+
+
+def parse_batch_results(text: str, count: int) -> dict:
+    """
+    Maps input position → result for every entry of a structured batch response that validates.
+    Entries are checked one by one, so a single bad entry does not discard the rest of the batch.
+    """
+    try:
+        items = json.loads(text)
+    except ValueError:
+        return {}
+    if not isinstance(items, list):
+        return {}
+
+    parsed = {}
+    for item in items:
+        try:
+            result = BatchTitleResult.model_validate(item).model_dump()
+        except ValidationError:
+            continue
+        index = result.pop("index")
+        if 0 <= index < count and index not in parsed:
+            parsed[index] = result
+    return parsed
@@ -0,0 +1,276 @@
+"""
+Headless batch runner for the retitling pipeline.
+
+    python -m retitling run catalog.xlsx corrected.parquet --concurrency 200
+
+Rows stream through read → dedupe → correct → write in chunks, so memory stays bounded by the
+chunk size rather than the file size. The next chunk's titles are sent while the current chunk
+waits on its slowest calls, under one concurrency limit for the whole run. A JSON summary is printed to stdout.
+
+Large catalogs can instead be spread over several worker processes or hosts sharing a directory:
+
+    python -m retitling split catalog.xlsx /shared/queue --shard-rows 5000
+    python -m retitling worker /shared/queue --concurrency 100     # start as many as needed
+    python -m retitling status /shared/queue
+    python -m retitling merge /shared/queue corrected.parquet
+"""
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from cachetools import LRUCache
+
+from catalog_io import ChunkWriter, iter_chunks, DEFAULT_CHUNKSIZE
+from backends import BACKEND_NAMES
+from luxury_correction import (build_backend, get_cache, set_model, AdaptiveConcurrencyLimiter, HedgePolicy,
+                               DEFAULT_CONCURRENCY)
+from metrics import RunMetrics
+from pipeline import (find_column, fill_missing_titles, NAME_COLUMNS, TITLE_COLUMNS, CATEGORY_COLUMNS,
+                      NEAR_DUPLICATE_COLUMN)
+from run_journal import RunJournal, content_hash, journal_for
+from work_queue import (WorkQueue, merge_shards, run_worker, split_catalog, DEFAULT_LEASE_SECONDS,
+                        DEFAULT_SHARD_ROWS)
+
+# Chunks being corrected at once; the oldest is written when it finishes
+CHUNKS_IN_FLIGHT = 2
+
+
+def _prefetch(iterable, maxsize):
+    """Reads ahead from `iterable` on a background thread, holding at most `maxsize` items."""
+    buffer = queue.Queue(maxsize=maxsize)
+    done = object()
+
+    def produce():
+        try:
+            for item in iterable:
+                buffer.put(item)
+        except BaseException as e:
+            buffer.put(e)
+        buffer.put(done)
+
+    threading.Thread(target=produce, name="retitling-reader", daemon=True).start()
+    while True:
+        item = buffer.get()
+        if item is done:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+
+def run(args) -> dict:
+    start = time.perf_counter()
+    if args.backend:
+        set_model(build_backend(args.backend))
+    memo = LRUCache(maxsize=args.memo_size)
+    metrics = RunMetrics()
+    sources = Counter()
+    totals = Counter()
+    name_col = title_col = category_col = None
+
+    # Titles completed by an earlier, interrupted run on the same input are replayed, not re-sent
+    if args.no_journal:
+        journal = None
+    elif args.journal:
+        journal = RunJournal(args.journal)
+    else:
+        journal = journal_for(content_hash(path=args.input))
+    replayed = journal.replay() if journal else {}
+
+    # One limiter and hedge policy for the whole run, shared by the chunks in flight
+    limiter = AdaptiveConcurrencyLimiter(max_limit=args.concurrency)
+    hedger = HedgePolicy()
+    lock = threading.Lock()
+    in_flight = deque()
+
+    def write_oldest():
+        chunk, future = in_flight.popleft()
+        stats = future.result()
+        writer.write(chunk)
+        totals["rows"] += len(chunk)
+        totals["rows_to_process"] += stats["rows"]
+        totals["unique_titles"] += stats["unique_titles"]
+        totals["errors"] += stats["errors"]
+        sources.update(stats["sources"])
+        print(f"{totals['rows']:,} rows written ({totals['unique_titles']:,} unique titles)", file=sys.stderr)
+
+    with ChunkWriter(args.output) as writer, ThreadPoolExecutor(CHUNKS_IN_FLIGHT, "retitling-chunk") as pool:
+        for chunk in _prefetch(iter_chunks(args.input, args.chunksize), maxsize=args.prefetch):
+            if name_col is None:
+                name_col = find_column(chunk, NAME_COLUMNS)
+                title_col = find_column(chunk, TITLE_COLUMNS)
+                if not name_col or not title_col:
+                    raise SystemExit(
+                        f"Could not find the product name and updated title columns. "
+                        f"Available columns: {', '.join(map(str, chunk.columns))}"
+                    )
+                # Optional: without a category column every title gets the full prompt
+                category_col = None if args.no_category_prompts else find_column(chunk, CATEGORY_COLUMNS)
+
+            in_flight.append((chunk, pool.submit(
+                fill_missing_titles, chunk, name_col, title_col, concurrency=args.concurrency,
+                memo=memo, journal=journal, replayed=replayed, metrics=metrics, lock=lock,
+                category_col=category_col, near_duplicate_col=NEAR_DUPLICATE_COLUMN,
+                limiter=limiter, hedger=hedger,
+            )))
+            # The next chunk starts while this one waits on its slowest titles; chunks are written in order
+            while len(in_flight) >= CHUNKS_IN_FLIGHT:
+                write_oldest()
+        while in_flight:
+            write_oldest()
+
+    if journal:
+        journal.close()
+    if args.metrics_report:
+        metrics.write_report(args.metrics_report)
+    calls = metrics.summary()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "input": args.input,
+        "output": args.output,
+        "name_column": name_col,
+        "title_column": title_col,
+        "category_column": category_col,
+        "rows": totals["rows"],
+        "rows_to_process": totals["rows_to_process"],
+        "unique_titles": totals["unique_titles"],
+        "errors": totals["errors"],
+        "journal": journal.path if journal else None,
+        "sources": dict(sources),
+        "cache": get_cache().stats(),
+        "latency_seconds": calls["latency_seconds"],
+        "tokens": {"prompt": calls["prompt_tokens"]["total"], "response": calls["response_tokens"]["total"]},
+        "retries": calls["retries"]["total"],
+        "parse_failures": calls["parse_failures"],
+        "hedges": calls["hedges"],
+        "cascade": calls["cascade"],
+        "metrics_report": args.metrics_report,
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(totals["rows"] / elapsed, 2) if elapsed > 0 else None,
+    }
+
+
+def split(args) -> dict:
+    return split_catalog(args.input, args.directory, shard_rows=args.shard_rows,
+                         category_prompts=not args.no_category_prompts)
+
+
+def work(args) -> dict:
+    if args.backend:
+        set_model(build_backend(args.backend))
+    metrics = RunMetrics()
+    start = time.perf_counter()
+    summary = run_worker(args.directory, lease_seconds=args.lease_seconds, concurrency=args.concurrency,
+                         memo_size=args.memo_size, metrics=metrics, max_shards=args.max_shards)
+    if args.metrics_report:
+        metrics.write_report(args.metrics_report)
+    calls = metrics.summary()
+    return {
+        **summary,
+        "latency_seconds": calls["latency_seconds"],
+        "tokens": {"prompt": calls["prompt_tokens"]["total"], "response": calls["response_tokens"]["total"]},
+        "hedges": calls["hedges"],
+        "cascade": calls["cascade"],
+        "metrics_report": args.metrics_report,
+        "elapsed_seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def status(args) -> dict:
+    work_queue = WorkQueue(args.directory)
+    try:
+        return {
+            **work_queue.progress(),
+            "failed_shards": [s for s in work_queue.shards() if s["status"] == "failed"],
+            "reset": work_queue.reset_failed() if args.retry_failed else 0,
+        }
+    finally:
+        work_queue.close()
+
+
+def merge(args) -> dict:
+    return merge_shards(args.directory, args.output)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m retitling", description="Luxury title retitling pipeline")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Fill blank updated titles in a catalog file")
+    run_parser.add_argument("input", help="Input catalog (.xlsx, .csv or .parquet)")
+    run_parser.add_argument("output", help="Output file (.xlsx, .csv or .parquet)")
+    run_parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                            help="Maximum Gemini calls in flight (default: %(default)s)")
+    run_parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE,
+                            help="Rows read, processed and written per chunk (default: %(default)s)")
+    run_parser.add_argument("--prefetch", type=int, default=2,
+                            help="Chunks read ahead while the current one is processed (default: %(default)s)")
+    run_parser.add_argument("--memo-size", type=int, default=50000,
+                            help="Unique titles remembered across chunks (default: %(default)s)")
+    run_parser.add_argument("--journal", help="Checkpoint journal path (default: derived from the input's content hash)")
+    run_parser.add_argument("--no-journal", action="store_true", help="Do not record or replay a checkpoint journal")
+    run_parser.add_argument("--backend", choices=BACKEND_NAMES,
+                            help="Model backend; \"fake\" returns canned results offline (default: RETITLING_BACKEND or gemini)")
+    run_parser.add_argument("--no-category-prompts", action="store_true",
+                            help="Send every title with the full prompt instead of routing by the category column")
+    run_parser.add_argument("--summary", help="Also write the JSON summary to this path")
+    run_parser.add_argument("--metrics-report",
+                            help="Write per-call latency/token/retry metrics here (.json, .csv or .prom)")
+    run_parser.set_defaults(handler=run)
+
+    split_parser = commands.add_parser("split", help="Split a catalog into shards in a work-queue directory")
+    split_parser.add_argument("input", help="Input catalog (.xlsx, .csv or .parquet)")
+    split_parser.add_argument("directory", help="Queue directory, shared by every worker")
+    split_parser.add_argument("--shard-rows", type=int, default=DEFAULT_SHARD_ROWS,
+                              help="Rows per shard (default: %(default)s)")
+    split_parser.add_argument("--no-category-prompts", action="store_true",
+                              help="Send every title with the full prompt instead of routing by the category column")
+    split_parser.set_defaults(handler=split)
+
+    worker_parser = commands.add_parser("worker", help="Claim and process shards until the queue is drained")
+    worker_parser.add_argument("directory", help="Queue directory created by split")
+    worker_parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                               help="Maximum Gemini calls in flight in this worker (default: %(default)s)")
+    worker_parser.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS,
+                               help="Shard lease length; renewed every third of it (default: %(default)s)")
+    worker_parser.add_argument("--memo-size", type=int, default=50000,
+                               help="Unique titles remembered across this worker's shards (default: %(default)s)")
+    worker_parser.add_argument("--max-shards", type=int, help="Stop after this many shards")
+    worker_parser.add_argument("--backend", choices=BACKEND_NAMES,
+                               help="Model backend (default: RETITLING_BACKEND or gemini)")
+    worker_parser.add_argument("--metrics-report",
+                               help="Write per-call latency/token/retry metrics here (.json, .csv or .prom)")
+    worker_parser.add_argument("--summary", help="Also write the JSON summary to this path")
+    worker_parser.set_defaults(handler=work)
+
+    status_parser = commands.add_parser("status", help="Show shard progress for a queue directory")
+    status_parser.add_argument("directory")
+    status_parser.add_argument("--retry-failed", action="store_true", help="Put failed shards back in the queue")
+    status_parser.set_defaults(handler=status)
+
+    merge_parser = commands.add_parser("merge", help="Write every finished shard to one output file in row order")
+    merge_parser.add_argument("directory")
+    merge_parser.add_argument("output", help="Output file (.xlsx, .csv or .parquet)")
+    merge_parser.set_defaults(handler=merge)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    summary = args.handler(args)
+    text = json.dumps(summary, indent=2)
+    if getattr(args, "summary", None):
+        with open(args.summary, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# ==========================
+# Checkpoint Journal
+# ==========================
+JOURNAL_DIR = os.getenv("RETITLING_JOURNAL_DIR", ".retitling_journal")
+# Journals untouched for this long are deleted when a new one is opened
+JOURNAL_MAX_AGE_DAYS = float(os.getenv("RETITLING_JOURNAL_MAX_AGE_DAYS", "7"))
+
+
+def content_hash(data=None, path=None) -> str:
+    """sha256 of an upload's bytes or of a file on disk (read in blocks)."""
+    digest = hashlib.sha256()
+    if data is not None:
+        digest.update(data)
+    else:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def journal_path(file_hash, directory=JOURNAL_DIR) -> str:
+    """Where the journal of the input file with the given content hash lives."""
+    return os.path.join(directory, f"{file_hash[:32]}.jsonl")
+
+
+def journal_for(file_hash, directory=JOURNAL_DIR):
+    """Opens the journal belonging to the input file with the given content hash."""
+    os.makedirs(directory, exist_ok=True)
+    _prune(directory)
+    return RunJournal(journal_path(file_hash, directory))
+
+
+def _prune(directory):
+    cutoff = time.time() - JOURNAL_MAX_AGE_DAYS * 24 * 3600
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if name.endswith(".jsonl") and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+class RunJournal:
+    """
+    Append-only JSON-lines record of completed corrections for one input file.
+    Every entry is flushed to the OS as soon as it is written, so it survives a Streamlit rerun
+    or a killed process; fsync runs at most every `fsync_interval` seconds and on close.
+    """
+
+    def __init__(self, path, fsync_interval=1.0):
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._handle = None
+        self._last_sync = 0.0
+
+    def replay(self) -> dict:
+        """Returns normalized key → corrected title for every entry recorded so far."""
+        titles = {}
+        if not os.path.exists(self.path):
+            return titles
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A partially written last line from a crash is ignored
+                    continue
+                titles[entry["key"]] = entry["corrected_title"]
+        return titles
+
+    def append(self, key, corrected_title, attributes=None):
+        line = json.dumps(
+            {"key": key, "corrected_title": corrected_title, "attributes": attributes},
+            ensure_ascii=False,
+        )
+        with self._lock:
+            if self._handle is None:
+                self._handle = self._open_for_append()
+            self._handle.write(line + "\n")
+            self._handle.flush()
+            now = time.monotonic()
+            if now - self._last_sync >= self.fsync_interval:
+                os.fsync(self._handle.fileno())
+                self._last_sync = now
+
+    def _open_for_append(self):
+        # A crash mid-write leaves a torn last line; end it, so the first new entry is not glued onto it
+        handle = open(self.path, "a+b")
+        if handle.tell() > 0:
+            handle.seek(-1, os.SEEK_END)
+            if handle.read(1) != b"\n":
+                handle.write(b"\n")
+        handle.close()
+        return open(self.path, "a", encoding="utf-8")
+
+    def close(self):
+        with self._lock:
+            if self._handle is not None:
+                self._handle.flush()
+                os.fsync(self._handle.fileno())
+                self._handle.close()
+                self._handle = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,229 @@
+import atexit
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+# ==========================
+# Compact Frames
+# ==========================
+# Text columns become Arrow-backed strings, or categoricals when at most this share of rows is distinct
+CATEGORY_MAX_RATIO = 0.5
+
+
+def compact_column(series):
+    """
+    Returns an all-text object column as a categorical (when values repeat) or an Arrow-backed
+    string column; any other column is returned unchanged.
+    """
+    if series.dtype != object or pd.api.types.infer_dtype(series, skipna=True) != "string":
+        return series
+    if series.nunique(dropna=True) <= CATEGORY_MAX_RATIO * len(series):
+        return series.astype("category")
+    return series.astype("string[pyarrow]")
+
+
+def compact_frame(df):
+    """Copy of `df` with every text column compacted by `compact_column` (duplicate column names are kept)."""
+    compact = df.copy(deep=False)
+    for position in range(compact.shape[1]):
+        compact.isetitem(position, compact_column(compact.iloc[:, position]))
+    return compact
+
+
+def with_columns(df, columns):
+    """Shallow copy of `df` with the columns of `columns` (same rows, in order) replacing or added to its own."""
+    combined = df.copy(deep=False)
+    for name in columns.columns:
+        combined[name] = columns[name].values
+    return combined
+
+
+def nbytes(value) -> int:
+    """Approximate memory held by a stored frame or byte string."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True, index=True).sum())
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    return 0
+
+
+# ==========================
+# Session Store
+# ==========================
+# Sessions untouched for this long have their entries written to disk and dropped from memory
+SPILL_AFTER_SECONDS = float(os.getenv("RETITLING_SPILL_AFTER_SECONDS", "600"))
+# Sessions untouched for this long are deleted, in memory or on disk
+SESSION_RETENTION_HOURS = float(os.getenv("RETITLING_SESSION_RETENTION_HOURS", "24"))
+SPILL_DIR = os.getenv("RETITLING_SPILL_DIR", ".retitling_spill")
+
+
+class _Entry:
+    __slots__ = ("value", "path", "nbytes", "disk_bytes")
+
+    def __init__(self, value):
+        self.value = value
+        self.path = None
+        self.nbytes = nbytes(value)
+        self.disk_bytes = 0
+
+
+class SessionStore:
+    """
+    Process-wide home of the frames and download buffers each Streamlit session keeps between
+    reruns; session state only holds the session's ID. A sweeper thread pickles the entries of
+    sessions idle for `spill_after` seconds to a per-process directory under `directory` and
+    drops them from memory, and the next `get` reads them back. Sessions idle for
+    `retention_hours` are deleted.
+    """
+
+    def __init__(self, directory=SPILL_DIR, spill_after=SPILL_AFTER_SECONDS, retention_hours=SESSION_RETENTION_HOURS):
+        self.spill_after = spill_after
+        self.retention = retention_hours * 3600
+        os.makedirs(directory, exist_ok=True)
+        # Session IDs die with the process, so nothing spilled is useful to the next one
+        self.directory = tempfile.mkdtemp(prefix=f"{os.getpid()}-", dir=directory)
+        atexit.register(shutil.rmtree, self.directory, True)
+        self._sessions = {}
+        self._lock = threading.Lock()
+        threading.Thread(target=self._sweep_forever, name="retitling-session-sweeper", daemon=True).start()
+
+    def new_session(self, user=None) -> str:
+        session_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._sessions[session_id] = {"user": user, "entries": {}, "touched": time.time()}
+        return session_id
+
+    def put(self, session_id, name, value):
+        """Stores `value` (a DataFrame or bytes) under `name`, replacing any earlier value."""
+        with self._lock:
+            session = self._touch(session_id)
+            previous = session["entries"].pop(name, None)
+            session["entries"][name] = _Entry(value)
+        if previous is not None and previous.path:
+            _remove(previous.path)
+
+    def get(self, session_id, name, default=None):
+        """Returns the value stored under `name`, reading it back from disk if it was spilled."""
+        while True:
+            with self._lock:
+                entry = self._touch(session_id)["entries"].get(name)
+                if entry is None:
+                    return default
+                if entry.value is not None:
+                    return entry.value
+                path = entry.path
+            # Read without the lock, so other sessions are not held up by this one's disk read
+            try:
+                value = pd.read_pickle(path)
+            except FileNotFoundError:
+                # Another reader loaded it first, or it was replaced or dropped; look again
+                continue
+            with self._lock:
+                loaded = entry.path == path
+                if loaded:
+                    entry.value, entry.path, entry.disk_bytes = value, None, 0
+            if loaded:
+                _remove(path)
+                return value
+
+    def names(self, session_id) -> list:
+        with self._lock:
+            return list(self._touch(session_id)["entries"])
+
+    def drop(self, session_id, names=None):
+        """Deletes the given entries of a session, or the whole session when `names` is None."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return
+            if names is None:
+                entries = list(self._sessions.pop(session_id)["entries"].values())
+            else:
+                entries = [session["entries"].pop(name) for name in names if name in session["entries"]]
+        for entry in entries:
+            if entry.path:
+                _remove(entry.path)
+
+    def spill_idle(self, idle_seconds=None, keep=None) -> int:
+        """
+        Writes every in-memory entry of sessions idle for `idle_seconds` (default: `spill_after`)
+        to disk, except the session `keep`, and deletes sessions past retention.
+        Returns the number of sessions spilled.
+        """
+        idle_seconds = self.spill_after if idle_seconds is None else idle_seconds
+        now = time.time()
+        spilled = 0
+        with self._lock:
+            expired = [sid for sid, s in self._sessions.items() if now - s["touched"] > self.retention]
+            candidates = [(sid, s) for sid, s in self._sessions.items()
+                          if sid != keep and sid not in expired and now - s["touched"] >= idle_seconds]
+        for session_id in expired:
+            self.drop(session_id)
+        for session_id, session in candidates:
+            with self._lock:
+                if time.time() - session["touched"] < idle_seconds:
+                    continue
+                in_memory = [(name, e, e.value) for name, e in session["entries"].items() if e.value is not None]
+            # Pickle without the lock, then drop the value only if the entry is unchanged and the session still idle
+            written = 0
+            for name, entry, value in in_memory:
+                path = os.path.join(self.directory, f"{session_id}-{uuid.uuid4().hex[:8]}.pkl")
+                pd.to_pickle(value, path)
+                disk_bytes = os.path.getsize(path)
+                with self._lock:
+                    current = (session["entries"].get(name) is entry and entry.value is value
+                               and self._sessions.get(session_id) is session
+                               and time.time() - session["touched"] >= idle_seconds)
+                    if current:
+                        entry.path, entry.disk_bytes, entry.value = path, disk_bytes, None
+                if current:
+                    written += 1
+                else:
+                    _remove(path)
+            spilled += bool(written)
+        return spilled
+
+    def usage(self) -> list:
+        """One row per session: owner, entry count, bytes held in memory and on disk, idle seconds."""
+        now = time.time()
+        with self._lock:
+            return [
+                {
+                    "session": session_id,
+                    "user": session["user"],
+                    "entries": len(session["entries"]),
+                    "memory_bytes": sum(e.nbytes for e in session["entries"].values() if e.value is not None),
+                    "disk_bytes": sum(e.disk_bytes for e in session["entries"].values() if e.value is None),
+                    "idle_seconds": now - session["touched"],
+                }
+                for session_id, session in self._sessions.items()
+            ]
+
+    def _touch(self, session_id):
+        session = self._sessions.get(session_id)
+        if session is None:
+            # e.g. after the session was deleted for retention; start it again empty
+            session = self._sessions[session_id] = {"user": None, "entries": {}}
+        session["touched"] = time.time()
+        return session
+
+    def _sweep_forever(self):
+        while True:
+            time.sleep(max(self.spill_after / 4, 1.0))
+            try:
+                self.spill_idle()
+            except OSError:
+                # A full or missing spill directory only means entries stay in memory
+                pass
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,213 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from difflib import SequenceMatcher
+
+import numpy as np
+import pandas as pd
+
+from result_cache import ResultCache
+
+# ==========================
+# Title Similarity Engine
+# ==========================
+# Above this many distinct pairs, scoring is spread across a process pool
+PARALLEL_THRESHOLD = int(os.getenv("RETITLING_SIMILARITY_PARALLEL_THRESHOLD", "20000"))
+SIMILARITY_WORKERS = int(os.getenv("RETITLING_SIMILARITY_WORKERS", str(os.cpu_count() or 1)))
+# "difflib" is the original SequenceMatcher metric (the default, so reports stay comparable with
+# older ones); "lcs" is the fast bit-parallel ratio
+SIMILARITY_METHODS = ("difflib", "lcs")
+DEFAULT_SIMILARITY_METHOD = "difflib"
+# How far "lcs" may drift from "difflib" on product titles (checked by tests/test_similarity.py):
+# the mean over a set of pairs within this many points, and each row within LCS_MAX_ROW_GAP
+# points when words are in the same order (LCS never scores lower; reordered words can score far higher)
+LCS_MEAN_TOLERANCE = 1.0
+LCS_MAX_ROW_GAP = 10.0
+# Pair scores live in their own file so they never evict cached model results
+SCORE_CACHE_PATH = os.getenv("RETITLING_SCORE_CACHE_PATH", ".retitling_scores.sqlite3")
+
+_score_cache = None
+_score_cache_lock = threading.Lock()
+
+
+def normalize_for_match(series):
+    """Key used for `Exact Match`: str() of the cell, lowercased and stripped (blank cells become "nan")."""
+    series = pd.Series(series).astype(object)
+    # Blank xlsx cells arrive as None, blank CSV/Parquet cells as NaN; both read as "nan" here
+    return series.where(series.notna(), np.nan).astype(str).str.lower().str.strip()
+
+
+def exact_matches(ai_titles, gt_titles):
+    """Vectorized exact-match flags, identical to comparing str(x).lower().strip() row by row."""
+    return normalize_for_match(ai_titles).to_numpy() == normalize_for_match(gt_titles).to_numpy()
+
+
+def lcs_length(a, b) -> int:
+    """
+    Length of the longest common subsequence of two strings, computed bit-parallel
+    (Allison-Dix / Hyyro): one pass over `a` with integer masks as wide as `b`.
+    """
+    if not a or not b:
+        return 0
+    masks = {}
+    for i, ch in enumerate(b):
+        masks[ch] = masks.get(ch, 0) | (1 << i)
+    full = (1 << len(b)) - 1
+    v = full
+    for ch in a:
+        u = v & masks.get(ch, 0)
+        v = ((v + u) | (v - u)) & full
+    return len(b) - bin(v).count("1")
+
+
+def similarity_ratio(a, b) -> float:
+    """Indel similarity 2·LCS / (len(a) + len(b)) as a percentage; two empty strings score 100."""
+    total = len(a) + len(b)
+    if total == 0:
+        return 100.0
+    return 200.0 * lcs_length(a, b) / total
+
+
+def difflib_ratio(a, b) -> float:
+    """The original metric: difflib.SequenceMatcher ratio as a percentage."""
+    return SequenceMatcher(None, a, b).ratio() * 100
+
+
+def _score_pairs(pairs, method=DEFAULT_SIMILARITY_METHOD):
+    score = similarity_ratio if method == "lcs" else difflib_ratio
+    return [score(a, b) for a, b in pairs]
+
+
+def similarity_scores(ai_titles, gt_titles, method=DEFAULT_SIMILARITY_METHOD, workers=SIMILARITY_WORKERS):
+    """
+    `Similarity %` for each row pair (0-100), replacing the row-wise difflib pass.
+
+    Strings are lowercased in one vectorized step, equal pairs short-circuit to 100, missing
+    cells score 0, and each distinct remaining pair is scored once, across a process pool when
+    there are many. `method="difflib"` (the default) reproduces historical per-row scores exactly.
+    `method="lcs"` uses the bit-parallel LCS ratio; SequenceMatcher computes a greedy
+    approximation of the same quantity and never scores higher, so averages agree within
+    LCS_MEAN_TOLERANCE points on product titles (see `compare_with_difflib`), single rows within
+    LCS_MAX_ROW_GAP, and a row with reordered words can score much higher.
+    """
+    if method not in SIMILARITY_METHODS:
+        raise ValueError(f"Unknown similarity method '{method}' (expected one of: {', '.join(SIMILARITY_METHODS)})")
+    ai_titles = pd.Series(ai_titles).reset_index(drop=True)
+    gt_titles = pd.Series(gt_titles).reset_index(drop=True)
+    scores = np.zeros(len(ai_titles), dtype=float)
+
+    present = (ai_titles.notna() & gt_titles.notna()).to_numpy()
+    a = ai_titles[present].astype(str).str.lower()
+    b = gt_titles[present].astype(str).str.lower()
+    equal = a.to_numpy() == b.to_numpy()
+    scores[np.flatnonzero(present)[equal]] = 100.0
+
+    # Score each distinct (AI, GT) pair once
+    rest = pd.DataFrame({"a": a[~equal].to_numpy(), "b": b[~equal].to_numpy()})
+    if rest.empty:
+        return scores
+    codes, uniques = pd.MultiIndex.from_frame(rest).factorize()
+    pairs = list(uniques)
+
+    if workers > 1 and len(pairs) >= PARALLEL_THRESHOLD:
+        size = -(-len(pairs) // (workers * 4))
+        chunks = [pairs[i:i + size] for i in range(0, len(pairs), size)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            unique_scores = [s for part in pool.map(_score_pairs, chunks, [method] * len(chunks)) for s in part]
+    else:
+        unique_scores = _score_pairs(pairs, method)
+
+    scores[np.flatnonzero(present)[~equal]] = np.asarray(unique_scores)[codes]
+    return scores
+
+
+def compare_with_difflib(ai_titles, gt_titles, sample=1000, seed=0) -> dict:
+    """Mean and max absolute gap (in points) between the LCS and difflib scores on a sample of rows."""
+    frame = pd.DataFrame({"a": pd.Series(ai_titles).reset_index(drop=True),
+                          "b": pd.Series(gt_titles).reset_index(drop=True)})
+    frame = frame.sample(min(sample, len(frame)), random_state=seed)
+    fast = similarity_scores(frame["a"], frame["b"], method="lcs", workers=1)
+    slow = similarity_scores(frame["a"], frame["b"], method="difflib", workers=1)
+    gap = np.abs(fast - slow)
+    return {"rows": len(frame), "mean_gap": float(gap.mean()) if len(gap) else 0.0,
+            "max_gap": float(gap.max()) if len(gap) else 0.0}
+
+
+# ==========================
+# Incremental Evaluation
+# ==========================
+def get_score_cache() -> ResultCache:
+    """Returns the process-wide (AI title, GT title) → score cache, opening it on first use."""
+    global _score_cache
+    if _score_cache is None:
+        with _score_cache_lock:
+            if _score_cache is None:
+                _score_cache = ResultCache(SCORE_CACHE_PATH)
+    return _score_cache
+
+
+def pair_keys(ai_titles, gt_titles, method):
+    """Cache key of each raw (AI, GT) pair; missing cells hash differently from the string "nan"."""
+    parts = [method]
+    for titles in (ai_titles, gt_titles):
+        titles = pd.Series(titles).reset_index(drop=True)
+        parts.append(titles.astype(str).where(titles.notna(), "\x00"))
+    joined = parts[1].str.cat(parts[2], sep="\x1f")
+    return [hashlib.blake2b(f"{method}\x1f{pair}".encode("utf-8"), digest_size=16).hexdigest() for pair in joined]
+
+
+def evaluate_pairs(ai_titles, gt_titles, method=DEFAULT_SIMILARITY_METHOD, cache=None):
+    """
+    `Exact Match` flags and `Similarity %` scores for each row pair, looking every distinct
+    pair up in `cache` (a ResultCache) first so that only pairs not seen before are scored.
+    Returns (exact, similarity, cached) where `cached` counts the distinct pairs served from cache.
+    """
+    ai_titles = pd.Series(ai_titles).reset_index(drop=True)
+    gt_titles = pd.Series(gt_titles).reset_index(drop=True)
+    codes, keys = pd.factorize(np.asarray(pair_keys(ai_titles, gt_titles, method), dtype=object))
+    # Row of the first occurrence of each distinct pair
+    first = pd.Series(np.arange(len(codes))).groupby(codes).first().to_numpy()
+
+    known = cache.get_many(keys) if cache is not None else {}
+    missing = np.array([key not in known for key in keys], dtype=bool)
+    exact = np.zeros(len(keys), dtype=bool)
+    similarity = np.zeros(len(keys), dtype=float)
+    for i in np.flatnonzero(~missing):
+        exact[i], similarity[i] = known[keys[i]]
+
+    if missing.any():
+        rows = first[missing]
+        exact[missing] = exact_matches(ai_titles.iloc[rows], gt_titles.iloc[rows])
+        similarity[missing] = similarity_scores(ai_titles.iloc[rows], gt_titles.iloc[rows], method=method)
+        if cache is not None:
+            cache.put_many(
+                (keys[i], [bool(exact[i]), float(similarity[i])]) for i in np.flatnonzero(missing)
+            )
+
+    return exact[codes], similarity[codes], int((~missing).sum())
+
+
+def align_on_key(ai_df, gt_df, key_col, ai_title_col, gt_title_col, cat_col=None):
+    """
+    Pairs AI and GT rows by `key_col` instead of row order. Keys present in only one file are
+    dropped and duplicate keys keep their first row. Returns the comparison frame and a dict of
+    counts (`ai_only`, `gt_only`, `duplicates`).
+    """
+    if key_col in (ai_title_col, gt_title_col):
+        raise ValueError("The join key must not be a title column")
+    ai = ai_df[[key_col, ai_title_col] + ([cat_col] if cat_col in ai_df.columns else [])]
+    gt = gt_df[[key_col, gt_title_col] + ([cat_col] if cat_col in gt_df.columns and cat_col not in ai.columns else [])]
+    duplicates = int(ai[key_col].duplicated().sum() + gt[key_col].duplicated().sum())
+    ai = ai.drop_duplicates(key_col).rename(columns={ai_title_col: "AI Title"})
+    gt = gt.drop_duplicates(key_col).rename(columns={gt_title_col: "GT Title"})
+
+    merged = ai.merge(gt, on=key_col, how="inner", sort=False)
+    if cat_col and cat_col in merged.columns:
+        merged = merged.rename(columns={cat_col: "Category"})
+    counts = {
+        "ai_only": int((~ai[key_col].isin(gt[key_col])).sum()),
+        "gt_only": int((~gt[key_col].isin(ai[key_col])).sum()),
+        "duplicates": duplicates,
+    }
+    return merged.reset_index(drop=True), counts
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# The modules live at the repository root rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keep the persistent result cache out of the working tree (read when result_cache is imported)
+os.environ.setdefault("RETITLING_CACHE_PATH", os.path.join(tempfile.mkdtemp(prefix="retitling-tests-"), "cache.sqlite3"))
+# Background jobs checkpoint to run journals (read when run_journal is imported)
+os.environ.setdefault("RETITLING_JOURNAL_DIR", tempfile.mkdtemp(prefix="retitling-journal-"))
@@ -0,0 +1,70 @@
+import io
+import os
+
+import pandas as pd
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+import catalog_io
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+class Upload(io.BytesIO):
+    """Stands in for Streamlit's UploadedFile, which AppTest cannot produce."""
+
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+
+
+@pytest.fixture
+def app(monkeypatch):
+    """The logged-in app with a processed catalog in the title uploader, counting file reads and writes."""
+    st.cache_resource.clear()
+    st.cache_data.clear()
+    upload = pd.DataFrame({
+        "NAME": ["Gucci Tote", "Prada Loafers"],
+        "Updated Title": ["Gucci Black Tote Bag", "Prada Black Loafers"],
+        "CATEGORY": ["Handbags", "Shoes"],
+    }).to_csv(index=False).encode()
+    file_uploader = st.file_uploader
+
+    def fake_uploader(label, *args, key=None, **kwargs):
+        file_uploader(label, *args, key=key, **kwargs)
+        return Upload(upload, "catalog.csv") if key == "title_gen_upload" else None
+
+    calls = {"read_table": 0, "write_table": 0}
+
+    def counted(function):
+        def wrapper(*args, **kwargs):
+            calls[function.__name__] += 1
+            return function(*args, **kwargs)
+        return wrapper
+
+    monkeypatch.setattr(st, "file_uploader", fake_uploader)
+    monkeypatch.setattr(catalog_io, "read_table", counted(catalog_io.read_table))
+    monkeypatch.setattr(catalog_io, "write_table", counted(catalog_io.write_table))
+    at = AppTest.from_file(APP_PATH, default_timeout=30)
+    at.session_state["authenticated"] = True
+    at.session_state["username"] = "admin"
+    yield at, calls
+    st.cache_resource.clear()
+
+
+def test_reruns_reuse_the_parsed_upload_and_download_bytes(app):
+    at, calls = app
+    at.run()
+    assert not at.exception
+    assert calls == {"read_table": 1, "write_table": 1}
+
+    at.run()
+    at.run()
+    assert calls == {"read_table": 1, "write_table": 1}
+
+    # Another format is serialized once, and switching back reuses the first
+    at.radio(key="title_gen_output_format").set_value("csv").run()
+    at.radio(key="title_gen_output_format").set_value("xlsx").run()
+    assert not at.exception
+    assert calls == {"read_table": 1, "write_table": 2}
@@ -0,0 +1,83 @@
+import io
+
+import pandas as pd
+
+from catalog_io import ChunkWriter, iter_chunks, read_table, write_table
+
+
+def _sparse_frame():
+    # PRICE is blank in the first chunk, whole numbers in the next and fractional after that
+    return pd.DataFrame({
+        "Product Name": [f"Gucci Bag {i}" for i in range(9)],
+        "PRICE": [None, None, None, 100, 200, 300, 12.5, None, 40.25],
+        "SKU": [None, None, None, None, None, None, "A1", "B2", "C3"],
+    })
+
+
+def _write_chunks(df, target, chunksize=3):
+    with ChunkWriter(target, fmt="parquet") as writer:
+        for start in range(0, len(df), chunksize):
+            writer.write(df.iloc[start:start + chunksize].reset_index(drop=True))
+    return writer
+
+
+def test_chunked_parquet_with_sparse_columns(tmp_path):
+    df = _sparse_frame()
+    path = tmp_path / "out.parquet"
+    writer = _write_chunks(df, str(path))
+    result = pd.read_parquet(path)
+    assert writer.rows_written == len(df)
+    assert result["PRICE"].dtype == "float64"
+    assert result["PRICE"].tolist()[3:7] == [100.0, 200.0, 300.0, 12.5]
+    assert result["SKU"].tolist()[6:] == ["A1", "B2", "C3"]
+
+
+def test_chunked_parquet_to_buffer():
+    df = _sparse_frame()
+    output = io.BytesIO()
+    _write_chunks(df, output)
+    result = pd.read_parquet(io.BytesIO(output.getvalue()))
+    assert result["PRICE"].iloc[-1] == 40.25
+
+
+def test_write_table_parquet_round_trip():
+    df = _sparse_frame()
+    output = io.BytesIO(write_table(df, "parquet", chunksize=3))
+    output.name = "out.parquet"
+    result = read_table(output)
+    pd.testing.assert_frame_equal(result, df, check_dtype=False)
+
+
+def test_column_empty_everywhere_is_stored_as_strings(tmp_path):
+    df = pd.DataFrame({"Product Name": ["a", "b"], "Notes": [None, None]})
+    path = tmp_path / "empty.parquet"
+    _write_chunks(df, str(path), chunksize=1)
+    result = pd.read_parquet(path)
+    assert result["Notes"].isna().all()
+
+
+def _mixed_frame():
+    # An ID column holding ints in the first rows and strings after; Excel keeps both types
+    return pd.DataFrame({
+        "Product Name": [f"Gucci Bag {i}" for i in range(6)],
+        "SKU": [1001, 1002, 1003, "A-17", None, 1006],
+    })
+
+
+def test_mixed_type_column_xlsx_to_parquet_chunked(tmp_path):
+    source = tmp_path / "mixed.xlsx"
+    _mixed_frame().to_excel(source, index=False)
+    path = tmp_path / "out.parquet"
+    with ChunkWriter(str(path)) as writer:
+        for chunk in iter_chunks(str(source), chunksize=2):
+            writer.write(chunk)
+    result = pd.read_parquet(path)
+    assert result["SKU"].tolist() == ["1001", "1002", "1003", "A-17", None, "1006"]
+
+
+def test_mixed_type_column_xlsx_to_parquet_write_table(tmp_path):
+    source = tmp_path / "mixed.xlsx"
+    _mixed_frame().to_excel(source, index=False)
+    output = io.BytesIO(write_table(read_table(str(source)), "parquet", chunksize=2))
+    result = pd.read_parquet(output)
+    assert result["SKU"].tolist() == ["1001", "1002", "1003", "A-17", None, "1006"]
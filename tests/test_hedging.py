@@ -0,0 +1,15 @@
+from luxury_correction import HEDGE_RECOMPUTE_EVERY, HedgePolicy
+
+
+def test_delay_is_cached_between_recomputes_once_the_window_is_full():
+    hedger = HedgePolicy(budget=1.0, window=40, min_samples=20, min_delay=0.0)
+    for _ in range(40):
+        hedger.observe("pro", 1.0)
+    assert hedger.delay("pro") == 1.0
+
+    # A full window keeps its length, but the delay must still only be recomputed every few samples
+    for _ in range(HEDGE_RECOMPUTE_EVERY - 1):
+        hedger.observe("pro", 5.0)
+        assert hedger.delay("pro") == 1.0
+    hedger.observe("pro", 5.0)
+    assert hedger.delay("pro") == 5.0
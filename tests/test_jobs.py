@@ -0,0 +1,69 @@
+import time
+import uuid
+
+import pandas as pd
+import pytest
+
+import luxury_correction
+import pipeline
+from backends import FakeBackend
+from jobs import FINISHED_STATUSES, JobStore
+from run_journal import content_hash
+
+
+@pytest.fixture
+def store(monkeypatch):
+    monkeypatch.setattr(luxury_correction, "_replacements", {})
+    # Results reach the job's frame on the next post-processing flush
+    monkeypatch.setattr(pipeline, "POSTPROCESS_MAX_DELAY", 0.05)
+    luxury_correction.set_model(FakeBackend(latency="fixed", latency_ms=20))
+    return JobStore(max_workers=1)
+
+
+def _catalog(rows):
+    run = uuid.uuid4().int % 10**6
+    return pd.DataFrame({
+        "NAME": [f"Zq{run:06d} Widget Thing {i}" for i in range(rows)],
+        "Updated Title": None,
+        "SKU": range(rows),
+    })
+
+
+def _submit(store, df):
+    return store.submit(df, "NAME", "Updated Title", file_name="catalog.csv",
+                        file_hash=content_hash(df.to_csv().encode()), concurrency=2)
+
+
+def _wait(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_completed_job_fills_every_title_without_touching_the_upload(store):
+    df = _catalog(6)
+    job = store.get(_submit(store, df))
+    _wait(lambda: job.status in FINISHED_STATUSES)
+
+    assert job.status == "completed" and job.completed == job.total == 6
+    assert df["Updated Title"].isna().all()
+    assert job.result_columns()["Updated Title"].notna().all()
+
+
+def test_cancelled_job_keeps_the_titles_finished_so_far(store):
+    df = _catalog(60)
+    job = store.get(_submit(store, df))
+    _wait(lambda: job.partial_frame()["Updated Title"].notna().sum() >= 4)
+
+    # A partial download is the whole upload, with the titles filled so far
+    partial = job.partial_frame()
+    pd.testing.assert_frame_equal(partial[["NAME", "SKU"]], df[["NAME", "SKU"]], check_dtype=False)
+
+    store.cancel(job.id)
+    _wait(lambda: job.status in FINISHED_STATUSES)
+    assert job.status == "cancelled" and job.stats["cancelled"]
+    titles = job.result_columns()["Updated Title"]
+    filled = titles.notna()
+    assert partial["Updated Title"].notna().sum() <= filled.sum() < 60
+    assert titles[filled].str.endswith("Shoulder Bag").all()
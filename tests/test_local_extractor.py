@@ -0,0 +1,25 @@
+import pytest
+
+from local_extractor import LocalExtractor
+from luxury_correction import luxury_data
+
+extractor = LocalExtractor(luxury_data)
+
+
+@pytest.mark.parametrize("title, style", [
+    ("Gucci Men's Black Leather Loafers", "Men's"),
+    ("Gucci Women's Black Leather Tote", "Women's"),
+    ("Prada Women’s Black Leather Tote", "Women’s"),
+])
+def test_possessive_s_is_not_a_size(title, style):
+    result = extractor.extract(title)
+    assert result["attributes"]["size"] is None
+    assert result["attributes"]["style"] == style
+    assert " S " not in result["corrected_title"]
+    assert style in result["corrected_title"]
+
+
+def test_standalone_size_letter_still_matches():
+    result = extractor.extract("Gucci S Black Leather Tote")
+    assert result["attributes"]["size"] == "S"
+    assert result["confidence"] >= 0.9
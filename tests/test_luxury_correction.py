@@ -0,0 +1,207 @@
+import asyncio
+import json
+import re
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from tenacity import wait_none
+
+import luxury_correction
+from backends import FakeAPIError, FakeBackend
+from luxury_correction import (CATEGORY_SYSTEM_INSTRUCTIONS, SYSTEM_INSTRUCTION, AdaptiveConcurrencyLimiter, HedgePolicy,
+                                is_throttled, is_transient, prompt_category)
+
+
+def _titles(count):
+    run = uuid.uuid4().int % 10**6
+    return [f"Zq{run:06d} Widget Thing {i}" for i in range(count)]
+
+
+_TITLE_RE = re.compile(r'Input title: "(.*)"')
+
+
+def _batch_titles(prompt):
+    """The titles a batched prompt asks for (see `build_batch_prompt`)."""
+    return json.loads(prompt.split("\n", 1)[1].split("\n\nReturn", 1)[0])
+
+
+class DroppingBackend(FakeBackend):
+    """Leaves the entries of `dropped` titles out of batched responses, once or (`always_dropped`) every time."""
+
+    def __init__(self, dropped=(), always_dropped=()):
+        super().__init__(latency="fixed", latency_ms=1)
+        self.prompts = []
+        self.dropped = set(dropped)
+        self.always_dropped = set(always_dropped)
+
+    def generate_content(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        response = super().generate_content(prompt, **kwargs)
+        titles = _batch_titles(prompt)
+        items = [item for item, title in zip(json.loads(response.text), titles)
+                 if title not in self.dropped | self.always_dropped]
+        self.dropped -= set(titles)
+        return SimpleNamespace(text=json.dumps(items), usage_metadata=response.usage_metadata)
+
+
+class InFlightBackend(FakeBackend):
+    """Records the most async calls it had in flight at once."""
+
+    def __init__(self):
+        super().__init__(latency="fixed", latency_ms=20)
+        self.in_flight = 0
+        self.peak = 0
+
+    async def generate_content_async(self, prompt, **kwargs):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            return await super().generate_content_async(prompt, **kwargs)
+        finally:
+            self.in_flight -= 1
+
+
+class FailingBackend(FakeBackend):
+    """Fails its first `failures` async calls with HTTP `code`."""
+
+    def __init__(self, failures, code=503):
+        super().__init__(latency="fixed", latency_ms=1)
+        self.failures = failures
+        self.code = code
+
+    async def generate_content_async(self, prompt, **kwargs):
+        if self.failures > 0:
+            self.failures -= 1
+            raise FakeAPIError(self.code, "Service unavailable")
+        return await super().generate_content_async(prompt, **kwargs)
+
+
+class InstructedBackend(FakeBackend):
+    """Records each title it is asked about under the system instruction it was built with."""
+
+    def __init__(self, system_instruction, seen):
+        super().__init__(latency="fixed", latency_ms=1)
+        self.system_instruction = system_instruction
+        self.seen = seen
+
+    async def generate_content_async(self, prompt, **kwargs):
+        self.seen[_TITLE_RE.search(prompt).group(1)] = self.system_instruction
+        return await super().generate_content_async(prompt, **kwargs)
+
+
+@pytest.fixture
+def no_replacements(monkeypatch):
+    monkeypatch.setattr(luxury_correction, "_replacements", {})
+
+
+def test_batched_titles_share_one_request_and_only_missing_entries_are_retried(no_replacements):
+    titles = _titles(5)
+    model = DroppingBackend(dropped={titles[1], titles[3]})
+    luxury_correction.set_model(model)
+
+    results = luxury_correction.correct_luxury_titles(titles, batch_size=5, use_cache=False)
+
+    assert [_batch_titles(p) for p in model.prompts] == [titles, [titles[1], titles[3]]]
+    assert [r["corrected_title"] for r in results] == [f"{t} Shoulder Bag" for t in titles]
+
+
+def test_entries_missing_after_every_retry_are_errors(no_replacements):
+    titles = _titles(3)
+    model = DroppingBackend(always_dropped={titles[2]})
+    luxury_correction.set_model(model)
+
+    results = luxury_correction.correct_luxury_titles(titles, batch_size=2, max_retries=1, use_cache=False)
+
+    assert [_batch_titles(p) for p in model.prompts] == [titles[:2], titles[2:], titles[2:]]
+    assert ["error" in r for r in results] == [False, False, True]
+
+
+def test_async_driver_keeps_at_most_concurrency_calls_in_flight(no_replacements):
+    titles = _titles(12)
+    model = InFlightBackend()
+    luxury_correction.set_model(model)
+    completed = []
+
+    results = asyncio.run(luxury_correction.correct_titles_async(
+        titles, concurrency=3, use_cache=False, hedger=HedgePolicy(budget=0),
+        on_result=lambda index, result: completed.append(index),
+    ))
+
+    assert model.peak == 3
+    assert sorted(completed) == list(range(12))
+    assert [r["corrected_title"] for r in results] == [f"{t} Shoulder Bag" for t in titles]
+
+
+def test_blocking_driver_reports_progress(no_replacements):
+    titles = _titles(4)
+    luxury_correction.set_model(FakeBackend(latency="fixed", latency_ms=1))
+    progress = []
+
+    results = luxury_correction.correct_titles(titles, concurrency=2, use_cache=False,
+                                               progress_callback=lambda done, total: progress.append((done, total)))
+
+    assert progress == [(0, 4), (1, 4), (2, 4), (3, 4), (4, 4)]
+    assert all(r["source"] == "llm" for r in results)
+
+
+def test_limiter_grows_on_success_and_shrinks_once_per_burst_of_throttling():
+    limiter = AdaptiveConcurrencyLimiter(max_limit=100, initial_limit=8, cooldown=60)
+
+    async def call(**outcome):
+        await limiter.acquire()
+        limiter.release(**outcome)
+
+    asyncio.run(call(succeeded=True))
+    assert limiter.limit == 9
+    asyncio.run(call(throttled=True))
+    asyncio.run(call(throttled=True))
+    assert limiter.limit == 4.5 and limiter.throttle_events == 2
+    # Additive increase after the first throttle
+    asyncio.run(call(succeeded=True))
+    assert limiter.limit == pytest.approx(4.5 + 1 / 4.5)
+
+
+def test_status_codes_are_classified():
+    assert is_throttled(FakeAPIError(429, "quota")) and is_throttled(FakeAPIError(503, "overloaded"))
+    assert not is_throttled(FakeAPIError(500, "internal")) and is_transient(FakeAPIError(500, "internal"))
+    assert not is_transient(FakeAPIError(400, "bad request"))
+
+
+def test_throttled_calls_are_retried_and_only_permanent_failures_are_errors(no_replacements, monkeypatch):
+    monkeypatch.setattr(luxury_correction, "wait_random_exponential", lambda **kwargs: wait_none())
+    limiter = AdaptiveConcurrencyLimiter(max_limit=4)
+    luxury_correction.set_model(FailingBackend(failures=2))
+    [recovered] = asyncio.run(luxury_correction.correct_titles_async(_titles(1), use_cache=False, limiter=limiter))
+    assert recovered["source"] == "llm" and "error" not in recovered
+    assert limiter.throttle_events == 2 and limiter.limit < 4
+
+    luxury_correction.set_model(FailingBackend(failures=1000, code=500))
+    [failed] = asyncio.run(luxury_correction.correct_titles_async(_titles(1), use_cache=False))
+    assert "500" in failed["error"]
+
+
+def test_catalog_categories_map_to_prompt_categories():
+    assert [prompt_category(v) for v in ("Women's Handbags", "WRISTWATCHES", "Rings", "Sneakers & Boots")] == [
+        "Handbags", "Watches", "Fine Jewelry", "Shoes"]
+    assert prompt_category("Home Decor") is None and prompt_category(float("nan")) is None
+
+
+def test_compact_prompts_keep_only_their_category_rules():
+    handbags, watches = CATEGORY_SYSTEM_INSTRUCTIONS["Handbags"], CATEGORY_SYSTEM_INSTRUCTIONS["Watches"]
+    assert "Size normalization" in handbags and "Watch subcategories" not in handbags
+    assert "Watch subcategories" in watches and "Size normalization" not in watches
+    assert all(len(prompt) < len(SYSTEM_INSTRUCTION) for prompt in CATEGORY_SYSTEM_INSTRUCTIONS.values())
+
+
+def test_titles_are_routed_to_their_category_prompt(no_replacements, monkeypatch):
+    seen = {}
+    monkeypatch.setattr(luxury_correction, "_models", {})
+    monkeypatch.setattr(luxury_correction, "create_backend",
+                        lambda name, system_instruction=None, **config: InstructedBackend(system_instruction, seen))
+    titles = _titles(3)
+
+    luxury_correction.correct_titles(titles, use_cache=False, categories=["Women's Handbags", "Wristwatches", "Decor"])
+
+    assert [seen[t] for t in titles] == [
+        CATEGORY_SYSTEM_INSTRUCTIONS["Handbags"], CATEGORY_SYSTEM_INSTRUCTIONS["Watches"], SYSTEM_INSTRUCTION]
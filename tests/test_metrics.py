@@ -0,0 +1,43 @@
+from types import SimpleNamespace
+
+from luxury_correction import _CallStats
+from metrics import RunMetrics
+
+
+def _attempts(n):
+    return SimpleNamespace(statistics={"attempt_number": n})
+
+
+def test_escalation_is_not_a_retry():
+    stats = _CallStats()
+    stats.add_attempts(_attempts(1))  # fast tier, rejected by validation
+    stats.add_attempts(_attempts(1))  # pro tier
+    metrics = RunMetrics()
+    metrics.record("llm", 1.0, attempts=stats.attempts, retries=stats.retries, tier="pro", escalated=True)
+    summary = metrics.summary()
+    assert stats.attempts == 2
+    assert summary["retries"] == {"total": 0, "histogram": {"0": 1}}
+    assert "retitling_retries_total 0" in metrics.to_prometheus()
+
+
+def test_retries_are_counted_per_tier():
+    stats = _CallStats()
+    stats.add_attempts(_attempts(2))
+    stats.add_attempts(_attempts(3))
+    assert (stats.attempts, stats.retries) == (5, 3)
+
+
+def test_retries_default_to_attempts_after_the_first():
+    metrics = RunMetrics()
+    metrics.record("llm", 1.0, attempts=3)
+    assert metrics.summary()["retries"]["total"] == 2
+
+
+def test_queue_seconds_is_a_prometheus_summary():
+    metrics = RunMetrics()
+    metrics.record("llm", 1.0, queue_seconds=0.5)
+    metrics.record("llm", 1.0, queue_seconds=1.5)
+    text = metrics.to_prometheus()
+    assert "# TYPE retitling_queue_seconds summary" in text
+    assert "retitling_queue_seconds_sum 2.0" in text
+    assert "retitling_queue_seconds_count 2" in text
@@ -0,0 +1,25 @@
+from luxury_correction import luxury_data, normalize_title
+from near_duplicates import NearDuplicateIndex
+
+
+def _index(*titles):
+    index = NearDuplicateIndex(luxury_data)
+    index.add_many([normalize_title(t) for t in titles])
+    return index
+
+
+def test_negated_word_is_a_different_product():
+    index = _index("Rolex Oyster Perpetual Automatic Black Dial Stainless Steel Men's Wristwatch Date")
+    assert index.lookup(normalize_title(
+        "Rolex Oyster Perpetual Automatic Black Dial Stainless Steel Men's Wristwatch No Date")) is None
+
+
+def test_digits_must_match():
+    index = _index("Hermes Birkin 30 Black Togo Leather Bag")
+    assert index.lookup(normalize_title("Hermes Birkin 35 Black Togo Leather Bag")) is None
+
+
+def test_noise_only_variant_is_a_near_duplicate():
+    index = _index("Gucci Marmont Small Black Leather Shoulder Bag")
+    match = index.lookup(normalize_title("AUTHENTIC Gucci Marmont Small Black Leather Shoulder Bag SKU 88213 NWT"))
+    assert match is not None and match[0] == normalize_title("Gucci Marmont Small Black Leather Shoulder Bag")
@@ -0,0 +1,40 @@
+import uuid
+
+import pandas as pd
+import pytest
+
+import luxury_correction
+from backends import FakeBackend
+from pipeline import fill_missing_titles, normalize_names
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    monkeypatch.setattr(luxury_correction, "_replacements", {})
+    model = FakeBackend(latency="fixed", latency_ms=1)
+    luxury_correction.set_model(model)
+    return model
+
+
+def test_normalize_names_matches_normalize_title():
+    names = pd.Series(["  Gucci  Tote-Bag!", "GUCCI tote bag", "Hermès Birkin 30", 42])
+    assert normalize_names(names).tolist() == [luxury_correction.normalize_title(n) for n in names]
+
+
+def test_each_unique_name_is_corrected_once(fake_model):
+    first, second = (f"Zq{uuid.uuid4().int % 10**6:06d} Widget Thing" for _ in range(2))
+    df = pd.DataFrame({
+        "NAME": [first, first.upper(), f"{first}!", second, f"  {second}  ", "Done"],
+        "Updated Title": [None] * 5 + ["Kept Title"],
+    })
+    progress = []
+
+    stats = fill_missing_titles(df, "NAME", "Updated Title", concurrency=4,
+                                progress_callback=lambda done, total: progress.append((done, total)))
+
+    assert stats["rows"] == 5 and stats["unique_titles"] == 2
+    assert progress[-1] == (2, 2)
+    assert stats["sources"]["llm"] == 2
+    titles = df["Updated Title"]
+    assert titles.notna().all() and titles.iloc[5] == "Kept Title"
+    assert titles.iloc[0] == titles.iloc[1] == titles.iloc[2] != titles.iloc[3] == titles.iloc[4]
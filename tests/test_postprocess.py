@@ -0,0 +1,96 @@
+import pytest
+
+from postprocess import drop_repeated_words, is_handbag_category, normalize_result, normalize_results
+
+
+def _result(category, title, **attributes):
+    return {"detected_category": category, "corrected_title": title, "attributes": attributes}
+
+
+RESULTS = [
+    _result("Handbags", "Hermès Birkin 30 Noir Togo Leather Handbag", brand="Hermès", size="30",
+            color="Noir", subcategory="Handbag"),
+    _result("handbag", "Gucci Black Leather Tote", brand="Gucci", color="Black"),
+    _result("BAGS", "Prada Black Leather Top Handle Bags", brand="Prada", subcategory="Top Handle Bag"),
+    _result("Handbags", "Louis Vuitton Neverfull MM Black, black, Beige Canvas Tote", brand="Louis Vuitton",
+            size="MM", color="Black, black, Beige"),
+    _result("Handbags", "Chanel Red, Blue, Green, Gold Leather Flap Bag", brand="Chanel",
+            color="Red, Blue, Green, Gold"),
+    _result("Shoes", "Gucci Black Black Leather Loafers", brand="Gucci", color="Black", size=None),
+    _result("Shoes", "Balenciaga multicolor Sneakers", brand="Balenciaga", color="multicolor"),
+    _result("Watches", "Rolex Submariner 116610LN Automatic Black Dial Stainless Steel Men's Wristwatch 40mm",
+            brand="Rolex", color=None),
+    _result(None, "Céline Small Luggage Tote", brand="Céline", size="S"),
+    _result("Handbags", "Louis Vuitton Speedy Bag", brand="Louis Vuitton", size="PM"),
+    {"error": "timeout"},
+    {"detected_category": "Handbags", "corrected_title": None, "attributes": {}},
+]
+
+
+def test_batch_and_single_forms_agree():
+    assert normalize_results(RESULTS) == [normalize_result(r) for r in RESULTS]
+
+
+@pytest.mark.parametrize("category", ["Handbags", "handbag", "BAGS", " Hand Bags "])
+def test_handbag_suffix_ignores_case_and_number(category):
+    result = _result(category, "Gucci Black Leather Tote", brand="Gucci")
+    assert normalize_result(result)["corrected_title"] == "Gucci Black Leather Tote Bag"
+    assert normalize_results([result])[0]["corrected_title"] == "Gucci Black Leather Tote Bag"
+
+
+def test_other_categories_get_no_suffix():
+    assert not is_handbag_category("Shoes")
+    assert not is_handbag_category(None)
+    assert normalize_result(_result("Shoes", "Gucci Black Leather Loafers"))["corrected_title"] == \
+        "Gucci Black Leather Loafers"
+
+
+def test_rules():
+    normalized = normalize_results(RESULTS)
+    assert normalized[0]["attributes"]["brand"] == "Hermes"
+    assert normalized[0]["attributes"]["subcategory"] == "Shoulder Bag"
+    assert normalized[2]["corrected_title"] == "Prada Black Leather Shoulder Bag"
+    assert normalized[3]["attributes"] == {"brand": "Louis Vuitton", "size": "M", "color": "Black, Beige"}
+    assert normalized[4]["attributes"]["color"] == "Multicolor"
+    assert normalized[5]["corrected_title"] == "Gucci Black Leather Loafers"
+    assert normalized[10] == {"error": "timeout"}
+
+
+@pytest.mark.parametrize("color", [" Black", "Black ", " Black, Beige ", "Black, black"])
+def test_color_whitespace_is_not_rewritten_into_the_title(color):
+    result = _result("Shoes", "Gucci Black Leather Loafers", brand="Gucci", color=color)
+    single = normalize_result(result)
+    assert single == normalize_results([result])[0]
+    assert "GucciBlack" not in single["corrected_title"]
+
+
+@pytest.mark.parametrize("title", ["Dior Lady Dior Bag", "Cartier Tank Louis Cartier Yellow Gold Wristwatch"])
+def test_style_names_containing_the_brand_keep_it(title):
+    assert drop_repeated_words(title) == title
+
+
+@pytest.mark.parametrize("title, expected", [
+    ("Gucci Black Black Leather Loafers", "Gucci Black Leather Loafers"),
+    ("Gucci Black, black Leather Loafers", "Gucci Black, Leather Loafers"),
+    ("Prada Bag Black Leather Bag", "Prada Black Leather Bag"),
+])
+def test_back_to_back_repeats_are_collapsed(title, expected):
+    assert drop_repeated_words(title) == expected
+
+
+@pytest.mark.parametrize("title", [
+    "Chanel Red Blue Green Gold Leather Flap Bag",
+    "Chanel Red/Blue/Green/Gold Leather Flap Bag",
+    "Chanel red, blue, green and gold Leather Flap Bag",
+])
+def test_four_colors_become_multicolor_in_the_title(title):
+    result = _result("Handbags", title, brand="Chanel", color="Red, Blue, Green, Gold")
+    single = normalize_result(result)
+    assert single == normalize_results([result])[0]
+    assert single["attributes"]["color"] == "Multicolor"
+    assert single["corrected_title"] == "Chanel Multicolor Leather Flap Bag"
+
+
+def test_duplicate_colors_are_rewritten_where_the_title_lists_them():
+    result = _result("Shoes", "Gucci Black Black Beige Leather Loafers", brand="Gucci", color="Black, black, Beige")
+    assert normalize_result(result)["corrected_title"] == "Gucci Black, Beige Leather Loafers"
@@ -0,0 +1,60 @@
+import time
+import uuid
+
+import pytest
+
+import luxury_correction
+from backends import FakeBackend
+from result_cache import ResultCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite3"))
+    yield cache
+    cache.close()
+
+
+def test_hits_and_misses_are_counted(cache):
+    cache.put("a", {"corrected_title": "Gucci Black Tote Bag"})
+    assert cache.get("a") == {"corrected_title": "Gucci Black Tote Bag"}
+    assert cache.get("b") is None
+    assert cache.get_many(["a", "b"]) == {"a": {"corrected_title": "Gucci Black Tote Bag"}}
+    assert cache.stats() == {"hits": 2, "misses": 2, "entries": 1}
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite3"), max_age_days=0.01 / 86400)
+    cache.put("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.get_many(["a"]) == {}
+    cache.close()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite3"), max_entries=2)
+    for key in ("a", "b"):
+        cache.put(key, key)
+        time.sleep(0.01)
+    cache.get("a")
+    time.sleep(0.01)
+    cache.put("c", "c")
+    cache.evict()
+    assert cache.keys() == ["c", "a"]
+    cache.close()
+
+
+def test_repeated_title_is_served_from_the_cache(monkeypatch):
+    monkeypatch.setattr(luxury_correction, "_replacements", {})
+    model = FakeBackend(latency="fixed", latency_ms=1)
+    luxury_correction.set_model(model)
+    title = f"Zq{uuid.uuid4().int % 10**6:06d} Widget Thing"
+
+    first = luxury_correction.correct_luxury_title(title)
+    calls = model.calls
+    # Case, punctuation and whitespace do not change the cache key
+    second = luxury_correction.correct_luxury_title(f"  {title.upper()}!")
+    assert first["source"] == "llm" and second["source"] == "cache"
+    assert second["corrected_title"] == first["corrected_title"]
+    assert model.calls == calls
@@ -0,0 +1,23 @@
+import json
+
+import luxury_correction
+from backends import canned_result
+from result_schema import ATTRIBUTE_KEYS, TitleResult, result_format
+
+
+def test_result_format_is_an_example_of_the_schema():
+    example = json.loads(result_format())
+    assert list(example) == list(TitleResult.model_fields)
+    assert list(example["attributes"]) == ATTRIBUTE_KEYS
+    assert example["attributes"]["brand"] == "value or null"
+
+
+def test_canned_results_carry_every_attribute():
+    assert list(canned_result("Gucci Black Leather Tote")["attributes"]) == ATTRIBUTE_KEYS
+
+
+def test_result_format_only_in_unstructured_instructions(monkeypatch):
+    monkeypatch.setattr(luxury_correction, "STRUCTURED_OUTPUT", True)
+    assert "Result format" not in luxury_correction.build_system_instruction("Handbags")
+    monkeypatch.setattr(luxury_correction, "STRUCTURED_OUTPUT", False)
+    assert luxury_correction.build_system_instruction("Handbags").endswith(luxury_correction.RESULT_FORMAT)
@@ -0,0 +1,18 @@
+from run_journal import RunJournal
+
+
+def test_append_after_a_torn_line_is_kept(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    path.write_text('{"key": "a", "corrected_title": "A", "attributes": null}\n{"key": "b", "corr', encoding="utf-8")
+    with RunJournal(str(path)) as journal:
+        journal.append("c", "C")
+    assert RunJournal(str(path)).replay() == {"a": "A", "c": "C"}
+
+
+def test_entries_survive_reopening(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    with RunJournal(path) as journal:
+        journal.append("a", "A", {"brand": "Gucci"})
+    with RunJournal(path) as journal:
+        journal.append("b", "B")
+    assert RunJournal(path).replay() == {"a": "A", "b": "B"}
@@ -0,0 +1,57 @@
+import pandas as pd
+import pytest
+
+import session_store
+from session_store import SessionStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SessionStore(directory=str(tmp_path), spill_after=3600)
+
+
+def _frame():
+    return pd.DataFrame({"NAME": ["Gucci Tote", "Prada Loafers"], "Updated Title": [None, "Prada Black Loafers"]})
+
+
+def test_spilled_entries_are_read_back(store):
+    sid = store.new_session("admin")
+    store.put(sid, "upload", _frame())
+    assert store.spill_idle(idle_seconds=0) == 1
+    assert store.usage()[0]["memory_bytes"] == 0
+    pd.testing.assert_frame_equal(store.get(sid, "upload"), _frame())
+    assert store.usage()[0]["disk_bytes"] == 0
+
+
+def test_spill_and_read_do_not_hold_the_lock(store, monkeypatch):
+    sid = store.new_session()
+    store.put(sid, "upload", _frame())
+    to_pickle, read_pickle = session_store.pd.to_pickle, session_store.pd.read_pickle
+    held = []
+
+    def check_lock():
+        held.append(not store._lock.acquire(blocking=False))
+        if not held[-1]:
+            store._lock.release()
+
+    monkeypatch.setattr(session_store.pd, "to_pickle", lambda *a: (check_lock(), to_pickle(*a)))
+    monkeypatch.setattr(session_store.pd, "read_pickle", lambda *a: (check_lock(), read_pickle(*a))[1])
+    store.spill_idle(idle_seconds=0)
+    store.get(sid, "upload")
+    assert held == [False, False]
+
+
+def test_entry_replaced_during_a_spill_is_kept_in_memory(store, monkeypatch):
+    sid = store.new_session()
+    store.put(sid, "upload", _frame())
+    to_pickle = session_store.pd.to_pickle
+    replacement = _frame().assign(NAME="Replaced")
+
+    def put_while_writing(value, path):
+        to_pickle(value, path)
+        store.put(sid, "upload", replacement)
+
+    monkeypatch.setattr(session_store.pd, "to_pickle", put_while_writing)
+    assert store.spill_idle(idle_seconds=0) == 0
+    assert store.get(sid, "upload") is replacement
+    assert list(session_store.os.listdir(store.directory)) == []
@@ -0,0 +1,58 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from result_cache import ResultCache
+from similarity import (LCS_MAX_ROW_GAP, LCS_MEAN_TOLERANCE, align_on_key, compare_with_difflib, difflib_ratio,
+                        evaluate_pairs, similarity_scores)
+
+PAIRS = pd.read_csv(os.path.join(os.path.dirname(__file__), "fixtures", "title_pairs.csv"))
+
+
+def test_default_metric_reproduces_difflib():
+    scores = similarity_scores(PAIRS["AI Title"], PAIRS["GT Title"], workers=1)
+    expected = [difflib_ratio(a.lower(), b.lower()) for a, b in zip(PAIRS["AI Title"], PAIRS["GT Title"])]
+    np.testing.assert_allclose(scores, expected)
+
+
+def test_lcs_agrees_with_difflib_within_the_stated_tolerance():
+    lcs = similarity_scores(PAIRS["AI Title"], PAIRS["GT Title"], method="lcs", workers=1)
+    legacy = similarity_scores(PAIRS["AI Title"], PAIRS["GT Title"], method="difflib", workers=1)
+    assert (lcs >= legacy - 1e-9).all()
+    assert (lcs - legacy).max() <= LCS_MAX_ROW_GAP
+    assert abs(lcs.mean() - legacy.mean()) <= LCS_MEAN_TOLERANCE
+    gaps = compare_with_difflib(PAIRS["AI Title"], PAIRS["GT Title"])
+    assert gaps["rows"] == len(PAIRS) and gaps["mean_gap"] <= LCS_MEAN_TOLERANCE
+
+
+def test_missing_and_equal_cells():
+    scores = similarity_scores(["Gucci Bag", None, "GUCCI TOTE"], ["gucci bag", "Gucci Bag", "gucci tote"], workers=1)
+    assert scores.tolist() == [100.0, 0.0, 100.0]
+
+
+def test_rerun_only_scores_changed_pairs(tmp_path):
+    cache = ResultCache(str(tmp_path / "scores.sqlite3"))
+    ai, gt = PAIRS["AI Title"], PAIRS["GT Title"]
+    exact, similarity, cached = evaluate_pairs(ai, gt, cache=cache)
+    assert cached == 0
+
+    changed = ai.copy()
+    changed.iloc[0] = "Gucci Red Leather Belt"
+    rerun_exact, rerun_similarity, cached = evaluate_pairs(changed, gt, cache=cache)
+    assert cached == len(PAIRS) - 1
+    np.testing.assert_array_equal(rerun_exact[1:], exact[1:])
+    np.testing.assert_allclose(rerun_similarity[1:], similarity[1:])
+    assert rerun_similarity[0] == similarity_scores(changed.iloc[:1], gt.iloc[:1])[0]
+    cache.close()
+
+
+def test_join_key_alignment_pairs_reordered_rows():
+    ai = pd.DataFrame({"SKU": [3, 1, 2, 4], "Updated Title": ["Gucci Belt", "Prada Tote", "Dior Saddle Bag", "Extra"]})
+    gt = pd.DataFrame({"SKU": [1, 2, 3], "Updated Title": ["Prada Tote", "Dior Saddle", "Gucci Belt"]})
+
+    merged, counts = align_on_key(ai, gt, "SKU", "Updated Title", "Updated Title")
+
+    assert counts == {"ai_only": 1, "gt_only": 0, "duplicates": 0}
+    exact, _, _ = evaluate_pairs(merged["AI Title"], merged["GT Title"])
+    assert dict(zip(merged["SKU"], exact)) == {3: True, 1: True, 2: False}
@@ -0,0 +1,26 @@
+from luxury_correction import luxury_data
+from validation import ResultValidator
+
+validator = ResultValidator(luxury_data)
+
+
+def _result(title):
+    return {"detected_category": "Shoes", "corrected_title": title,
+            "attributes": {"brand": "Gucci", "color": "Black", "material": "Leather"}}
+
+
+def test_reference_number_with_repeated_groups_is_not_a_repeated_word():
+    title = "Gucci Black Leather Loafers 311.30.42.30.01.005"
+    assert validator.problems(title, _result(title)) == []
+
+
+def test_repeated_word_is_reported():
+    title = "Gucci Black Leather Leather Loafers"
+    assert validator.problems(title, _result(title)) == ["repeated words: leather"]
+
+
+def test_brand_inside_the_style_name_is_not_a_repeated_word():
+    title = "Dior Lady Dior Black Leather Bag"
+    result = {"detected_category": "Handbags", "corrected_title": title,
+              "attributes": {"brand": "Dior", "style": "Lady Dior", "color": "Black", "material": "Leather"}}
+    assert not any("repeated" in p for p in validator.problems(title, result))
@@ -0,0 +1,65 @@
+import os
+
+import pandas as pd
+import pytest
+
+import luxury_correction
+import work_queue
+from backends import FakeBackend
+from work_queue import WorkQueue, merge_shards, run_worker, split_catalog
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    path = tmp_path / "catalog.csv"
+    pd.DataFrame({
+        "Product Name": [f"Zq{i} Widget Thing {i}" for i in range(12)],
+        "Updated Title": None,
+    }).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    monkeypatch.setattr(luxury_correction, "_replacements", {})
+    luxury_correction.set_model(FakeBackend(latency="fixed", latency_ms=1))
+    monkeypatch.setattr(work_queue, "POLL_SECONDS", 0.05)
+
+
+def test_settings_are_written_before_the_first_shard(catalog, tmp_path, monkeypatch):
+    add_shard = WorkQueue.add_shard
+
+    def checked_add_shard(self, *args):
+        assert self.settings()["name_column"] == "Product Name"
+        add_shard(self, *args)
+
+    monkeypatch.setattr(WorkQueue, "add_shard", checked_add_shard)
+    split_catalog(catalog, str(tmp_path / "queue"), shard_rows=4)
+
+
+def test_expired_lease_is_reclaimed(catalog, tmp_path, fake_model):
+    directory = str(tmp_path / "queue")
+    split_catalog(catalog, directory, shard_rows=4)
+
+    # A worker that leases the first shard and dies without finishing it
+    queue = WorkQueue(directory)
+    assert queue.claim("crashed", lease_seconds=0.2) == 0
+    queue.close()
+
+    summary = run_worker(directory, lease_seconds=0.2, concurrency=4, worker="survivor")
+    assert summary["shards"] == 3
+    assert summary["failed"] == 0
+
+    queue = WorkQueue(directory)
+    shards = queue.shards()
+    queue.close()
+    assert [s["status"] for s in shards] == ["done"] * 3
+    assert shards[0]["worker"] == "survivor" and shards[0]["attempts"] == 2
+
+    # Shards are data files, never pickles a worker would have to unpickle
+    for subdirectory in ("shards", "results"):
+        assert all(name.endswith(".parquet") for name in os.listdir(os.path.join(directory, subdirectory)))
+
+    output = str(tmp_path / "merged.csv")
+    assert merge_shards(directory, output)["rows"] == 12
+    assert pd.read_csv(output)["Updated Title"].notna().all()
@@ -0,0 +1,86 @@
+import re
+import unicodedata
+
+from postprocess import is_handbag_category, repeated_words
+
+# ==========================
+# Result Validation
+# ==========================
+# Checks a fast-tier model result must pass to be accepted without escalating to the pro model.
+# They mirror the naming rules in the prompt that can be verified without a model.
+
+GENERIC_SIZES = {"XS", "S", "M", "L", "XL"}
+# Louis Vuitton keeps these labels in the corrected title and maps them to generic sizes
+LV_SIZE_LABELS = ("PM", "MM", "GM")
+
+_TOKEN_RE = re.compile(r"[^\W_]+")
+_COLOR_SEPARATOR_RE = re.compile(r"\s*[,/&]\s*|\s+and\s+")
+
+
+def fold(text) -> str:
+    """Lowercase with accents removed, so "Hermès" matches "Hermes"."""
+    decomposed = unicodedata.normalize("NFKD", str(text))
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).lower().strip()
+
+
+class ResultValidator:
+    """
+    Validates a parsed result against the reference vocabulary: brand, color and material must
+    come from `luxury_data`, the title must not repeat a word back to back, handbag titles must
+    end in "Bag", and handbag sizes must follow the Louis Vuitton / Hermès / generic size rules.
+    """
+
+    def __init__(self, vocabulary: dict):
+        self._brands = {fold(b) for b in vocabulary.get("brands", [])}
+        self._colors = {fold(c) for c in vocabulary.get("colors", [])}
+        self._materials = {fold(m) for m in vocabulary.get("materials", [])}
+
+    def problems(self, product_title, result) -> list:
+        """Returns a description of every rule `result` breaks; an empty list means it is valid."""
+        attributes = result.get("attributes") or {}
+        corrected_title = result.get("corrected_title") or ""
+        problems = []
+
+        brand = attributes.get("brand")
+        if brand and fold(brand) not in self._brands:
+            problems.append(f"unknown brand '{brand}'")
+
+        color = attributes.get("color")
+        if color:
+            unknown = [c for c in _COLOR_SEPARATOR_RE.split(fold(color)) if c and c not in self._colors]
+            if unknown:
+                problems.append(f"unknown color '{color}'")
+
+        material = attributes.get("material")
+        if material and not any(word in self._materials for word in _TOKEN_RE.findall(fold(material))):
+            problems.append(f"unknown material '{material}'")
+
+        # The repeats `postprocess.drop_repeated_words` would remove; "Lady Dior" after "Dior" is fine
+        repeated = repeated_words(corrected_title)
+        if repeated:
+            problems.append(f"repeated words: {', '.join(repeated)}")
+
+        if is_handbag_category(result.get("detected_category")):
+            if not corrected_title.rstrip().endswith("Bag"):
+                problems.append("handbag title does not end with 'Bag'")
+            problems.extend(self._size_problems(product_title, fold(brand or ""), attributes.get("size"),
+                                                corrected_title))
+
+        return problems
+
+    @staticmethod
+    def _size_problems(product_title, brand, size, corrected_title) -> list:
+        if brand == "hermes":
+            if size in GENERIC_SIZES:
+                return [f"Hermes size '{size}' converted to a generic size"]
+            return []
+        problems = []
+        if size and size not in GENERIC_SIZES:
+            problems.append(f"size '{size}' is not a generic size")
+        if brand == "louis vuitton":
+            title_tokens = set(_TOKEN_RE.findall(str(product_title)))
+            corrected_tokens = set(_TOKEN_RE.findall(corrected_title))
+            for label in LV_SIZE_LABELS:
+                if label in title_tokens and label not in corrected_tokens:
+                    problems.append(f"Louis Vuitton size label '{label}' dropped from the title")
+        return problems
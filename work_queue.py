@@ -0,0 +1,344 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from cachetools import LRUCache
+
+from catalog_io import ChunkWriter, iter_chunks, read_table
+from luxury_correction import AdaptiveConcurrencyLimiter, HedgePolicy, DEFAULT_CONCURRENCY
+from pipeline import (find_column, fill_missing_titles, NAME_COLUMNS, TITLE_COLUMNS, CATEGORY_COLUMNS,
+                      NEAR_DUPLICATE_COLUMN)
+from run_journal import RunJournal
+
+# ==========================
+# Sharded Work Queue
+# ==========================
+# A catalog split into row-range shards in a directory that every worker can reach (local disk
+# or a filesystem shared between hosts). Workers lease one shard at a time and renew the lease
+# with heartbeats; a lease that runs out (crashed or stalled worker) is handed to the next worker,
+# which resumes from the shard's journal.
+DEFAULT_SHARD_ROWS = int(os.getenv("RETITLING_SHARD_ROWS", "5000"))
+DEFAULT_LEASE_SECONDS = float(os.getenv("RETITLING_LEASE_SECONDS", "300"))
+# Leases handed out per shard before it is marked failed instead of retried
+DEFAULT_MAX_ATTEMPTS = int(os.getenv("RETITLING_SHARD_MAX_ATTEMPTS", "3"))
+# How often an idle worker looks again for pending or expired shards
+POLL_SECONDS = 5.0
+
+QUEUE_FILE = "queue.sqlite3"
+SHARD_STATUSES = ("pending", "leased", "done", "failed")
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WorkQueue:
+    """
+    SQLite-backed shard table in `directory`. Uses a rollback journal rather than WAL, since WAL
+    needs shared memory that processes on different hosts do not have. Lease times come from
+    each worker's clock, so hosts should keep their clocks in sync to well under the lease length.
+    """
+
+    def __init__(self, directory, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.directory = directory
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(directory, QUEUE_FILE), timeout=60,
+                                     check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=DELETE")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS shards (
+                id INTEGER PRIMARY KEY,
+                first_row INTEGER NOT NULL,
+                rows INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def input_path(self, shard_id) -> str:
+        return os.path.join(self.directory, "shards", f"{shard_id:06d}.parquet")
+
+    def output_path(self, shard_id) -> str:
+        return os.path.join(self.directory, "results", f"{shard_id:06d}.parquet")
+
+    def journal_path(self, shard_id) -> str:
+        return os.path.join(self.directory, "journals", f"{shard_id:06d}.jsonl")
+
+    def add_shard(self, shard_id, first_row, rows):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO shards (id, first_row, rows, updated_at) VALUES (?, ?, ?, ?)",
+                (shard_id, first_row, rows, time.time()),
+            )
+
+    def set_settings(self, **settings):
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                                   [(key, json.dumps(value)) for key, value in settings.items()])
+
+    def settings(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT key, value FROM settings").fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def claim(self, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """
+        Leases the lowest pending shard, or one whose lease has expired, to `worker` and returns
+        its ID; None when nothing is claimable. Expired shards out of attempts are marked failed.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            # IMMEDIATE takes the write lock up front, so two workers cannot claim the same shard
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute(
+                "UPDATE shards SET status = 'failed', error = 'lease expired on the last attempt', updated_at = ? "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, now, self.max_attempts),
+            )
+            row = self._conn.execute(
+                "SELECT id FROM shards WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?) "
+                "ORDER BY id LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE shards SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1, "
+                "updated_at = ? WHERE id = ?",
+                (worker, now + lease_seconds, now, row[0]),
+            )
+            return row[0]
+
+    def heartbeat(self, shard_id, worker, lease_seconds=DEFAULT_LEASE_SECONDS) -> bool:
+        """Extends `worker`'s lease; False when the shard was reclaimed by someone else."""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE shards SET lease_expires = ?, updated_at = ? WHERE id = ? AND worker = ? AND status = 'leased'",
+                (now + lease_seconds, now, shard_id, worker),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, shard_id, worker) -> bool:
+        """Marks the shard done if `worker` still holds its lease."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE shards SET status = 'done', lease_expires = NULL, error = NULL, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND status = 'leased'",
+                (time.time(), shard_id, worker),
+            )
+        return cursor.rowcount == 1
+
+    def release(self, shard_id, worker, error):
+        """Returns a shard that failed on `worker` to the queue, or marks it failed when out of attempts."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE shards SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "lease_expires = NULL, error = ?, updated_at = ? WHERE id = ? AND worker = ? AND status = 'leased'",
+                (self.max_attempts, error, time.time(), shard_id, worker),
+            )
+
+    def reset_failed(self) -> int:
+        """Puts failed shards back to pending with fresh attempts; returns how many."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE shards SET status = 'pending', attempts = 0, worker = NULL, updated_at = ? WHERE status = 'failed'",
+                (time.time(),),
+            )
+        return cursor.rowcount
+
+    def shards(self) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, first_row, rows, status, worker, lease_expires, attempts, error FROM shards ORDER BY id"
+            ).fetchall()
+        keys = ("id", "first_row", "rows", "status", "worker", "lease_expires", "attempts", "error")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def progress(self) -> dict:
+        """Shard counts by status, plus rows in finished shards."""
+        shards = self.shards()
+        counts = Counter(s["status"] for s in shards)
+        return {
+            **{status: counts[status] for status in SHARD_STATUSES},
+            "shards": len(shards),
+            "rows": sum(s["rows"] for s in shards),
+            "rows_done": sum(s["rows"] for s in shards if s["status"] == "done"),
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# ==========================
+# Split / Work / Merge
+# ==========================
+def split_catalog(input_path, directory, shard_rows=DEFAULT_SHARD_ROWS, category_prompts=True) -> dict:
+    """
+    Splits `input_path` into shards of `shard_rows` rows under `directory` and queues them.
+    Column detection happens here once, so every worker fills the same columns.
+    """
+    for subdirectory in ("shards", "results", "journals"):
+        os.makedirs(os.path.join(directory, subdirectory), exist_ok=True)
+    work_queue = WorkQueue(directory)
+    try:
+        if work_queue.shards():
+            raise ValueError(f"{directory} already holds a queue; use a new directory per catalog")
+
+        first_row = 0
+        settings = None
+        for shard_id, chunk in enumerate(iter_chunks(input_path, chunksize=shard_rows)):
+            if settings is None:
+                settings = {
+                    "input": os.path.abspath(input_path),
+                    "name_column": find_column(chunk, NAME_COLUMNS),
+                    "title_column": find_column(chunk, TITLE_COLUMNS),
+                    "category_column": find_column(chunk, CATEGORY_COLUMNS) if category_prompts else None,
+                }
+                if not settings["name_column"] or not settings["title_column"]:
+                    raise ValueError(
+                        f"Could not find the product name and updated title columns. "
+                        f"Available columns: {', '.join(map(str, chunk.columns))}"
+                    )
+                # Before any shard is queued: a worker may claim the first one while the rest are split
+                work_queue.set_settings(**settings)
+            _write_shard(chunk, work_queue.input_path(shard_id))
+            work_queue.add_shard(shard_id, first_row, len(chunk))
+            first_row += len(chunk)
+
+        return {**(settings or {}), "directory": directory, **work_queue.progress()}
+    finally:
+        work_queue.close()
+
+
+def _write_shard(df, path):
+    # Parquet rather than pickle: unpickling a file from a shared directory would run whatever code it holds
+    with ChunkWriter(path, fmt="parquet") as writer:
+        writer.write(df)
+
+
+def _heartbeat(work_queue, shard_id, worker, lease_seconds, lost, stop):
+    # Renews at a third of the lease so two missed beats still leave time before it expires
+    while not stop.wait(lease_seconds / 3):
+        if not work_queue.heartbeat(shard_id, worker, lease_seconds):
+            lost.set()
+            return
+
+
+def process_shard(work_queue, shard_id, worker, settings, lease_seconds=DEFAULT_LEASE_SECONDS,
+                  concurrency=DEFAULT_CONCURRENCY, memo=None, metrics=None, limiter=None, hedger=None) -> dict:
+    """
+    Fills one leased shard and writes its result file. A lost lease cancels the shard's
+    remaining calls; what finished is kept in the shard journal for whoever reclaims it.
+    `limiter` and `hedger` are shared with the worker's other shards (see `correct_titles`).
+    """
+    df = read_table(work_queue.input_path(shard_id))
+    lost, stop = threading.Event(), threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(work_queue, shard_id, worker, lease_seconds, lost, stop),
+                                 name="retitling-heartbeat", daemon=True)
+    heartbeat.start()
+    try:
+        with RunJournal(work_queue.journal_path(shard_id)) as journal:
+            stats = fill_missing_titles(
+                df,
+                settings["name_column"],
+                settings["title_column"],
+                concurrency=concurrency,
+                memo=memo,
+                journal=journal,
+                replayed=journal.replay(),
+                cancel_event=lost,
+                metrics=metrics,
+                category_col=settings.get("category_column"),
+                near_duplicate_col=NEAR_DUPLICATE_COLUMN,
+                limiter=limiter,
+                hedger=hedger,
+            )
+    finally:
+        stop.set()
+        heartbeat.join()
+
+    if lost.is_set():
+        return {**stats, "status": "lease lost"}
+    # Write to a temporary name first, so a result file is never seen half-written
+    output_path = work_queue.output_path(shard_id)
+    temporary = f"{output_path}.{os.getpid()}.tmp"
+    _write_shard(df, temporary)
+    os.replace(temporary, output_path)
+    return {**stats, "status": "done" if work_queue.complete(shard_id, worker) else "lease lost"}
+
+
+def run_worker(directory, lease_seconds=DEFAULT_LEASE_SECONDS, concurrency=DEFAULT_CONCURRENCY,
+               memo_size=50000, metrics=None, max_shards=None, worker=None) -> dict:
+    """
+    Claims and processes shards until none are pending or leased (or `max_shards` are done).
+    While other workers hold leases it keeps polling, so it can take over any that expire.
+    """
+    work_queue = WorkQueue(directory)
+    worker = worker or worker_name()
+    memo = LRUCache(maxsize=memo_size)
+    # Concurrency and hedging learned on one shard carry over to the next
+    limiter = AdaptiveConcurrencyLimiter(max_limit=concurrency)
+    hedger = HedgePolicy()
+    summary = {"worker": worker, "shards": 0, "rows": 0, "errors": 0, "lost_leases": 0, "failed": 0,
+               "sources": Counter()}
+    try:
+        settings = {}
+        while max_shards is None or summary["shards"] < max_shards:
+            shard_id = work_queue.claim(worker, lease_seconds)
+            if shard_id is None:
+                progress = work_queue.progress()
+                if not progress["pending"] and not progress["leased"]:
+                    break
+                time.sleep(POLL_SECONDS)
+                continue
+            # Read once a shard exists, since `split_catalog` writes the settings before the first shard
+            settings = settings or work_queue.settings()
+            try:
+                stats = process_shard(work_queue, shard_id, worker, settings, lease_seconds, concurrency,
+                                      memo=memo, metrics=metrics, limiter=limiter, hedger=hedger)
+            except Exception as e:
+                work_queue.release(shard_id, worker, f"{type(e).__name__}: {e}")
+                summary["failed"] += 1
+                continue
+            if stats["status"] != "done":
+                summary["lost_leases"] += 1
+                continue
+            summary["shards"] += 1
+            summary["rows"] += stats["rows"]
+            summary["errors"] += stats["errors"]
+            summary["sources"].update(stats["sources"])
+    finally:
+        work_queue.close()
+    summary["sources"] = dict(summary["sources"])
+    return summary
+
+
+def merge_shards(directory, output_path) -> dict:
+    """Concatenates the shard results into `output_path` in original row order; every shard must be done."""
+    work_queue = WorkQueue(directory)
+    try:
+        shards = work_queue.shards()
+        unfinished = [s["id"] for s in shards if s["status"] != "done"]
+        if unfinished:
+            raise ValueError(f"{len(unfinished)} of {len(shards)} shards are not done "
+                             f"(first: {', '.join(map(str, unfinished[:10]))})")
+        with ChunkWriter(output_path) as writer:
+            for shard in shards:
+                writer.write(read_table(work_queue.output_path(shard["id"])))
+            rows = writer.rows_written
+        return {"output": output_path, "shards": len(shards), "rows": rows}
+    finally:
+        work_queue.close()